@@ -0,0 +1,120 @@
+import time
+import random
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from money_map.pipelines.participant_clusters import Cluster_Report, cluster_participants
+from money_map.benchmarks.suggestion_benchmark import PURPOSE_WORDS
+
+# =============================================================================
+# Benchmark Data
+# =============================================================================
+
+MONTH_WORDS = ["januar", "februar", "maerz", "april", "mai", "juni", "juli",
+               "august", "september", "oktober", "november", "dezember"]
+
+REFERENCE_WORDS = ["ref", "kdnr", "mandat", "end-to-end", "sepa", "beleg"]
+
+
+def create_benchmark_participants(n_participants:int=300000,
+                                  n_templates:int=30000,
+                                  seed:int=1234) -> pd.DataFrame:
+    '''Create distinct participants as variants of n_templates recurring
+       transactions: the purpose of each variant adds a month name & a
+       reference word to the purpose of its template (digits are already
+       stripped from purpose_char).
+
+    Parameters
+    ----------
+    n_participants : int, optional
+        Number of distinct participants, by default 300000
+    n_templates : int, optional
+        Number of recurring transactions, by default 30000
+    seed : int, optional
+        Random seed, by default 1234
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns receiver_iban, booking_text, purpose_char & template.
+    '''
+    rng = random.Random(seed)
+    templates = pd.DataFrame({
+        "receiver_iban":[f"DE{rng.randrange(10**20):020d}" for _ in range(n_templates)],
+        "booking_text":[rng.choice(["Lastschrift", "Gutschrift", "Dauerauftrag",
+                                    "Kartenzahlung", "Ueberweisung"])
+                        for _ in range(n_templates)],
+        "purpose_char":[" ".join(rng.sample(PURPOSE_WORDS, rng.randint(4,8)))
+                        for _ in range(n_templates)]})
+
+    template = np.random.default_rng(seed).integers(0, n_templates, n_participants)
+    df = templates.iloc[template].reset_index(drop=True)
+    df["purpose_char"] = [f"{purpose} {rng.choice(MONTH_WORDS)} {rng.choice(REFERENCE_WORDS)}"
+                          for purpose in df["purpose_char"]]
+    df["template"] = template
+    return df.drop_duplicates(subset=["receiver_iban", "booking_text", "purpose_char"],
+                              ignore_index=True)
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def run_benchmark(n_participants:int=300000,
+                  n_templates:int=30000,
+                  verbose:bool=True) -> Dict[str,float]:
+    '''Measure cluster_participants on synthetic near-duplicates, the
+       shrinking of the labeling queue and the share of clusters mixing
+       different templates. Runtime is also measured on a tenth of the
+       participants to show the near-linear scaling.
+
+    Parameters
+    ----------
+    n_participants : int, optional
+        Number of distinct participants (before deduplication), by default 300000
+    n_templates : int, optional
+        Number of recurring transactions, by default 30000
+    verbose : bool, optional
+        Print timings, by default True
+
+    Returns
+    -------
+    Dict[str,float]
+        Timings in seconds, shares between 0 and 1.
+    '''
+    timings = {}
+
+    small = create_benchmark_participants(n_participants=n_participants // 10,
+                                          n_templates=n_templates // 10)
+    start = time.perf_counter()
+    cluster_participants(df=small)
+    timings["cluster_tenth_s"] = time.perf_counter() - start
+
+    df = create_benchmark_participants(n_participants=n_participants,
+                                       n_templates=n_templates)
+    start = time.perf_counter()
+    representatives = cluster_participants(df=df)
+    timings["cluster_s"] = time.perf_counter() - start
+
+    report = Cluster_Report(participants=df.shape[0],
+                            clusters=len(np.unique(representatives)),
+                            seconds=timings["cluster_s"])
+    timings["shrink"] = report.shrink
+
+    # variants of one template should end up in one cluster, never mixed
+    templates = df["template"].to_numpy()
+    timings["impure_clusters"] = (pd.Series(templates)
+                                  .groupby(representatives).nunique().gt(1).mean())
+    timings["clusters_per_template"] = report.clusters / df["template"].nunique()
+
+    if verbose:
+        print(report)
+        for key, value in timings.items():
+            print(f"{key:<28}{value:>10.2f}")
+
+    return timings
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,115 @@
+import time
+import random
+from typing import Dict
+
+import pandas as pd
+
+from money_map.ingestion.normalization import (PURPOSE_CHAR_PATTERN,
+                                               normalize_purpose_char,
+                                               transliterate_umlauts)
+from money_map.ingestion.rbpn_ingestion import RBPN_UMLAUTE_MAPPING
+
+# =============================================================================
+# Benchmark Data
+# =============================================================================
+
+PURPOSE_TEMPLATES = ["Miete {month}/{year} Wohnung {ref}",
+                     "Gehalt {month}.{year} Ref. {ref}",
+                     "Kartenzahlung Bäckerei Müller {ref}",
+                     "Überweisung an Jörg Strauß {ref}",
+                     "Lastschrift Stromversorger KD-Nr. {ref}",
+                     "Spotify AB P{ref} {month}-{year}"]
+
+
+def create_benchmark_frame(n_rows:int=1000000,
+                           n_references:int=50000,
+                           seed:int=1234) -> pd.DataFrame:
+    '''Create a frame mimicking raw RBPN transactions: string columns with
+       umlauts, digits and symbols plus numeric columns.
+
+    Parameters
+    ----------
+    n_rows : int, optional
+        Number of rows, by default 1000000
+    n_references : int, optional
+        Number of distinct references used in purpose, by default 50000
+    seed : int, optional
+        Random seed, by default 1234
+
+    Returns
+    -------
+    pd.DataFrame
+        Benchmark frame.
+    '''
+    rng = random.Random(seed)
+    purpose = [rng.choice(PURPOSE_TEMPLATES).format(month=rng.randint(1,12),
+                                                    year=rng.randint(2015,2024),
+                                                    ref=rng.randrange(n_references))
+               for _ in range(n_rows)]
+    receiver_name = [rng.choice(["Bäckerei Müller","Jörg Strauß","Stadtwerke",
+                                 "Spotify AB","Hausverwaltung Größ"])
+                     for _ in range(n_rows)]
+
+    return pd.DataFrame({"purpose":purpose,
+                         "receiver_name":receiver_name,
+                         "amount":[rng.uniform(-500,500) for _ in range(n_rows)],
+                         "balance_after_booking":[rng.uniform(0,1e5) for _ in range(n_rows)]})
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def run_benchmark(n_rows:int=1000000, verbose:bool=True) -> Dict[str,float]:
+    '''Compare per row regex normalization with the vectorized normalization
+       stage. Asserts that both produce identical results.
+
+    Parameters
+    ----------
+    n_rows : int, optional
+        Number of rows of benchmark frame, by default 1000000
+    verbose : bool, optional
+        Print timings, by default True
+
+    Returns
+    -------
+    Dict[str,float]
+        Timings in seconds and speedups.
+    '''
+    df = create_benchmark_frame(n_rows=n_rows)
+    timings = {}
+
+    # purpose_char
+    start = time.perf_counter()
+    expected = df["purpose"].apply(lambda text: PURPOSE_CHAR_PATTERN.sub('', text)).str.lower()
+    timings["purpose_char_apply"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = normalize_purpose_char(purpose=df["purpose"])
+    timings["purpose_char_vectorized"] = time.perf_counter() - start
+    assert result.equals(expected)
+
+    # umlauts
+    start = time.perf_counter()
+    expected_df = df.replace(RBPN_UMLAUTE_MAPPING, regex=True)
+    timings["umlauts_replace"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result_df = transliterate_umlauts(df=df.copy(), umlaute_mapping=RBPN_UMLAUTE_MAPPING)
+    timings["umlauts_vectorized"] = time.perf_counter() - start
+    assert result_df.equals(expected_df)
+
+    timings["purpose_char_speedup"] = (timings["purpose_char_apply"] /
+                                       timings["purpose_char_vectorized"])
+    timings["umlauts_speedup"] = (timings["umlauts_replace"] /
+                                  timings["umlauts_vectorized"])
+
+    if verbose:
+        for key, value in timings.items():
+            unit = "x" if key.endswith("speedup") else "s"
+            print(f"{key:<28}{value:>10.2f} {unit}")
+
+    return timings
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,158 @@
+import re
+import time
+import random
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from money_map.pipelines.categorization_rules import (RULE_FIELDS, RULE_MATCH_TYPES,
+                                                      NO_MATCH, Rule_Matcher)
+from money_map.benchmarks.suggestion_benchmark import RECEIVER_WORDS, PURPOSE_WORDS
+
+# =============================================================================
+# Benchmark Data
+# =============================================================================
+
+def create_benchmark_transactions(n_rows:int=1000000,
+                                  n_participants:int=20000,
+                                  seed:int=1234) -> pd.DataFrame:
+    '''Create transactions (RULE_FIELDS only) of n_participants distinct
+       participants.
+
+    Parameters
+    ----------
+    n_rows : int, optional
+        Number of transactions, by default 1000000
+    n_participants : int, optional
+        Number of distinct participants, by default 20000
+    seed : int, optional
+        Random seed, by default 1234
+
+    Returns
+    -------
+    pd.DataFrame
+        Benchmark transactions.
+    '''
+    rng = random.Random(seed)
+    participants = pd.DataFrame({
+        "receiver_iban":[f"DE{rng.randrange(10**20):020d}" for _ in range(n_participants)],
+        "receiver_name":[" ".join(rng.sample(RECEIVER_WORDS, rng.randint(1,3)))
+                         + f" {rng.randrange(1000)}" for _ in range(n_participants)],
+        "booking_text":[rng.choice(["Lastschrift", "Gutschrift", "Dauerauftrag",
+                                    "Kartenzahlung", "Ueberweisung"])
+                        for _ in range(n_participants)],
+        "purpose_char":[" ".join(rng.choices(PURPOSE_WORDS, k=rng.randint(2,6)))
+                        for _ in range(n_participants)]})
+
+    rows = np.random.default_rng(seed).integers(0, n_participants, n_rows)
+    return participants.iloc[rows].reset_index(drop=True)
+
+
+def create_benchmark_rules(transactions:pd.DataFrame,
+                           n_rules:int=500,
+                           seed:int=1234) -> pd.DataFrame:
+    '''Create rules of all fields & match types, patterns are taken from
+       the transactions so that rules actually match.
+    '''
+    rng = random.Random(seed)
+    rows = []
+    for rule_id in range(1, n_rules+1):
+        field = rng.choice(RULE_FIELDS)
+        match_type = rng.choice(RULE_MATCH_TYPES[:3]) if rule_id % 50 else "regex"
+        value = str(transactions[field].iloc[rng.randrange(transactions.shape[0])])
+        if match_type == "prefix":
+            pattern = value[:rng.randint(3,8)]
+        elif match_type == "substring":
+            start = rng.randrange(max(len(value)-5, 1))
+            pattern = value[start:start+rng.randint(4,8)]
+        elif match_type == "regex":
+            pattern = r"\b" + re.escape(value.split()[0]) + r"\b"
+        else:
+            pattern = value
+        rows.append([rule_id, field, match_type, pattern, rng.randint(1,1000),
+                     rule_id, "Category 1", "Category 2", f"Category 3.{rule_id}"])
+
+    return pd.DataFrame(rows, columns=["rule_id", "field", "match_type", "pattern",
+                                       "priority", "category_id", "category_1",
+                                       "category_2", "category_3"])
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def match_naive(rules:pd.DataFrame, row:Dict[str,str]) -> int:
+    '''Rank of the winning rule of a single row by testing rule after rule.
+    '''
+    for rank, rule in enumerate(rules.to_dict(orient="records")):
+        value = str(row[rule["field"]]).strip(" ").lower()
+        pattern = rule["pattern"].strip(" ").lower()
+        if rule["match_type"] == "exact":
+            matched = value == pattern
+        elif rule["match_type"] == "prefix":
+            matched = value.startswith(pattern)
+        elif rule["match_type"] == "substring":
+            matched = pattern in value
+        else:
+            matched = re.search(rule["pattern"], str(row[rule["field"]]), re.IGNORECASE) is not None
+        if matched:
+            return rank
+    return NO_MATCH
+
+
+def run_benchmark(n_rows:int=1000000,
+                  n_rules:int=500,
+                  n_naive:int=2000,
+                  verbose:bool=True) -> Dict[str,float]:
+    '''Compare Rule_Matcher (compile once, match distinct values) with testing
+       every rule on every row. The naive approach is timed on n_naive rows
+       and extrapolated. Asserts that both agree on these rows.
+
+    Parameters
+    ----------
+    n_rows : int, optional
+        Number of transactions, by default 1000000
+    n_rules : int, optional
+        Number of rules, by default 500
+    n_naive : int, optional
+        Rows matched naively, by default 2000
+    verbose : bool, optional
+        Print timings, by default True
+
+    Returns
+    -------
+    Dict[str,float]
+        Timings in seconds, throughput in rows per minute.
+    '''
+    transactions = create_benchmark_transactions(n_rows=n_rows)
+    rules = create_benchmark_rules(transactions=transactions, n_rules=n_rules)
+    timings = {}
+
+    start = time.perf_counter()
+    matcher = Rule_Matcher(rules=rules)
+    timings["compile_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranks = matcher.match(transactions)
+    timings["match_s"] = time.perf_counter() - start
+    timings["rows_per_minute"] = n_rows / timings["match_s"] * 60
+
+    sample = transactions.head(n_naive).to_dict(orient="records")
+    start = time.perf_counter()
+    naive = np.array([match_naive(rules=matcher.ranked, row=row) for row in sample])
+    timings["naive_rows_per_minute"] = n_naive / (time.perf_counter() - start) * 60
+    timings["speedup"] = timings["rows_per_minute"] / timings["naive_rows_per_minute"]
+
+    assert (naive == ranks[:n_naive]).all()
+
+    if verbose:
+        print(f"{n_rows} transactions, {n_rules} rules, "
+              f"{(ranks != NO_MATCH).mean():.0%} matched")
+        for key, value in timings.items():
+            print(f"{key:<28}{value:>16.2f}")
+
+    return timings
+
+
+if __name__ == "__main__":
+    run_benchmark()
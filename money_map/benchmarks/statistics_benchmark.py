@@ -0,0 +1,134 @@
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from money_map.tabs.tab_statistics import (define_daily_balance,
+                                           define_monthly_transactions,
+                                           define_daily_balance_by_account,
+                                           define_monthly_transactions_by_account)
+
+# =============================================================================
+# Benchmark Data
+# =============================================================================
+
+def create_benchmark_frames(n_accounts:int=50,
+                            n_years:int=10,
+                            n_categories:int=30,
+                            seed:int=1234) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    '''Create frames shaped like the results of query_monthly_totals (level
+       category_3) & query_daily_balance of many accounts with a long history.
+
+    Parameters
+    ----------
+    n_accounts : int, optional
+        Number of accounts, by default 50
+    n_years : int, optional
+        Years of history per account, by default 10
+    n_categories : int, optional
+        Categories booked per month, by default 30
+    seed : int, optional
+        Random seed, by default 1234
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame]
+        monthly totals, daily balance
+    '''
+    rng = np.random.default_rng(seed)
+    sender_ibans = [f"DE{index:020d}" for index in range(n_accounts)]
+
+    # monthly totals: account x month x category
+    years = np.arange(2024 - n_years, 2024)
+    index = pd.MultiIndex.from_product([sender_ibans, years, np.arange(1,13),
+                                        np.arange(n_categories)],
+                                       names=["sender_iban","year","month","category_id"])
+    monthly_totals = index.to_frame(index=False)
+    monthly_totals["category_1"] = "Category 1." + (monthly_totals["category_id"] % 3).astype(str)
+    monthly_totals["category_2"] = "Category 2." + (monthly_totals["category_id"] % 10).astype(str)
+    monthly_totals["category_3"] = np.where(monthly_totals["category_id"]==0, "Transfer",
+                                            "Category 3." + monthly_totals["category_id"].astype(str))
+    monthly_totals["amount"] = rng.uniform(-500, 500, len(monthly_totals))
+    monthly_totals["transaction_count"] = rng.integers(1, 20, len(monthly_totals))
+    monthly_totals["mean_balance_after_booking"] = rng.uniform(0, 1e5, len(monthly_totals))
+
+    # daily balance: account x day
+    dates = pd.date_range(f"{years[0]}-01-01", f"{years[-1]}-12-31", freq="D")
+    index = pd.MultiIndex.from_product([sender_ibans, dates], names=["sender_iban","booking_date"])
+    daily_balance = index.to_frame(index=False)
+    balance = rng.uniform(0, 1e5, len(daily_balance))
+    daily_balance["min_balance_after_booking"] = balance - 100
+    daily_balance["mean_balance_after_booking"] = balance
+    daily_balance["max_balance_after_booking"] = balance + 100
+    daily_balance["transaction_count"] = rng.integers(0, 5, len(daily_balance))
+    daily_balance["is_filled"] = daily_balance["transaction_count"]==0
+
+    # rollups are read in random order
+    return (monthly_totals.sample(frac=1, random_state=seed),
+            daily_balance.sample(frac=1, random_state=seed))
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def run_benchmark(n_accounts:int=50, verbose:bool=True) -> Dict[str,float]:
+    '''Compare per account filtering loops with the single pass aggregation
+       over all selected accounts. Asserts that both produce identical results.
+
+    Parameters
+    ----------
+    n_accounts : int, optional
+        Number of selected accounts, by default 50
+    verbose : bool, optional
+        Print timings, by default True
+
+    Returns
+    -------
+    Dict[str,float]
+        Timings in seconds and speedups.
+    '''
+    monthly_totals, daily_balance = create_benchmark_frames(n_accounts=n_accounts)
+    sender_ibans = monthly_totals["sender_iban"].unique().tolist()
+    timings = {}
+
+    # per account loop
+    start = time.perf_counter()
+    expected_monthly = {}
+    expected_daily = {}
+    for sender_iban in sender_ibans:
+        expected_monthly[sender_iban] = define_monthly_transactions(
+            monthly_totals=monthly_totals.loc[monthly_totals["sender_iban"]==sender_iban],
+            category_level="category_3")
+        expected_daily[sender_iban] = define_daily_balance(
+            daily_balance=daily_balance.loc[daily_balance["sender_iban"]==sender_iban])
+    timings["per_account_loop"] = time.perf_counter() - start
+
+    # single pass
+    start = time.perf_counter()
+    monthly = define_monthly_transactions_by_account(monthly_totals=monthly_totals,
+                                                     sender_ibans=sender_ibans,
+                                                     category_level="category_3")
+    daily = define_daily_balance_by_account(daily_balance=daily_balance,
+                                            sender_ibans=sender_ibans)
+    timings["single_pass"] = time.perf_counter() - start
+
+    for sender_iban in sender_ibans:
+        assert monthly[sender_iban][0].equals(expected_monthly[sender_iban][0])
+        assert monthly[sender_iban][1].equals(expected_monthly[sender_iban][1])
+        assert daily[sender_iban].equals(expected_daily[sender_iban])
+
+    timings["speedup"] = timings["per_account_loop"] / timings["single_pass"]
+
+    if verbose:
+        print(f"{n_accounts} accounts, {len(monthly_totals)} monthly rows, "
+              f"{len(daily_balance)} daily rows")
+        for key, value in timings.items():
+            unit = "x" if key.endswith("speedup") else "s"
+            print(f"{key:<28}{value:>10.2f} {unit}")
+
+    return timings
+
+
+if __name__ == "__main__":
+    run_benchmark()
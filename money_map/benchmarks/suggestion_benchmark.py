@@ -0,0 +1,118 @@
+import time
+import random
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from money_map.pipelines.suggestion_index import Suggestion_Index
+
+# =============================================================================
+# Benchmark Data
+# =============================================================================
+
+RECEIVER_WORDS = ["stadtwerke", "rewe", "edeka", "aldi", "lidl", "dm", "drogerie",
+                  "markt", "gmbh", "ag", "versicherung", "allianz", "spotify",
+                  "netflix", "amazon", "paypal", "europe", "hausverwaltung",
+                  "baeckerei", "mueller", "schmidt", "apotheke", "tankstelle",
+                  "aral", "shell", "deutsche", "bahn", "telekom", "vodafone"]
+
+PURPOSE_WORDS = ["miete", "wohnung", "gehalt", "lastschrift", "kartenzahlung",
+                 "ueberweisung", "strom", "gas", "abschlag", "beitrag", "rechnung",
+                 "kundennummer", "vertrag", "monat", "einkauf", "filiale", "abo",
+                 "mitgliedschaft", "rate", "darlehen", "erstattung", "gutschrift"]
+
+
+def create_benchmark_participants(n_participants:int=100000,
+                                  n_categories:int=80,
+                                  seed:int=1234) -> pd.DataFrame:
+    '''Create labeled participants with receiver names & purposes built from
+       a small vocabulary, so that many participants are similar.
+
+    Parameters
+    ----------
+    n_participants : int, optional
+        Number of labeled participants, by default 100000
+    n_categories : int, optional
+        Number of distinct category_id, by default 80
+    seed : int, optional
+        Random seed, by default 1234
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns receiver_name, purpose_char & category_id.
+    '''
+    rng = random.Random(seed)
+    receiver_name = [" ".join(rng.sample(RECEIVER_WORDS, rng.randint(1,3)))
+                     + f" {rng.randrange(1000)}" for _ in range(n_participants)]
+    purpose_char = [" ".join(rng.choices(PURPOSE_WORDS, k=rng.randint(2,6)))
+                    for _ in range(n_participants)]
+    category_id = [rng.randrange(n_categories) for _ in range(n_participants)]
+
+    return pd.DataFrame({"receiver_name":receiver_name,
+                         "purpose_char":purpose_char,
+                         "category_id":category_id})
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def run_benchmark(n_participants:int=100000,
+                  n_queries:int=500,
+                  verbose:bool=True) -> Dict[str,float]:
+    '''Measure build time, query latency (top 3 suggestions) and incremental
+       add latency of Suggestion_Index. Asserts that an indexed participant
+       is suggested its own category first.
+
+    Parameters
+    ----------
+    n_participants : int, optional
+        Number of labeled participants, by default 100000
+    n_queries : int, optional
+        Number of measured queries, by default 500
+    verbose : bool, optional
+        Print timings, by default True
+
+    Returns
+    -------
+    Dict[str,float]
+        Build time in seconds, latencies in milliseconds.
+    '''
+    df = create_benchmark_participants(n_participants=n_participants)
+    queries = create_benchmark_participants(n_participants=n_queries, seed=4321)
+    timings = {}
+
+    start = time.perf_counter()
+    index = Suggestion_Index()
+    index.add_many(df)
+    timings["build_s"] = time.perf_counter() - start
+
+    latencies = []
+    for query in queries.to_dict(orient="records"):
+        start = time.perf_counter()
+        index.suggest(query, k=3)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    timings["query_mean_ms"] = latencies.mean()
+    timings["query_p95_ms"] = np.percentile(latencies, 95)
+
+    start = time.perf_counter()
+    for query in queries.to_dict(orient="records"):
+        index.add(query, category_id=query["category_id"])
+    timings["add_mean_ms"] = (time.perf_counter() - start) * 1000 / n_queries
+
+    # a labeled participant matches itself best
+    sample = df.iloc[0].to_dict()
+    assert index.suggest(sample, k=1)[0] == (sample["category_id"], 1.0)
+
+    if verbose:
+        print(f"{len(index)} labeled participants")
+        for key, value in timings.items():
+            print(f"{key:<28}{value:>10.2f}")
+
+    return timings
+
+
+if __name__ == "__main__":
+    run_benchmark()
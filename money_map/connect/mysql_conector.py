@@ -1,14 +1,40 @@
 import os
-from typing import Any
+import threading
+from typing import Any, Dict, List, Tuple
 from dotenv import load_dotenv,find_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 
 from money_map.models.orm_models import Base
+from money_map.models.migrations import run_migrations, find_missing_indexes
 
 class  MySQLConnector:
 
     # region [init]
     # Instance variables and instance methods are associated with the object.
+    def __init__(self,
+                 pool_size:int=5,
+                 max_overflow:int=10,
+                 pool_pre_ping:bool=True,
+                 pool_recycle:int=3600) -> None:
+        '''MySQL connector, engines are shared process-wide per URL and pool
+           settings.
+
+        Parameters
+        ----------
+        pool_size : int, optional
+            Number of connections kept open in the pool, by default 5
+        max_overflow : int, optional
+            Connections allowed on top of pool_size, by default 10
+        pool_pre_ping : bool, optional
+            Test connections for liveness before using them, by default True
+        pool_recycle : int, optional
+            Recycle connections after this many seconds, by default 3600
+        '''
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_pre_ping = pool_pre_ping
+        self.pool_recycle = pool_recycle
     #endregion
 
     # region [public]
@@ -34,25 +60,74 @@ class  MySQLConnector:
         '''
         return f"mysql+pymysql://{user}:{pw}@{host}:{port}/{db}"
 
-    def create_sql_engine(self) -> Any:
-        '''Create SQLAlchemy Engine
+    def create_sql_engine(self) -> Engine:
+        '''Returns the cached SQLAlchemy Engine for the configured database,
+           the engine (and its connection pool) is created on first use.
+           Engines inherited from a parent process are reset, so pooled
+           connections are never shared across a fork.
 
         Returns
         -------
-        Any
+        Engine
             SQLAlchemy Engine
         '''
-        load_dotenv(find_dotenv())
-        return create_engine(self.create_db_url(user=os.getenv("MYSQL_USER"),
-                                                pw=os.getenv("MYSQL_PASSWORD"),
-                                                host=os.getenv("MYSQL_HOST"),
-                                                db=os.getenv("MYSQL_DATABASE"),
-                                                port=int(os.getenv("MYSQL_PORT"))))
-
-    def create_tables(self) -> None:
-        ''' Creates all tables in defined database, if not existing.
+        url, local_infile = self._engine_config()
+        key = self._engine_key(url=url, local_infile=local_infile)
+
+        with MySQLConnector._lock:
+            engine = MySQLConnector._engines.get(key)
+            if engine is None:
+                engine = create_engine(url,
+                                       pool_size=self.pool_size,
+                                       max_overflow=self.max_overflow,
+                                       pool_pre_ping=self.pool_pre_ping,
+                                       pool_recycle=self.pool_recycle,
+                                       connect_args={"local_infile":local_infile})
+                MySQLConnector._engines[key] = engine
+                MySQLConnector._engine_pids[key] = os.getpid()
+            elif MySQLConnector._engine_pids[key] != os.getpid():
+                # forked child: drop inherited connections without closing
+                # them, they still belong to the parent process
+                engine.dispose(close=False)
+                MySQLConnector._engine_pids[key] = os.getpid()
+        return engine
+
+    def create_tables(self, verbose:bool=True) -> List[str]:
+        ''' Creates all tables in defined database, if not existing, applies
+            pending schema migrations to existing tables and reports indexes
+            missing in the database.
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            Print applied migrations & missing indexes, by default True
+
+        Returns
+        -------
+        List[str]
+            Missing indexes, see find_missing_indexes.
         '''
-        Base.metadata.create_all(bind=self.create_sql_engine())
+        engine = self.create_sql_engine()
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine=engine, verbose=verbose)
+
+        missing_indexes = find_missing_indexes(engine=engine)
+        if verbose and len(missing_indexes) > 0:
+            print(f"Missing Indexes: {', '.join(missing_indexes)}")
+        return missing_indexes
+
+    def dispose(self) -> None:
+        ''' Closes all pooled connections of the engine of this connector
+            (configured URL & pool settings) and removes it from the registry.
+            Engines of other URLs are kept.
+        '''
+        url, local_infile = self._engine_config()
+        key = self._engine_key(url=url, local_infile=local_infile)
+        with MySQLConnector._lock:
+            engine = MySQLConnector._engines.pop(key, None)
+            MySQLConnector._engine_pids.pop(key, None)
+        if engine is not None:
+            engine.dispose()
         return
 
     #endregion
@@ -62,6 +137,25 @@ class  MySQLConnector:
 
     # region [class]
     # Class variables and class methods are associated with a class (classmethods).
+    _engines:Dict[Tuple[Any,...],Engine] = {}
+    _engine_pids:Dict[Tuple[Any,...],int] = {}
+    _lock:threading.Lock = threading.Lock()
+
+    @classmethod
+    def dispose_all(cls) -> None:
+        ''' Closes all pooled connections of all cached engines.
+        '''
+        with cls._lock:
+            for engine in cls._engines.values():
+                engine.dispose()
+            cls._engines.clear()
+            cls._engine_pids.clear()
+        return
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        # the lock could have been held by another thread of the parent
+        cls._lock = threading.Lock()
     #endregion
 
     # region [properties]
@@ -69,8 +163,29 @@ class  MySQLConnector:
 
     # region [protected]
     # Protected variables and protected methods, accessed by class they are in and inheriting classes.
+    def _engine_config(self) -> Tuple[str,bool]:
+        load_dotenv(find_dotenv())
+        url = self.create_db_url(user=os.getenv("MYSQL_USER"),
+                                 pw=os.getenv("MYSQL_PASSWORD"),
+                                 host=os.getenv("MYSQL_HOST"),
+                                 db=os.getenv("MYSQL_DATABASE"),
+                                 port=int(os.getenv("MYSQL_PORT")))
+        # client side permission for LOAD DATA LOCAL INFILE (bulk loads)
+        local_infile = os.getenv("MYSQL_LOCAL_INFILE","0").lower() in ("1","true")
+        return url, local_infile
+
+    def _pool_settings(self) -> Tuple[Any,...]:
+        return (self.pool_size, self.max_overflow,
+                self.pool_pre_ping, self.pool_recycle)
+
+    def _engine_key(self, url:str, local_infile:bool) -> Tuple[Any,...]:
+        return (url, *self._pool_settings(), local_infile)
     #endregion
 
     # region [overwrite]
     # Overwrite variables and methods given by parent class.
     #endregion
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=MySQLConnector._after_fork_in_child)
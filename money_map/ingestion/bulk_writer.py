@@ -0,0 +1,139 @@
+import os
+import tempfile
+from typing import Any, Dict, List, Union
+
+import pandas as pd
+from attrs import define
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def dataframe_to_records(df:pd.DataFrame) -> List[Dict[str,Any]]:
+    '''Convert df to a list of dicts with native python values: datetimes
+       become dates, missing values become None.
+    '''
+    records = df.astype(object).where(df.notna(), None)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            records[col] = df[col].dt.date.astype(object).where(df[col].notna(), None)
+    return records.to_dict("records")
+
+
+def dataframe_to_load_data_lines(df:pd.DataFrame) -> pd.Series:
+    '''Format df as lines of a tab separated file in the default format of
+       LOAD DATA INFILE: backslash escaping and \\N for missing values.
+    '''
+    fields = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            text = values.dt.strftime("%Y-%m-%d")
+        elif pd.api.types.is_numeric_dtype(values):
+            text = values.astype(str)
+        else:
+            text = (values.astype(str)
+                    .str.replace("\\", "\\\\", regex=False)
+                    .str.replace("\t", "\\t", regex=False)
+                    .str.replace("\n", "\\n", regex=False)
+                    .str.replace("\r", "\\r", regex=False))
+        fields.append(text.where(values.notna(), "\\N"))
+    return fields[0].str.cat(fields[1:], sep="\t")
+
+# =============================================================================
+# Bulk Writer
+# =============================================================================
+
+@define
+class Bulk_Writer:
+    '''Writes DataFrames into existing tables. Uses LOAD DATA LOCAL INFILE from
+       a temporary file if client & server allow it, otherwise multi row
+       inserts in batches of batch_size rows.
+    '''
+
+    # region [init]
+    batch_size:int = 10000
+    use_load_data:bool = True
+    # None = not checked yet, disabled after the first failure
+    load_data_supported:Union[bool,None] = None
+    # endregion
+
+    # region [public]
+    def write(self, connection:Connection, df:pd.DataFrame, table:Table) -> int:
+        '''Insert all rows of df into table.
+
+        Parameters
+        ----------
+        connection : Connection
+            SQLAlchemy connection, should be inside a transaction.
+        df : pd.DataFrame
+            Rows to insert, columns must be a subset of table columns.
+        table : Table
+            Target table.
+
+        Returns
+        -------
+        int
+            Number of inserted rows.
+        '''
+        if df.empty:
+            return 0
+
+        if self.use_load_data and self.supports_load_data(connection=connection):
+            try:
+                # savepoint, a failing LOAD DATA must not abort the transaction
+                with connection.begin_nested():
+                    return self.load_data_infile(connection=connection, df=df, table=table)
+            except DBAPIError:
+                self.load_data_supported = False
+
+        return self.insert_batches(connection=connection, df=df, table=table)
+
+    def insert_batches(self, connection:Connection, df:pd.DataFrame, table:Table) -> int:
+        '''Multi row inserts (executemany) with batch_size rows per batch.
+        '''
+        stmt = table.insert()
+        rowcount = 0
+        for start in range(0, df.shape[0], self.batch_size):
+            records = dataframe_to_records(df.iloc[start:start+self.batch_size])
+            connection.execute(stmt, records)
+            rowcount += len(records)
+        return rowcount
+
+    def load_data_infile(self, connection:Connection, df:pd.DataFrame, table:Table) -> int:
+        '''LOAD DATA LOCAL INFILE from a temporary tab separated file.
+        '''
+        lines = dataframe_to_load_data_lines(df)
+        columns = ", ".join(connection.dialect.identifier_preparer.quote(col)
+                            for col in df.columns)
+        table_name = connection.dialect.identifier_preparer.format_table(table)
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n",
+                                         suffix=".tsv", delete=False) as f:
+            f.write("\n".join(lines.tolist()))
+            f.write("\n")
+        try:
+            result = connection.exec_driver_sql(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} "
+                f"CHARACTER SET utf8mb4 ({columns})", (f.name,))
+            rowcount = result.rowcount
+        finally:
+            os.remove(f.name)
+        return rowcount
+
+    def supports_load_data(self, connection:Connection) -> bool:
+        '''Checks once if the server allows LOAD DATA LOCAL INFILE.
+        '''
+        if self.load_data_supported is None:
+            self.load_data_supported = False
+            if connection.dialect.name == "mysql":
+                row = connection.exec_driver_sql(
+                    "SHOW GLOBAL VARIABLES LIKE 'local_infile'").fetchone()
+                self.load_data_supported = (row is not None and
+                                            str(row[1]).upper() in ("ON", "1"))
+        return self.load_data_supported
+    # endregion
@@ -1,18 +1,19 @@
 # stdlib
 from pathlib import Path
-from typing import List
 
-from attrs import define
+from attrs import define, field
 import pandas as pd
 import json
 
-from sqlalchemy import select, inspect
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
 
 # custom class
 from money_map.ingestion.ingestor import Ingestor
 from money_map.models.orm_models import Transaction_Categories_Table
 from money_map.connect.mysql_conector import MySQLConnector
+from money_map.ingestion.staging import insert_missing_rows
+from money_map.ingestion.bulk_writer import Bulk_Writer
+from money_map.pipelines.data_versions import bump_data_version
 
 # =============================================================================
 # Transaction Categories
@@ -25,6 +26,7 @@ class Categories_Ingestor(Ingestor):
     target_table_name:str = Transaction_Categories_Table.__tablename__
     primary_key_col:str = inspect(Transaction_Categories_Table).primary_key[0].name
     connector:MySQLConnector = MySQLConnector()
+    bulk_writer:Bulk_Writer = field(factory=Bulk_Writer)
     # endregion
 
     # region [public]
@@ -36,14 +38,13 @@ class Categories_Ingestor(Ingestor):
         df = self.clean_data(df=df)
         self.connector.create_tables()
 
-        contained_ids = self.request_processed_ids()
+        rows_stored = self.store_data(df=df)
 
-        if not contained_ids:
-            self.store_data(df=df)
-            if verbose:
-                print(" -> Recreated: ", Transaction_Categories_Table.__tablename__)
-        else:
-            if verbose:
+        if verbose:
+            if rows_stored > 0:
+                print(" -> Added", rows_stored, "categories to:",
+                      Transaction_Categories_Table.__tablename__)
+            else:
                 print(" -> ", Transaction_Categories_Table.__tablename__,
                       " already exists!")
         return
@@ -83,20 +84,15 @@ class Categories_Ingestor(Ingestor):
     def clean_data(self,df: pd.DataFrame) -> pd.DataFrame:
         return df
 
-    def request_processed_ids(self) -> List[str]:
-        with Session(self.connector.create_sql_engine()) as session:
-            stmt = select(Transaction_Categories_Table.category_id).distinct()
-            df = pd.read_sql(stmt,session.bind)
-            res = list(df[self.primary_key_col].tolist())
-        return res
-
-    def store_data(self, df: pd.DataFrame,
-                   if_exists:str='replace') -> None:
-        df.to_sql(con=self.connector.create_sql_engine(),
-                  name=self.target_table_name,
-                  if_exists=if_exists,
-                  index=False)
-        return
+    def store_data(self, df: pd.DataFrame) -> int:
+        with self.connector.create_sql_engine().begin() as connection:
+            rows_stored = insert_missing_rows(connection=connection,
+                                              df=df,
+                                              target_table=Transaction_Categories_Table.__table__,
+                                              bulk_writer=self.bulk_writer)
+            if rows_stored != 0:
+                bump_data_version(connection, Transaction_Categories_Table.__tablename__)
+        return rows_stored
 
     # endregion
 
@@ -0,0 +1,104 @@
+import re
+import csv
+import mmap
+import codecs
+from pathlib import Path
+
+from attrs import define
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+NON_ASCII_PATTERN:re.Pattern = re.compile(rb'[\x80-\xff]')
+DEFAULT_SAMPLE_SIZE:int = 64 * 1024
+DEFAULT_DELIMITERS:str = ';,\t|'
+
+# =============================================================================
+# CSV Format
+# =============================================================================
+
+@define
+class CSV_Format:
+    '''Encoding and delimiter of a csv file.'''
+
+    encoding:str = 'utf-8'
+    sep:str = ';'
+
+
+def detect_encoding(view:mmap.mmap, sample_size:int=DEFAULT_SAMPLE_SIZE) -> str:
+    '''Detect encoding of a memory mapped file from its first sample_size
+       bytes: a sample starting at the first non ascii byte is decoded as
+       utf-8. Invalid utf-8 after the sample is not detected, readers fall
+       back to latin1 on decode errors (see RBPN_Ingestor.read_data).
+
+    Parameters
+    ----------
+    view : mmap.mmap
+        Memory mapped file.
+    sample_size : int, optional
+        Number of bytes to decode, by default DEFAULT_SAMPLE_SIZE
+
+    Returns
+    -------
+    str
+        'utf-8-sig', 'utf-8' or 'latin1'
+    '''
+    if view[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+        return 'utf-8-sig'
+
+    # bounded search, pure ascii files are not scanned completely
+    match = NON_ASCII_PATTERN.search(view, 0, sample_size)
+    if match is None:
+        return 'utf-8'
+
+    # sample may end within a multi byte character, decode incrementally
+    sample = view[match.start():match.start()+sample_size]
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'latin1'
+    return 'utf-8'
+
+
+def detect_csv_format(file_path:Path,
+                      sample_size:int=DEFAULT_SAMPLE_SIZE,
+                      delimiters:str=DEFAULT_DELIMITERS,
+                      default_sep:str=';') -> CSV_Format:
+    '''Detect encoding and delimiter of a csv file from a bounded byte sample
+       read through a memory mapped view, so the file only has to be parsed
+       once.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path of csv file.
+    sample_size : int, optional
+        Maximum number of bytes decoded, by default DEFAULT_SAMPLE_SIZE
+    delimiters : str, optional
+        Possible delimiters, by default DEFAULT_DELIMITERS
+    default_sep : str, optional
+        Delimiter used if it can not be detected, by default ';'
+
+    Returns
+    -------
+    CSV_Format
+        Detected encoding and delimiter.
+    '''
+    with open(file_path, 'rb') as f:
+        # empty files can not be memory mapped
+        if Path(file_path).stat().st_size == 0:
+            return CSV_Format(sep=default_sep)
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            encoding = detect_encoding(view=view, sample_size=sample_size)
+            sample = view[:sample_size].decode(encoding, errors='ignore')
+
+    # delimiter is detected on the header line
+    header = sample.splitlines()[0] if sample else ''
+    try:
+        sep = csv.Sniffer().sniff(header, delimiters=delimiters).delimiter
+    except csv.Error:
+        sep = default_sep
+
+    return CSV_Format(encoding=encoding, sep=sep)
@@ -0,0 +1,128 @@
+import sys
+import time
+from pathlib import Path
+from typing import List, Union
+
+from attrs import define, field
+
+try:
+    import resource
+except ImportError:  # resource module is not available on windows
+    resource = None
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def get_peak_rss_mb() -> Union[float,None]:
+    '''Peak resident set size (high-water mark) of the current process.
+
+    Returns
+    -------
+    Union[float,None]
+        Peak RSS in MB, None if it can not be determined on this platform.
+    '''
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak_rss / (1024 * 1024)
+    return peak_rss / 1024
+
+# =============================================================================
+# Chunk Statistics
+# =============================================================================
+
+@define
+class Chunk_Stats:
+    '''Statistics of a single processed chunk during streaming ingestion.'''
+
+    chunk_number:int
+    rows_read:int
+    rows_stored:int
+    seconds:float
+    peak_rss_mb:Union[float,None] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return self.rows_read / self.seconds
+
+    def __str__(self) -> str:
+        peak_rss = ('n/a' if self.peak_rss_mb is None
+                    else f'{self.peak_rss_mb:.1f} MB')
+        return (f'chunk {self.chunk_number}: {self.rows_read} rows read, '
+                f'{self.rows_stored} rows stored, '
+                f'{self.rows_per_second:.0f} rows/s, peak RSS {peak_rss}')
+
+# =============================================================================
+# Ingestion Result
+# =============================================================================
+
+@define
+class Ingestion_Result:
+    '''Summary of a single ingestion run.'''
+
+    file_path:Union[Path,None] = None
+    encoding:Union[str,None] = None
+    sep:Union[str,None] = None
+    skipped:bool = False
+    error:Union[str,None] = None
+    rows_read:int = 0
+    rows_stored:int = 0
+    seconds:float = 0.0
+    parse_seconds:float = 0.0
+    store_seconds:float = 0.0
+    chunks:List[Chunk_Stats] = field(factory=list)
+    start_time:float = field(factory=time.perf_counter,repr=False)
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return self.rows_read / self.seconds
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    @property
+    def peak_rss_mb(self) -> Union[float,None]:
+        values = [ele.peak_rss_mb for ele in self.chunks
+                  if ele.peak_rss_mb is not None]
+        return max(values) if values else get_peak_rss_mb()
+
+    def add_chunk(self, rows_read:int, rows_stored:int,
+                  seconds:float) -> Chunk_Stats:
+        '''Register statistics of a processed chunk.
+
+        Parameters
+        ----------
+        rows_read : int
+            Number of rows read from the source file.
+        rows_stored : int
+            Number of new rows stored in the target table.
+        seconds : float
+            Processing time of the chunk.
+
+        Returns
+        -------
+        Chunk_Stats
+            Statistics of the registered chunk.
+        '''
+        chunk_stats = Chunk_Stats(chunk_number=len(self.chunks)+1,
+                                  rows_read=rows_read,
+                                  rows_stored=rows_stored,
+                                  seconds=seconds,
+                                  peak_rss_mb=get_peak_rss_mb())
+        self.chunks.append(chunk_stats)
+        self.rows_read += rows_read
+        self.rows_stored += rows_stored
+        return chunk_stats
+
+    def finish(self) -> 'Ingestion_Result':
+        self.seconds = time.perf_counter() - self.start_time
+        return self
@@ -17,7 +17,7 @@ class Ingestor(ABC):
     def ingest_data(self,
                     file_path: Union[Path,None],
                     verbose:bool
-                    ) -> pd.DataFrame:
+                    ) -> Any:
         pass
     # endregion
 
@@ -45,15 +45,10 @@ class Ingestor(ABC):
                    ) -> pd.DataFrame:
         pass
 
-    @abstractmethod
-    def request_processed_ids(self,
-                              ) -> List[str]:
-        pass
-
     @abstractmethod
     def store_data(self,
-                   df: pd.DataFrame,
-                   if_exists:str='append') -> None:
+                   df: pd.DataFrame
+                   ) -> int:
         pass
 
 
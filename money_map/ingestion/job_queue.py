@@ -0,0 +1,176 @@
+import os
+import uuid
+import traceback
+from pathlib import Path
+from typing import Dict, List, Union
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from attrs import define, field
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from money_map.connect.mysql_conector import MySQLConnector
+from money_map.models.orm_models import Ingestion_Jobs_Table
+from money_map.ingestion.ingestion_result import Chunk_Stats
+from money_map.ingestion.rbpn_ingestion import RBPN_Ingestor, RBPN_DEFAULT_CHUNKSIZE
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+JOB_STATUS_QUEUED:str = "queued"
+JOB_STATUS_RUNNING:str = "running"
+JOB_STATUS_FINISHED:str = "finished"
+JOB_STATUS_FAILED:str = "failed"
+
+# available ingestion channels
+INGESTORS:Dict[str,type] = {"RBPN": RBPN_Ingestor}
+
+DEFAULT_UPLOAD_DIR:Path = Path(os.getenv("MONEY_MAP_UPLOAD_DIR","data/raw/uploads"))
+
+# =============================================================================
+# Ingestion Job Queue
+# =============================================================================
+
+@define
+class Ingestion_Job_Queue:
+    '''Persistent queue of ingestion jobs (Ingestion_Jobs_Table) processed by
+       a local background thread pool. Jobs survive restarts: unfinished jobs
+       are picked up again by resume().
+    '''
+
+    # region [init]
+    connector:MySQLConnector = MySQLConnector()
+    upload_dir:Path = DEFAULT_UPLOAD_DIR
+    max_workers:int = 1
+    chunksize:int = RBPN_DEFAULT_CHUNKSIZE
+
+    # post init
+    executor:ThreadPoolExecutor = field(init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="ingestion")
+    # endregion
+
+    # region [public]
+    def enqueue(self, file_name:str, data:bytes, channel:str="RBPN") -> int:
+        '''Save uploaded file and enqueue an ingestion job for it.
+
+        Parameters
+        ----------
+        file_name : str
+            Original file name.
+        data : bytes
+            File content.
+        channel : str, optional
+            Ingestion channel, key of INGESTORS, by default "RBPN"
+
+        Returns
+        -------
+        int
+            Id of the created job.
+        '''
+        if channel not in INGESTORS:
+            raise Exception(f"Unknown Ingestion Channel: {channel}")
+
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        file_path = self.upload_dir.joinpath(f"{uuid.uuid4().hex}_{Path(file_name).name}")
+        file_path.write_bytes(data)
+
+        with Session(self.connector.create_sql_engine()) as session:
+            job = Ingestion_Jobs_Table(channel=channel,
+                                       file_name=Path(file_name).name,
+                                       file_path=str(file_path),
+                                       status=JOB_STATUS_QUEUED,
+                                       rows_processed=0,
+                                       rows_stored=0)
+            session.add(job)
+            session.commit()
+            job_id = job.job_id
+
+        self.executor.submit(self.run_job, job_id)
+        return job_id
+
+    def resume(self) -> List[int]:
+        '''Submit jobs which are queued or were interrupted while running.
+
+        Returns
+        -------
+        List[int]
+            Ids of resubmitted jobs.
+        '''
+        with Session(self.connector.create_sql_engine()) as session:
+            job_ids = session.scalars(
+                select(Ingestion_Jobs_Table.job_id)
+                .where(Ingestion_Jobs_Table.status.in_([JOB_STATUS_QUEUED,
+                                                        JOB_STATUS_RUNNING]))
+                .order_by(Ingestion_Jobs_Table.job_id)).all()
+
+        for job_id in job_ids:
+            self.executor.submit(self.run_job, job_id)
+        return list(job_ids)
+
+    def get_jobs(self, limit:int=20) -> pd.DataFrame:
+        '''Most recent jobs including status, progress and errors.
+        '''
+        with Session(self.connector.create_sql_engine()) as session:
+            stmt = (select(Ingestion_Jobs_Table.job_id,
+                           Ingestion_Jobs_Table.channel,
+                           Ingestion_Jobs_Table.file_name,
+                           Ingestion_Jobs_Table.status,
+                           Ingestion_Jobs_Table.rows_processed,
+                           Ingestion_Jobs_Table.rows_stored,
+                           Ingestion_Jobs_Table.error,
+                           Ingestion_Jobs_Table.created_at,
+                           Ingestion_Jobs_Table.updated_at)
+                    .order_by(Ingestion_Jobs_Table.job_id.desc())
+                    .limit(limit))
+            df = pd.read_sql(stmt, session.bind)
+        return df
+
+    def run_job(self, job_id:int) -> None:
+        '''Execute a single job, executed by the background threads.
+        '''
+        with Session(self.connector.create_sql_engine()) as session:
+            job = session.get(Ingestion_Jobs_Table, job_id)
+            if job is None or job.status not in [JOB_STATUS_QUEUED, JOB_STATUS_RUNNING]:
+                return
+            channel, file_path = job.channel, job.file_path
+
+        self.update_job(job_id=job_id, status=JOB_STATUS_RUNNING,
+                        rows_processed=0, rows_stored=0)
+
+        progress = {"rows_processed":0, "rows_stored":0}
+        def report_progress(chunk_stats:Chunk_Stats) -> None:
+            progress["rows_processed"] += chunk_stats.rows_read
+            progress["rows_stored"] += chunk_stats.rows_stored
+            self.update_job(job_id=job_id, **progress)
+
+        try:
+            ingestor = INGESTORS[channel](connector=self.connector)
+            ingestor.ingest_data(file_path=Path(file_path),
+                                 verbose=False,
+                                 chunksize=self.chunksize,
+                                 progress_callback=report_progress)
+            self.update_job(job_id=job_id, status=JOB_STATUS_FINISHED)
+        except Exception as e:
+            traceback.print_exc()
+            self.update_job(job_id=job_id, status=JOB_STATUS_FAILED,
+                            error=f"{type(e).__name__}: {e}"[:1000])
+        return
+
+    def update_job(self, job_id:int, **values:Union[str,int]) -> None:
+        with Session(self.connector.create_sql_engine()) as session:
+            session.execute(update(Ingestion_Jobs_Table)
+                            .where(Ingestion_Jobs_Table.job_id==job_id)
+                            .values(**values))
+            session.commit()
+        return
+
+    def shutdown(self, wait:bool=True) -> None:
+        self.executor.shutdown(wait=wait)
+        return
+    # endregion
@@ -0,0 +1,295 @@
+import io
+import hashlib
+import datetime
+from pathlib import Path
+from typing import Dict, List, Set, Union
+
+import pandas as pd
+from attrs import define, field
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from money_map.connect.mysql_conector import MySQLConnector
+from money_map.models.orm_models import Ingestion_Manifest_Table
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# the head of a file (header + first data line) identifies exports which grew
+HEAD_LINES:int = 2
+HEAD_MAX_BYTES:int = 64 * 1024
+HASH_BLOCK_SIZE:int = 1024 * 1024
+
+# =============================================================================
+# File Fingerprint
+# =============================================================================
+
+@define
+class File_Fingerprint:
+    '''Content hashes and size of a file. file_hash is None until the whole
+       file was hashed.'''
+
+    head_hash:str
+    file_size:int
+    file_hash:Union[str,None] = None
+    prefix_hashes:Dict[int,str] = field(factory=dict)
+
+
+def hash_file_head(file_path:Path,
+                   head_lines:int=HEAD_LINES,
+                   max_bytes:int=HEAD_MAX_BYTES) -> str:
+    '''sha256 of the first head_lines lines of a file.
+    '''
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for _ in range(head_lines):
+            hasher.update(f.readline(max_bytes))
+    return hasher.hexdigest()
+
+
+def fingerprint_file(file_path:Path,
+                     prefix_sizes:Union[List[int],None]=None,
+                     block_size:int=HASH_BLOCK_SIZE) -> File_Fingerprint:
+    '''Hash a file in one streaming pass. Hashes of the prefixes with the
+       given sizes are computed on the way.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path of file.
+    prefix_sizes : Union[List[int],None], optional
+        Sizes (bytes) of prefixes to hash, by default None
+    block_size : int, optional
+        Read block size, by default HASH_BLOCK_SIZE
+
+    Returns
+    -------
+    File_Fingerprint
+        Fingerprint of the file.
+    '''
+    hasher = hashlib.sha256()
+    prefix_hashes = {}
+    pending_sizes = sorted(set(prefix_sizes or []))
+    position = 0
+
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            # snapshot hash state at requested prefix sizes within this block
+            while pending_sizes and pending_sizes[0] <= position + len(block):
+                prefix_size = pending_sizes.pop(0)
+                prefix_hasher = hasher.copy()
+                prefix_hasher.update(block[:prefix_size-position])
+                prefix_hashes[prefix_size] = prefix_hasher.hexdigest()
+            hasher.update(block)
+            position += len(block)
+
+    return File_Fingerprint(file_hash=hasher.hexdigest(),
+                            head_hash=hash_file_head(file_path=file_path),
+                            file_size=position,
+                            prefix_hashes=prefix_hashes)
+
+# =============================================================================
+# File Tail
+# =============================================================================
+
+class File_Tail_Stream(io.RawIOBase):
+    '''Readable stream of the header line of a file followed by its content
+       starting at offset. Used to parse only the new tail of a grown file.
+    '''
+
+    def __init__(self, file_path:Path, offset:int) -> None:
+        self.file = open(file_path, 'rb')
+        self.pending = self.file.readline()
+        self.file.seek(max(offset, len(self.pending)))
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.pending:
+            size = min(len(buffer), len(self.pending))
+            buffer[:size] = self.pending[:size]
+            self.pending = self.pending[size:]
+            return size
+        return self.file.readinto(buffer)
+
+    def close(self) -> None:
+        self.file.close()
+        super().close()
+
+
+def open_file_tail(file_path:Path, offset:int) -> io.BufferedReader:
+    '''Open header line + content after offset of a file as binary stream.
+    '''
+    return io.BufferedReader(File_Tail_Stream(file_path=file_path, offset=offset))
+
+# =============================================================================
+# File Summary
+# =============================================================================
+
+@define
+class File_Summary:
+    '''Row count, booking date range and sender ibans of ingested rows.'''
+
+    row_count:int = 0
+    min_booking_date:Union[datetime.date,None] = None
+    max_booking_date:Union[datetime.date,None] = None
+    sender_ibans:Set[str] = field(factory=set)
+
+    def update(self, df:pd.DataFrame) -> None:
+        '''Add cleaned transactions to summary.'''
+        if df.empty:
+            return
+        self.row_count += df.shape[0]
+        dates = [pd.Timestamp(df["booking_date"].min()).date(),
+                 pd.Timestamp(df["booking_date"].max()).date()]
+        if self.min_booking_date is not None:
+            dates += [self.min_booking_date, self.max_booking_date]
+        self.min_booking_date = min(dates)
+        self.max_booking_date = max(dates)
+        self.sender_ibans.update(df["sender_iban"].astype(str).unique().tolist())
+
+# =============================================================================
+# Manifest Check
+# =============================================================================
+
+@define
+class Manifest_Check:
+    '''Result of looking up a file in the ingestion manifest.
+
+    status is one of:
+        - "new": file is unknown, ingest everything
+        - "ingested": identical file was already ingested, skip it
+        - "grown": file starts with an already ingested file, ingest the
+           content after offset only
+    '''
+
+    fingerprint:File_Fingerprint
+    status:str = "new"
+    offset:int = 0
+    previous:Union[Ingestion_Manifest_Table,None] = None
+
+# =============================================================================
+# Ingestion Manifest
+# =============================================================================
+
+@define
+class Ingestion_Manifest:
+
+    # region [init]
+    connector:MySQLConnector = MySQLConnector()
+    # endregion
+
+    # region [public]
+    def check(self, file_path:Path) -> Manifest_Check:
+        '''Look up file in manifest. Candidates are looked up by head hash and
+           size first (cheap), the file is hashed only if there is one:
+           identical files have the same size & content hash, grown files
+           start with the content of a smaller candidate. New files are
+           hashed by record().
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of export file.
+
+        Returns
+        -------
+        Manifest_Check
+            Status of the file and offset from which it has to be ingested.
+        '''
+        head_hash = hash_file_head(file_path=file_path)
+        file_size = Path(file_path).stat().st_size
+
+        with Session(self.connector.create_sql_engine(), expire_on_commit=False) as session:
+            candidates = session.scalars(
+                select(Ingestion_Manifest_Table)
+                .where(Ingestion_Manifest_Table.head_hash==head_hash,
+                       Ingestion_Manifest_Table.file_size<=file_size)
+                .order_by(Ingestion_Manifest_Table.file_size.desc())).all()
+
+        if not candidates:
+            return Manifest_Check(fingerprint=File_Fingerprint(head_hash=head_hash,
+                                                               file_size=file_size))
+
+        fingerprint = fingerprint_file(file_path=file_path,
+                                       prefix_sizes=[ele.file_size for ele in candidates
+                                                     if ele.file_size < file_size])
+        for candidate in candidates:
+            if (candidate.file_size == fingerprint.file_size
+                and candidate.file_hash == fingerprint.file_hash):
+                return Manifest_Check(fingerprint=fingerprint,
+                                      status="ingested",
+                                      offset=fingerprint.file_size,
+                                      previous=candidate)
+
+        # largest already ingested prefix, ending on a complete line
+        for candidate in candidates:
+            if (fingerprint.prefix_hashes.get(candidate.file_size)==candidate.file_hash
+                and self.ends_with_newline(file_path=file_path,
+                                           offset=candidate.file_size)):
+                return Manifest_Check(fingerprint=fingerprint,
+                                      status="grown",
+                                      offset=candidate.file_size,
+                                      previous=candidate)
+
+        return Manifest_Check(fingerprint=fingerprint)
+
+    def record(self, file_path:Path,
+               manifest_check:Manifest_Check,
+               summary:File_Summary) -> None:
+        '''Add ingested file to manifest. For grown files the summary of the
+           previously ingested prefix is merged.
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of export file.
+        manifest_check : Manifest_Check
+            Result of check() for this file.
+        summary : File_Summary
+            Summary of ingested rows.
+        '''
+        summary = File_Summary(row_count=summary.row_count,
+                               min_booking_date=summary.min_booking_date,
+                               max_booking_date=summary.max_booking_date,
+                               sender_ibans=set(summary.sender_ibans))
+
+        previous = manifest_check.previous
+        if manifest_check.status == "grown" and previous is not None:
+            summary.row_count += previous.row_count
+            dates = [ele for ele in [summary.min_booking_date, summary.max_booking_date,
+                                     previous.min_booking_date, previous.max_booking_date]
+                     if ele is not None]
+            summary.min_booking_date = min(dates) if dates else None
+            summary.max_booking_date = max(dates) if dates else None
+            if previous.sender_ibans:
+                summary.sender_ibans.update(previous.sender_ibans.split(","))
+
+        fingerprint = manifest_check.fingerprint
+        if fingerprint.file_hash is None:
+            fingerprint = fingerprint_file(file_path=file_path)
+        with Session(self.connector.create_sql_engine()) as session:
+            session.merge(Ingestion_Manifest_Table(
+                file_hash=fingerprint.file_hash,
+                head_hash=fingerprint.head_hash,
+                file_name=Path(file_path).name,
+                file_size=fingerprint.file_size,
+                row_count=summary.row_count,
+                min_booking_date=summary.min_booking_date,
+                max_booking_date=summary.max_booking_date,
+                sender_ibans=",".join(sorted(summary.sender_ibans))))
+            session.commit()
+        return
+    # endregion
+
+    # region [protected]
+    def ends_with_newline(self, file_path:Path, offset:int) -> bool:
+        if offset <= 0:
+            return False
+        with open(file_path, 'rb') as f:
+            f.seek(offset-1)
+            return f.read(1) == b'\n'
+    # endregion
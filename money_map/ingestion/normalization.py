@@ -0,0 +1,183 @@
+import re
+import hashlib
+from typing import Any, Dict, List, Mapping
+
+import pandas as pd
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# characters removed from purpose to define purpose_char
+PURPOSE_CHAR_PATTERN:re.Pattern = re.compile(r'[^a-zA-Z\s]')
+
+# columns identifying a participant, digested into participant_key
+PARTICIPANT_KEY_COLUMNS:List[str] = ['sender_bank_name', 'sender_iban',
+                                     'receiver_name', 'receiver_iban',
+                                     'booking_text', 'purpose_char']
+PARTICIPANT_KEY_SEPARATOR:str = "\x1f"
+
+# =============================================================================
+# Translation Tables
+# =============================================================================
+
+class Purpose_Char_Table(dict):
+    '''Translation table for str.translate, equivalent to
+       PURPOSE_CHAR_PATTERN.sub('', text).lower(): keeps whitespace and ascii
+       letters (lowercased), deletes every other character. Entries are
+       computed once per code point and cached.
+    '''
+
+    def __missing__(self, code_point:int):
+        char = chr(code_point)
+        if 'a' <= char <= 'z' or char.isspace():
+            value = code_point
+        elif 'A' <= char <= 'Z':
+            value = ord(char.lower())
+        else:
+            value = None
+        self[code_point] = value
+        return value
+
+PURPOSE_CHAR_TABLE:Purpose_Char_Table = Purpose_Char_Table()
+
+# =============================================================================
+# Normalization
+# =============================================================================
+
+def get_string_columns(df:pd.DataFrame) -> List[str]:
+    '''Columns of df which can contain strings (object or string dtype).
+    '''
+    return [col for col in df.columns
+            if pd.api.types.is_object_dtype(df[col])
+            or pd.api.types.is_string_dtype(df[col])]
+
+
+def translate_unique(series:pd.Series, table:Dict[int,str]) -> pd.Series:
+    '''Applies str.translate on the unique values of series only and maps the
+       results back. Non string values are kept as they are.
+
+    Parameters
+    ----------
+    series : pd.Series
+        Input series.
+    table : Dict[int,str]
+        Translation table, see str.maketrans.
+
+    Returns
+    -------
+    pd.Series
+        Translated series, same index as input.
+    '''
+    codes, uniques = pd.factorize(series)
+    translated = pd.Series(uniques).str.translate(table)
+    # str accessor returns NaN for non string values, restore them
+    translated = translated.fillna(pd.Series(uniques))
+    values = translated.to_numpy(dtype=object).take(codes)
+    result = pd.Series(values, index=series.index, name=series.name)
+    # factorize marks missing values with -1, keep them missing
+    return result.where(codes != -1, series)
+
+
+def normalize_purpose_char(purpose:pd.Series) -> pd.Series:
+    '''Defines purpose_char based on purpose: removes digits and symbols
+       and lowercases the result. Identical to applying
+       PURPOSE_CHAR_PATTERN.sub('', text).lower() on every row.
+
+    Parameters
+    ----------
+    purpose : pd.Series
+        Purpose column.
+
+    Returns
+    -------
+    pd.Series
+        purpose_char column.
+    '''
+    return translate_unique(series=purpose, table=PURPOSE_CHAR_TABLE)
+
+
+def transliterate_umlauts(df:pd.DataFrame,
+                          umlaute_mapping:Dict[str,str]) -> pd.DataFrame:
+    '''Replaces umlauts in all string columns of df, numeric columns are not
+       touched.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Input DataFrame.
+    umlaute_mapping : Dict[str,str]
+        Mapping of single characters to their replacement, e.g. {'ü':'ue'}.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame with transliterated umlauts.
+    '''
+    table = str.maketrans(umlaute_mapping)
+    for col in get_string_columns(df):
+        df[col] = translate_unique(series=df[col], table=table)
+    return df
+
+
+def normalize_participant_value(value:Any) -> str:
+    '''Normalized participant column value: leading & trailing blanks removed
+       and lowercased. Accents are kept.
+
+       This is not a MySQL collation: utf8mb4_0900_ai_ci (the default) is
+       accent insensitive and NO PAD, and no collation ignores leading
+       blanks. Compared with the former equality join on the six columns,
+       values differing in accents no longer match, values differing in
+       leading blanks now do.
+    '''
+    return str(value).strip(" ").lower()
+
+
+def participant_key(participant:Mapping[str,Any]) -> str:
+    '''Fixed width key (md5 hex digest, 32 characters) of a participant, based
+       on the normalized values of PARTICIPANT_KEY_COLUMNS (see
+       normalize_participant_value). Two participants match if all these
+       values are equal after trimming blanks & lowercasing.
+
+       Labels made under the former collation based join can be re-split:
+       transactions whose values differ from the label only in accents get
+       another key and show up as unlabeled again.
+
+    Parameters
+    ----------
+    participant : Mapping[str,Any]
+        Participant, e.g. a row of transactions as dict.
+
+    Returns
+    -------
+    str
+        participant_key
+    '''
+    text = PARTICIPANT_KEY_SEPARATOR.join(normalize_participant_value(participant[col])
+                                          for col in PARTICIPANT_KEY_COLUMNS)
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def compute_participant_keys(df:pd.DataFrame) -> pd.Series:
+    '''Vectorized participant_key for all rows of df, identical to applying
+       participant_key on every row. Each distinct participant is hashed once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame containing PARTICIPANT_KEY_COLUMNS.
+
+    Returns
+    -------
+    pd.Series
+        participant_key column, same index as df.
+    '''
+    parts = [df[col].astype(str).str.strip(" ").str.lower()
+             for col in PARTICIPANT_KEY_COLUMNS]
+    texts = parts[0].str.cat(parts[1:], sep=PARTICIPANT_KEY_SEPARATOR)
+
+    codes, uniques = pd.factorize(texts)
+    digests = pd.Series([hashlib.md5(text.encode("utf-8")).hexdigest()
+                         for text in uniques], dtype=object)
+    return pd.Series(digests.to_numpy().take(codes), index=df.index,
+                     name="participant_key", dtype=object)
@@ -1,18 +1,39 @@
 # stdlib
-import re
+import os
+import glob
+import time
 from pathlib import Path
-from typing import List,Dict
+from contextlib import nullcontext
+from typing import Callable,List,Dict,Iterator,Tuple,Union
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
-from attrs import define
+from attrs import define, field
 import pandas as pd
 
-from sqlalchemy import select, inspect
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
 
 # custom class
 from money_map.connect.mysql_conector import MySQLConnector
 from money_map.models.orm_models import Transactions_Table
 from money_map.ingestion.ingestor import Ingestor
+from money_map.ingestion.ingestion_result import Ingestion_Result, Chunk_Stats
+from money_map.ingestion.csv_format import CSV_Format, detect_csv_format
+from money_map.ingestion.manifest import (Ingestion_Manifest, Manifest_Check,
+                                          File_Summary, open_file_tail)
+from money_map.ingestion.staging import insert_missing_rows
+from money_map.ingestion.bulk_writer import Bulk_Writer
+from money_map.pipelines.rollups import refresh_daily_balance
+from money_map.pipelines.transactions import refresh_transactions_labeled
+from money_map.pipelines.data_versions import bump_data_version
+from money_map.pipelines.labeling_queue import enqueue_participants
+from money_map.pipelines.categorization_rules import (Rule_Matcher, categorize_participants,
+                                                       load_rule_matcher)
+from money_map.pipelines.participant_clusters import (Cluster_Report,
+                                                      update_participant_clusters)
+from money_map.ingestion.normalization import (PURPOSE_CHAR_PATTERN,
+                                               normalize_purpose_char,
+                                               transliterate_umlauts,
+                                               compute_participant_keys)
 
 # =============================================================================
 # Constants for cleaning input data
@@ -45,6 +66,9 @@ RBPN_UMLAUTE_MAPPING:Dict[str,str] = {'ü':'ue', 'Ü':'Ue',
                                       'ö':'oe',  'Ö':'Oe',
                                       'ß':'ss'}
 
+# default number of rows per chunk in streaming mode
+RBPN_DEFAULT_CHUNKSIZE:int = 50000
+
 # =============================================================================
 # RBPN_Ingestor
 # =============================================================================
@@ -56,27 +80,280 @@ class RBPN_Ingestor(Ingestor):
     target_table_name:str = Transactions_Table.__tablename__
     primary_key_col:str = inspect(Transactions_Table).primary_key[0].name
     connector:MySQLConnector = MySQLConnector()
+    bulk_writer:Bulk_Writer = field(factory=Bulk_Writer)
+    use_manifest:bool = True
     # endregion
 
     # region [public]
-    def ingest_data(self,file_path:Path,verbose:bool=True)-> None:
-
-        df = self.read_data(file_path=file_path)
+    def ingest_data(self,file_path:Path,verbose:bool=True,
+                    chunksize:Union[int,None]=None,
+                    progress_callback:Union[Callable[[Chunk_Stats],None],None]=None
+                    )-> Ingestion_Result:
+        '''Ingest RBPN export file into Transactions_Table.
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of RBPN export file.
+        verbose : bool, optional
+            Print progress, by default True
+        chunksize : Union[int,None], optional
+            If given, the file is streamed in chunks of chunksize rows so peak
+            memory is bounded by the chunk size, by default None
+        progress_callback : Union[Callable[[Chunk_Stats],None],None], optional
+            Called after every stored chunk (streaming mode), by default None
+
+        Returns
+        -------
+        Ingestion_Result
+            Summary of the ingestion run.
+        '''
+
+        if chunksize is not None:
+            return self.ingest_data_chunked(file_path=file_path,
+                                            chunksize=chunksize,
+                                            verbose=verbose,
+                                            progress_callback=progress_callback)
+
+        csv_format = detect_csv_format(file_path=file_path)
+        result = Ingestion_Result(file_path=file_path,
+                                  encoding=csv_format.encoding,
+                                  sep=csv_format.sep)
+
+        # skip files which were already ingested
+        manifest_check = self.check_manifest(file_path=file_path)
+        if self.is_ingested(manifest_check=manifest_check,verbose=verbose):
+            result.skipped = True
+            return result.finish()
+
+        df = self.read_data(file_path=file_path,csv_format=csv_format,
+                            offset=manifest_check.offset if manifest_check else 0)
+        result.encoding = csv_format.encoding
+        rows_read = df.shape[0]
         df = self.clean_data(df=df)
 
-        contained_ids = self.request_processed_ids()
-        df = df[~df[self.primary_key_col].isin(contained_ids)]
-
-        # ingest new data
-        if not df.empty:
-            self.store_data(df=df)
-            if verbose:
-                print('->', df.shape[0], 'new rows ingested!')
-        else:
-            if verbose:
+        # ingest new data, deduplication happens server side
+        rows_stored = self.store_data(df=df, rule_matcher=self.compile_rules())
+        self.record_manifest(file_path=file_path,
+                             manifest_check=manifest_check,
+                             summary=self.summarize(df=df))
+        if rows_stored > 0:
+            self.update_derived_tables(verbose=verbose)
+        if verbose:
+            if rows_stored > 0:
+                print('->', rows_stored, 'new rows ingested!')
+            else:
                 print('-> Data is already contained in SQL DB: ',
                       Transactions_Table.__tablename__)
-        return
+
+        result.add_chunk(rows_read=rows_read,
+                         rows_stored=rows_stored,
+                         seconds=time.perf_counter()-result.start_time)
+        return result.finish()
+
+    def ingest_data_chunked(self,file_path:Path,
+                            chunksize:int=RBPN_DEFAULT_CHUNKSIZE,
+                            verbose:bool=True,
+                            progress_callback:Union[Callable[[Chunk_Stats],None],None]=None
+                            ) -> Ingestion_Result:
+        '''Streaming ingestion: read, clean, deduplicate and store the file
+           in chunks of chunksize rows.
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of RBPN export file.
+        chunksize : int, optional
+            Number of rows per chunk, by default RBPN_DEFAULT_CHUNKSIZE
+        verbose : bool, optional
+            Print rows per second and peak RSS for each chunk, by default True
+        progress_callback : Union[Callable[[Chunk_Stats],None],None], optional
+            Called with the statistics of every stored chunk, by default None
+
+        Returns
+        -------
+        Ingestion_Result
+            Summary of the ingestion run including per chunk statistics.
+        '''
+
+        csv_format = detect_csv_format(file_path=file_path)
+        result = Ingestion_Result(file_path=file_path,
+                                  encoding=csv_format.encoding,
+                                  sep=csv_format.sep)
+
+        # skip files which were already ingested
+        manifest_check = self.check_manifest(file_path=file_path)
+        if self.is_ingested(manifest_check=manifest_check,verbose=verbose):
+            result.skipped = True
+            return result.finish()
+
+        summary = File_Summary()
+        rule_matcher = self.compile_rules()
+        chunk_start = time.perf_counter()
+        for chunk in self.read_data_chunks(file_path=file_path,
+                                           chunksize=chunksize,
+                                           csv_format=csv_format,
+                                           offset=manifest_check.offset if manifest_check else 0):
+            rows_read = chunk.shape[0]
+            df = self.clean_data(df=chunk)
+            # duplicates across chunks are skipped by the anti-join on insert
+            rows_stored = self.store_data(df=df, rule_matcher=rule_matcher)
+            summary.update(df=df)
+
+            chunk_stats = result.add_chunk(rows_read=rows_read,
+                                           rows_stored=rows_stored,
+                                           seconds=time.perf_counter()-chunk_start)
+            if verbose:
+                print('->', chunk_stats)
+            if progress_callback is not None:
+                progress_callback(chunk_stats)
+            chunk_start = time.perf_counter()
+
+        result.encoding = csv_format.encoding
+        self.record_manifest(file_path=file_path,
+                             manifest_check=manifest_check,
+                             summary=summary)
+        if result.rows_stored > 0:
+            self.update_derived_tables(verbose=verbose)
+
+        result.finish()
+        if verbose:
+            print('->', result.rows_stored, 'new rows ingested in',
+                  f'{result.seconds:.1f}s ({result.rows_per_second:.0f} rows/s)')
+        return result
+
+    def ingest_directory(self,path:Union[Path,str],
+                         pattern:str='*.csv',
+                         max_workers:Union[int,None]=None,
+                         verbose:bool=True) -> List[Ingestion_Result]:
+        '''Ingest multiple RBPN export files. Files are parsed and cleaned in a
+           process pool, the cleaned batches are stored one after another by
+           this process (single writer), so deduplication stays correct.
+
+        Parameters
+        ----------
+        path : Union[Path,str]
+            Directory containing export files or glob pattern, e.g.
+            "data/raw/*_2023*.csv".
+        pattern : str, optional
+            Glob pattern used if path is a directory, by default '*.csv'
+        max_workers : Union[int,None], optional
+            Number of worker processes, by default None (number of CPUs)
+        verbose : bool, optional
+            Print progress and per file timings, by default True
+
+        Returns
+        -------
+        List[Ingestion_Result]
+            One result per file, in order of completion. Files which could
+            not be parsed or stored are reported with error set, the other
+            files are ingested nevertheless.
+        '''
+
+        file_paths = self.find_files(path=path, pattern=pattern)
+        results:List[Ingestion_Result] = []
+        start = time.perf_counter()
+        rule_matcher = self.compile_rules()
+
+        max_workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # limit number of cleaned batches waiting for the writer
+            max_pending = 2 * max_workers
+            pending_paths = list(reversed(file_paths))
+            pending = {}
+
+            while pending_paths or pending:
+                while pending_paths and len(pending) < max_pending:
+                    file_path = pending_paths.pop()
+                    # skip files which were already ingested
+                    manifest_check = self.check_manifest(file_path=file_path)
+                    if self.is_ingested(manifest_check=manifest_check,verbose=False):
+                        results.append(Ingestion_Result(file_path=file_path,
+                                                        skipped=True).finish())
+                        if verbose:
+                            print(f'-> [{len(results)}/{len(file_paths)}]',
+                                  Path(file_path).name, ': already ingested, skipped')
+                        continue
+                    future = executor.submit(self.prepare_file,file_path,
+                                             manifest_check.offset if manifest_check else 0)
+                    pending[future] = (file_path, manifest_check)
+
+                if not pending:
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, manifest_check = pending.pop(future)
+                    # a corrupt export must not abort the whole batch
+                    try:
+                        df, rows_read, parse_seconds, csv_format = future.result()
+
+                        store_start = time.perf_counter()
+                        rows_stored = self.store_data(df=df, rule_matcher=rule_matcher)
+                        self.record_manifest(file_path=file_path,
+                                             manifest_check=manifest_check,
+                                             summary=self.summarize(df=df))
+                        store_seconds = time.perf_counter() - store_start
+                    except Exception as exception:
+                        results.append(Ingestion_Result(file_path=file_path,
+                                                        error=repr(exception)).finish())
+                        if verbose:
+                            print(f'-> [{len(results)}/{len(file_paths)}]',
+                                  Path(file_path).name, ': failed,', repr(exception))
+                        continue
+
+                    result = Ingestion_Result(file_path=file_path,
+                                              encoding=csv_format.encoding,
+                                              sep=csv_format.sep,
+                                              parse_seconds=parse_seconds,
+                                              store_seconds=store_seconds)
+                    result.add_chunk(rows_read=rows_read,
+                                     rows_stored=rows_stored,
+                                     seconds=parse_seconds+store_seconds)
+                    result.seconds = parse_seconds + store_seconds
+                    results.append(result)
+
+                    if verbose:
+                        print(f'-> [{len(results)}/{len(file_paths)}]',
+                              Path(file_path).name, ':',
+                              rows_read, 'rows read,', rows_stored, 'rows stored,',
+                              f'parse {parse_seconds:.2f}s, store {store_seconds:.2f}s')
+
+        if sum([ele.rows_stored for ele in results]) > 0:
+            self.update_derived_tables(verbose=verbose)
+        if verbose:
+            print('->', sum([ele.rows_stored for ele in results]),
+                  'new rows ingested from', len(results), 'files in',
+                  f'{time.perf_counter()-start:.1f}s')
+            failed = [ele for ele in results if ele.failed]
+            if failed:
+                print('->', len(failed), 'files failed:',
+                      ', '.join(Path(ele.file_path).name for ele in failed))
+        return results
+
+    def prepare_file(self,file_path:Path,offset:int=0
+                     ) -> Tuple[pd.DataFrame,int,float,CSV_Format]:
+        '''Read and clean a single file, executed by worker processes.
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of RBPN export file.
+        offset : int, optional
+            Byte offset from which the file is parsed, by default 0
+
+        Returns
+        -------
+        Tuple[pd.DataFrame,int,float,CSV_Format]
+            Cleaned data, number of rows read, parse time in seconds and
+            detected csv format.
+        '''
+        start = time.perf_counter()
+        csv_format = detect_csv_format(file_path=file_path)
+        df = self.read_data(file_path=file_path,csv_format=csv_format,offset=offset)
+        rows_read = df.shape[0]
+        df = self.clean_data(df=df)
+        return df, rows_read, time.perf_counter() - start, csv_format
 
     # endregion
 
@@ -90,18 +367,173 @@ class RBPN_Ingestor(Ingestor):
 
     # region [protected]
     def read_data(self,file_path: Path,
-                  file_format: str = '.csv') -> pd.DataFrame:
+                  file_format: str = '.csv',
+                  csv_format: Union[CSV_Format,None] = None,
+                  offset: int = 0) -> pd.DataFrame:
 
         if file_format == '.csv':
+            # encoding & delimiter are detected upfront, file is parsed once
+            if csv_format is None:
+                csv_format = detect_csv_format(file_path=file_path)
             try:
-                df = pd.read_csv(file_path,sep=';')
+                with self.open_source(file_path=file_path,offset=offset) as source:
+                    df = pd.read_csv(source,sep=csv_format.sep,
+                                     encoding=csv_format.encoding)
             except UnicodeDecodeError:
-                df = pd.read_csv(file_path,sep=';',encoding='latin1')
-                df = df.replace(RBPN_UMLAUTE_MAPPING,regex=True)
+                # invalid utf-8 after the detection sample
+                if csv_format.encoding == 'latin1':
+                    raise
+                csv_format.encoding = 'latin1'
+                with self.open_source(file_path=file_path,offset=offset) as source:
+                    df = pd.read_csv(source,sep=csv_format.sep,
+                                     encoding=csv_format.encoding)
+            if csv_format.encoding == 'latin1':
+                df = transliterate_umlauts(df=df,umlaute_mapping=RBPN_UMLAUTE_MAPPING)
             return df
         else:
             raise Exception('Unknown File Format!')
 
+    def read_data_chunks(self,file_path: Path,
+                         chunksize: int = RBPN_DEFAULT_CHUNKSIZE,
+                         file_format: str = '.csv',
+                         csv_format: Union[CSV_Format,None] = None,
+                         offset: int = 0
+                         ) -> Iterator[pd.DataFrame]:
+        '''Read RBPN export file lazily in chunks of chunksize rows. Only the
+           columns defined in RBPN_COLUMN_MAPPING are parsed.
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of RBPN export file.
+        chunksize : int, optional
+            Number of rows per chunk, by default RBPN_DEFAULT_CHUNKSIZE
+        file_format : str, optional
+            File format, by default '.csv'
+        csv_format : Union[CSV_Format,None], optional
+            Encoding & delimiter, detected if not given, by default None.
+            Switched to latin1 if invalid utf-8 occurs after the detection
+            sample, the rows after the last complete chunk are then reread.
+        offset : int, optional
+            Byte offset from which the file is parsed (header line is always
+            read), by default 0
+
+        Yields
+        ------
+        Iterator[pd.DataFrame]
+            Raw chunks of the export file.
+        '''
+
+        if file_format != '.csv':
+            raise Exception('Unknown File Format!')
+
+        if csv_format is None:
+            csv_format = detect_csv_format(file_path=file_path)
+
+        rows_yielded = 0
+        try:
+            for chunk in self.iter_csv_chunks(file_path=file_path,chunksize=chunksize,
+                                              csv_format=csv_format,offset=offset):
+                rows_yielded += chunk.shape[0]
+                yield chunk
+        except UnicodeDecodeError:
+            # invalid utf-8 after the detection sample
+            if csv_format.encoding == 'latin1':
+                raise
+            csv_format.encoding = 'latin1'
+            yield from self.iter_csv_chunks(file_path=file_path,chunksize=chunksize,
+                                            csv_format=csv_format,offset=offset,
+                                            skiprows=rows_yielded)
+
+    def iter_csv_chunks(self,file_path:Path,
+                        chunksize:int,
+                        csv_format:CSV_Format,
+                        offset:int=0,
+                        skiprows:int=0) -> Iterator[pd.DataFrame]:
+        '''Parse the export file in chunks, skipping the first skiprows data
+           rows (the header line is always read).
+        '''
+        with self.open_source(file_path=file_path,offset=offset) as source:
+            with pd.read_csv(source,sep=csv_format.sep,
+                             encoding=csv_format.encoding,
+                             usecols=list(RBPN_COLUMN_MAPPING.keys()),
+                             skiprows=range(1,skiprows+1),
+                             chunksize=chunksize) as reader:
+                for chunk in reader:
+                    if csv_format.encoding == 'latin1':
+                        chunk = transliterate_umlauts(df=chunk,
+                                                      umlaute_mapping=RBPN_UMLAUTE_MAPPING)
+                    yield chunk
+
+    def open_source(self,file_path:Path,offset:int=0):
+        '''Context manager yielding file_path itself or, for offset > 0, a
+           stream of the header line followed by the content after offset.
+        '''
+        if offset > 0:
+            return open_file_tail(file_path=file_path,offset=offset)
+        return nullcontext(file_path)
+
+    def check_manifest(self,file_path:Path) -> Union[Manifest_Check,None]:
+        if not self.use_manifest:
+            return None
+        return Ingestion_Manifest(connector=self.connector).check(file_path=file_path)
+
+    def is_ingested(self,manifest_check:Union[Manifest_Check,None],
+                    verbose:bool=True) -> bool:
+        if manifest_check is None or manifest_check.status != 'ingested':
+            if verbose and manifest_check is not None and manifest_check.status == 'grown':
+                print('-> File grew since last ingestion, processing new tail from byte',
+                      manifest_check.offset)
+            return False
+        if verbose:
+            print('-> File was already ingested: ', manifest_check.previous.file_name)
+        return True
+
+    def record_manifest(self,file_path:Path,
+                        manifest_check:Union[Manifest_Check,None],
+                        summary:File_Summary) -> None:
+        if manifest_check is None:
+            return
+        Ingestion_Manifest(connector=self.connector).record(file_path=file_path,
+                                                            manifest_check=manifest_check,
+                                                            summary=summary)
+        return
+
+    def summarize(self,df:pd.DataFrame) -> File_Summary:
+        summary = File_Summary()
+        summary.update(df=df)
+        return summary
+
+    def compile_rules(self) -> Rule_Matcher:
+        '''Categorization rules compiled once per ingestion run, rules added
+           meanwhile are applied by the full rebuild they trigger.
+        '''
+        engine = self.connector.create_sql_engine()
+        with engine.connect() as connection:
+            rule_matcher = load_rule_matcher(connection=connection)
+        return rule_matcher
+
+    def update_derived_tables(self,verbose:bool=True) -> Cluster_Report:
+        '''Extends Daily_Balance_Table, Transactions_Labeled_Table & the
+           monthly totals by the newly stored transactions and reclusters
+           the labeling queue.
+        '''
+        engine = self.connector.create_sql_engine()
+        refresh_daily_balance(engine=engine)
+        refresh_transactions_labeled(engine=engine)
+        report = update_participant_clusters(engine=engine, bulk_writer=self.bulk_writer)
+        if verbose:
+            print('-> Labeling queue:', report)
+        return report
+
+    def find_files(self,path:Union[Path,str],pattern:str='*.csv') -> List[Path]:
+        '''List files of a directory matching pattern or files matching the
+           glob pattern path, sorted by name.
+        '''
+        if Path(path).is_dir():
+            return sorted(Path(path).glob(pattern))
+        return sorted(Path(ele) for ele in glob.glob(str(path)))
+
     def clean_data(self,df: pd.DataFrame) -> pd.DataFrame:
 
         # drop empty rows
@@ -144,8 +576,7 @@ class RBPN_Ingestor(Ingestor):
                                 df['purpose'].astype(str).str[:8])
 
         # add column purpose_chars
-        df['purpose_char'] = df['purpose'].apply(self.remove_numbers_and_symbols)
-        df['purpose_char'] = df['purpose_char'].str.lower()
+        df['purpose_char'] = normalize_purpose_char(purpose=df['purpose'])
 
         # assure some columns are not null
         not_nullable_cols = ['sender_iban', 'sender_bank_name','receiver_name',
@@ -153,33 +584,55 @@ class RBPN_Ingestor(Ingestor):
                              'transaction_id', 'purpose_char']
         df[not_nullable_cols] = df[not_nullable_cols].fillna('')
 
+        # add participant key (join key to Participants_Labeled_Table)
+        df['participant_key'] = compute_participant_keys(df)
+
         # drop cols, rows & duplicates
         df = df.drop(columns=['day','month','year'])
         df = df.drop_duplicates()
 
         return df
 
-    def request_processed_ids(self) -> List[str]:
-        engine = self.connector.create_sql_engine()
-        with Session(engine) as session:
-            stmt = select(Transactions_Table.transaction_id).distinct()
-            df = pd.read_sql(stmt,session.bind)
-            res = list(df[self.primary_key_col].tolist())
-        return res
-
-    def store_data(self,
-                   df: pd.DataFrame,
-                   if_exists:str='append') -> None:
+    def store_data(self,df: pd.DataFrame,
+                   rule_matcher:Union[Rule_Matcher,None]=None) -> int:
+        '''Store rows of df whose transaction_id is not yet contained in
+           Transactions_Table, match their participants against the
+           categorization rules and queue the unlabeled ones.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Cleaned transactions.
+        rule_matcher : Union[Rule_Matcher,None], optional
+            Rules compiled once per ingestion run, by default None (compiled
+            for this batch)
+
+        Returns
+        -------
+        int
+            Number of new rows stored.
+        '''
+        if df.empty:
+            return 0
+
         engine = self.connector.create_sql_engine()
-        df.to_sql(con=engine,
-                  name=self.target_table_name,
-                  if_exists=if_exists,
-                  index=False)
-        return
+        with engine.begin() as connection:
+            rows_stored = insert_missing_rows(connection=connection,
+                                              df=df,
+                                              target_table=Transactions_Table.__table__,
+                                              bulk_writer=self.bulk_writer)
+            if rows_stored != 0:
+                bump_data_version(connection, Transactions_Table.__tablename__)
+                categorize_participants(connection=connection, df=df,
+                                        bulk_writer=self.bulk_writer,
+                                        rule_matcher=rule_matcher)
+                enqueue_participants(connection=connection, df=df,
+                                     bulk_writer=self.bulk_writer)
+        return rows_stored
 
     # Function to remove numbers from a string using regular expressions
     def remove_numbers_and_symbols(self, text):
-        return re.sub(r'[^a-zA-Z\s]', '', text)
+        return PURPOSE_CHAR_PATTERN.sub('', text)
 
     # endregion
 
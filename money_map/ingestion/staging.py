@@ -0,0 +1,112 @@
+from typing import List, Union
+
+import pandas as pd
+
+from sqlalchemy import Table, Column, MetaData, select, insert, exists, and_
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.engine import Connection
+
+from money_map.ingestion.bulk_writer import Bulk_Writer
+
+# =============================================================================
+# Staging Tables
+# =============================================================================
+
+def create_staging_table(target_table:Table,
+                         columns:List[str],
+                         suffix:str="_staging") -> Table:
+    '''Defines a temporary table with the given columns of target_table.
+       Temporary tables are bound to the connection, parallel ingestions do
+       not interfere with each other.
+
+    Parameters
+    ----------
+    target_table : Table
+        Table the staged rows should be inserted into.
+    columns : List[str]
+        Columns of target_table that will be staged.
+    suffix : str, optional
+        Suffix of staging table name, by default "_staging"
+
+    Returns
+    -------
+    Table
+        Temporary staging table (not yet created).
+    '''
+    staging_columns = [Column(col.name, col.type, primary_key=col.primary_key)
+                       for col in target_table.columns if col.name in columns]
+
+    return Table(target_table.name + suffix,
+                 MetaData(),
+                 *staging_columns,
+                 prefixes=["TEMPORARY"])
+
+
+def drop_staging_table(connection:Connection, staging_table:Table) -> None:
+    '''Drops a temporary staging table without ending the transaction of
+       connection: MySQL commits implicitly on a plain DROP TABLE, but not on
+       DROP TEMPORARY TABLE.
+    '''
+    if connection.dialect.name == "mysql":
+        table_name = connection.dialect.identifier_preparer.format_table(staging_table)
+        connection.exec_driver_sql(f"DROP TEMPORARY TABLE IF EXISTS {table_name}")
+        return
+    staging_table.drop(connection)
+    return
+
+
+def insert_missing_rows(connection:Connection,
+                        df:pd.DataFrame,
+                        target_table:Table,
+                        bulk_writer:Union[Bulk_Writer,None]=None,
+                        exclude_columns:Union[List[ColumnElement],None]=None) -> int:
+    '''Bulk loads df into a temporary staging table and inserts only the rows
+       whose primary key is not yet contained in target_table, using one
+       set-based anti-join. No existing keys are transferred to the client.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside a transaction.
+    df : pd.DataFrame
+        New rows, columns must be a subset of target_table columns.
+    target_table : Table
+        Target table.
+    bulk_writer : Union[Bulk_Writer,None], optional
+        Writer used for loading the staging table, by default None
+        (Bulk_Writer with default settings)
+    exclude_columns : Union[List[ColumnElement],None], optional
+        Columns of other tables, rows whose (single column) primary key is
+        contained in one of them are skipped as well, by default None
+
+    Returns
+    -------
+    int
+        Number of rows inserted into target_table.
+    '''
+    columns = [col.name for col in target_table.columns if col.name in df.columns]
+    staging_table = create_staging_table(target_table=target_table,
+                                         columns=columns)
+    staging_table.create(connection)
+
+    try:
+        # load batch into staging table
+        bulk_writer = bulk_writer or Bulk_Writer()
+        bulk_writer.write(connection=connection,
+                          df=df[columns],
+                          table=staging_table)
+
+        # insert rows with unknown primary key
+        key_condition = and_(*[target_table.c[col.name]==staging_table.c[col.name]
+                               for col in target_table.primary_key.columns])
+        query = (select(*[staging_table.c[col] for col in columns])
+                 .where(~exists().where(key_condition)))
+        primary_key = list(target_table.primary_key.columns)[0]
+        for exclude_column in exclude_columns or []:
+            query = query.where(~exists().where(exclude_column==staging_table.c[primary_key.name]))
+        stmt = insert(target_table).from_select(columns, query)
+        rowcount = connection.execute(stmt).rowcount
+    finally:
+        drop_staging_table(connection=connection, staging_table=staging_table)
+
+    return rowcount
@@ -1,86 +1,95 @@
 import streamlit as st
 import pandas as pd
-from typing import Any
+from typing import Any, List
 
 from sqlalchemy.orm import Session
 from sqlalchemy.engine import Engine
-from sqlalchemy import select, and_, exists
+from sqlalchemy import select
 
 from money_map.connect.mysql_conector import MySQLConnector
-from money_map.models.orm_models import (Transactions_Table,
-                                         Transactions_Labeled_Table,
-                                         Participants_Labeled_Table,
-                                         Transaction_Categories_Table)
-from money_map.pipelines.transactions import recreate_transactions_labeled
+from money_map.models.orm_models import (Participants_Labeled_Table,
+                                         Transaction_Categories_Table,
+                                         Unlabeled_Participants_Table,
+                                         Participant_Clusters_Table,
+                                         Monthly_Category_Totals_Table,
+                                         Daily_Balance_Table)
+from money_map.pipelines.transactions import refresh_transactions_labeled
+from money_map.pipelines.participants import backfill_participant_keys
+from money_map.pipelines.rollups import refresh_daily_balance
+from money_map.pipelines.data_versions import get_data_versions, get_data_version
+from money_map.pipelines.labeling_queue import query_next_participants, query_queue_length
+from money_map.pipelines.suggestion_index import Suggestion_Index
 from money_map.tabs.tab_statistics import compute_tab_statistics
 from money_map.tabs.tab_labeling import compute_tab_labeling
+from money_map.tabs.tab_upload import compute_tab_upload
+from money_map.ingestion.job_queue import Ingestion_Job_Queue
 
 # ==============================================================================
 # Cached Functions
 # ==============================================================================
 
-@st.cache_data(ttl="1h")
-def get_available_categories(_engine:Engine) -> pd.DataFrame:
+@st.cache_data
+def get_available_categories(_engine:Engine, data_version:str) -> pd.DataFrame:
     with Session(_engine) as session:
         stmt = select(Transaction_Categories_Table)
         df = pd.read_sql(stmt, session.bind)
     return df
 
-@st.cache_data(ttl="1h")
-def get_labeled_transactions(_engine:Engine) -> pd.DataFrame:
-    with Session(_engine) as session:
-        stmt = select(Transactions_Labeled_Table)
-        df = pd.read_sql(stmt, session.bind)
-    return df
-
-# ==============================================================================
-# Regular Functions
-# ==============================================================================
-
-def get_number_labeled_transactions(_engine:Engine) -> int:
+@st.cache_resource
+def init_database(_connector:MySQLConnector) -> List[str]:
+    # once per server process: create tables, migrate schema, backfill keys,
+    # catch up on the materializations (afterwards refreshed by the ingestion
+    # & the label writes)
+    missing_indexes = _connector.create_tables()
+    engine = _connector.create_sql_engine()
+    backfill_participant_keys(engine=engine)
+    refresh_daily_balance(engine=engine)
+    refresh_transactions_labeled(engine=engine)
+    return missing_indexes
+
+@st.cache_resource
+def get_suggestion_index(_engine:Engine) -> Suggestion_Index:
+    # one index per server process, extended by refresh on new labels
+    return Suggestion_Index()
+
+@st.cache_resource
+def get_job_queue(_connector:MySQLConnector) -> Ingestion_Job_Queue:
+    # one background worker per server process, resumes unfinished jobs
+    job_queue = Ingestion_Job_Queue(connector=_connector)
+    job_queue.resume()
+    return job_queue
+
+@st.cache_data
+def get_number_labeled_transactions(_engine:Engine, data_version:str) -> int:
     with Session(_engine) as session:
         count = int(session.query(Participants_Labeled_Table).count())
     return count
 
-def get_unlabeled_transactions(_engine:Engine) -> pd.DataFrame:
-    '''Request unlabeled transactions based on Transactions_Table &
-       Transactions_Labeled_Table.
+@st.cache_data
+def get_unlabeled_transactions(_engine:Engine, data_version:str, limit:int=10) -> pd.DataFrame:
+    '''Request the next unlabeled participants from Unlabeled_Participants_Table
+       (queue maintained by ingestion & labeling). Cached until the queue is
+       written.
 
     Parameters
     ----------
     _engine : Any
         SQL Alchemy Engine
+    data_version : str
+        Data version of Unlabeled_Participants_Table (cache key).
+    limit : int, optional
+        Number of participants, by default 10
 
     Returns
     -------
     pd.DataFrame
-        DataFrame containing all unlabeled transactions.
+        DataFrame containing the next unlabeled transactions.
     '''
+    return query_next_participants(engine=_engine, limit=limit)
 
-    with Session(_engine) as session:
-
-        stmt =select(Transactions_Table.sender_bank_name,
-                     Transactions_Table.sender_iban,
-                     Transactions_Table.receiver_name,
-                     Transactions_Table.receiver_iban,
-                     Transactions_Table.booking_text,
-                     Transactions_Table.purpose_char
-                     ).distinct()
-
-        stmt = stmt.filter(~exists()
-                           .where(
-                            and_(
-                Transactions_Table.sender_bank_name==Participants_Labeled_Table.sender_bank_name,
-                Transactions_Table.sender_iban==Participants_Labeled_Table.sender_iban,
-                Transactions_Table.receiver_name==Participants_Labeled_Table.receiver_name,
-                Transactions_Table.receiver_iban==Participants_Labeled_Table.receiver_iban,
-                Transactions_Table.booking_text==Participants_Labeled_Table.booking_text,
-                Transactions_Table.purpose_char==Participants_Labeled_Table.purpose_char)))
-
-        df = pd.read_sql(stmt, session.bind)
-        df = df.sort_values(["receiver_name","purpose_char"])
-
-    return df
+@st.cache_data
+def get_number_unlabeled_transactions(_engine:Engine, data_version:str) -> int:
+    return query_queue_length(engine=_engine)
 
 # ==============================================================================
 # init connection
@@ -88,13 +97,15 @@ def get_unlabeled_transactions(_engine:Engine) -> pd.DataFrame:
 
 connector = MySQLConnector()
 engine = connector.create_sql_engine()
-connector.create_tables()
+missing_indexes = init_database(_connector=connector)
 
 # ==============================================================================
 # Streamlit Main
 # ==============================================================================
 st.set_page_config(layout="wide")
 st.title("Money Map")
+if len(missing_indexes) > 0:
+    st.warning(f"Missing database indexes, queries may be slow: {', '.join(missing_indexes)}")
 
 # init different tabs
 tab_labeling, tab_statistics, tab_upload  = st.tabs(["Labeling",
@@ -107,16 +118,31 @@ tab_labeling, tab_statistics, tab_upload  = st.tabs(["Labeling",
 
 with tab_labeling:
 
-    # init available data
-    categories_df = get_available_categories(_engine=engine)
-    unlabeled_transactions = get_unlabeled_transactions(_engine=engine)
-    number_labeled_transactions = get_number_labeled_transactions(_engine=engine)
+    # init available data (cached until the underlying tables are written)
+    data_versions = get_data_versions(engine=engine)
+    categories_df = get_available_categories(
+        _engine=engine,
+        data_version=get_data_version(data_versions, Transaction_Categories_Table.__tablename__))
+    queue_version = get_data_version(data_versions, Unlabeled_Participants_Table.__tablename__,
+                                     Participant_Clusters_Table.__tablename__)
+    unlabeled_transactions = get_unlabeled_transactions(_engine=engine,
+                                                        data_version=queue_version)
+    number_unlabeled_transactions = get_number_unlabeled_transactions(_engine=engine,
+                                                                      data_version=queue_version)
+    labels_version = get_data_version(data_versions, Participants_Labeled_Table.__tablename__)
+    number_labeled_transactions = get_number_labeled_transactions(_engine=engine,
+                                                                  data_version=labels_version)
+    suggestion_index = get_suggestion_index(_engine=engine)
+    suggestion_index.refresh(engine=engine, data_version=labels_version)
 
     # compute tab
     compute_tab_labeling(unlabeled_transactions=unlabeled_transactions,
+                         number_unlabeled_transactions=number_unlabeled_transactions,
                          categories_df=categories_df,
                          number_labeled_transactions=number_labeled_transactions,
-                         engine=engine)
+                         engine=engine,
+                         data_version=queue_version,
+                         suggestion_index=suggestion_index)
 
 # ==============================================================================
 # TAB 2: Statistics
@@ -124,14 +150,16 @@ with tab_labeling:
 
 with tab_statistics:
 
-    recreate_transactions_labeled(engine=engine)
-    labeled_transactions = get_labeled_transactions(_engine=engine)
-    compute_tab_statistics(labeled_transactions=labeled_transactions)
+    data_versions = get_data_versions(engine=engine)
+    compute_tab_statistics(engine=engine,
+                           data_version=get_data_version(data_versions,
+                                                         Monthly_Category_Totals_Table.__tablename__,
+                                                         Daily_Balance_Table.__tablename__))
 
 # ==============================================================================
 # TAB 3: Upload
 # ==============================================================================
 
+with tab_upload:
 
-# TODO: Select Channels (Ingestion Mode)
-#       Pop up File Upload file and after upload it should ingest it
+    compute_tab_upload(job_queue=get_job_queue(_connector=connector))
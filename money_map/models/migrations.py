@@ -0,0 +1,296 @@
+from typing import Callable, List
+
+from attrs import define
+
+from sqlalchemy import Index, Table, inspect, select, insert, delete
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from money_map.models.orm_models import (Base,
+                                         Transactions_Table,
+                                         Transactions_Labeled_Table,
+                                         Participants_Labeled_Table,
+                                         Materialization_Watermarks_Table,
+                                         Schema_Migrations_Table,
+                                         Data_Versions_Table,
+                                         Ingestion_Manifest_Table,
+                                         Daily_Balance_Table)
+from money_map.pipelines.data_versions import DATA_VERSION_TABLES
+from money_map.pipelines.labeling_queue import rebuild_queue
+from money_map.pipelines.participant_clusters import rebuild_participant_clusters
+
+# =============================================================================
+# Operations
+# =============================================================================
+
+def add_column(connection:Connection, table:Table, column_name:str) -> None:
+    '''Adds a column of the model definition to an existing table, together
+       with its single column indexes. Skipped if the column exists already.
+    '''
+    inspector = inspect(connection)
+    if column_name in [col["name"] for col in inspector.get_columns(table.name)]:
+        return
+
+    column_ddl = CreateColumn(table.c[column_name]).compile(dialect=connection.dialect)
+    table_name = connection.dialect.identifier_preparer.format_table(table)
+    connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_ddl}")
+
+    for index in table.indexes:
+        if [col.name for col in index.columns] == [column_name]:
+            create_index(connection=connection, index=index)
+    return
+
+
+def modify_column(connection:Connection, table:Table, column_name:str) -> None:
+    '''Changes the type of an existing column to the model definition.
+       Skipped on SQLite, which does not enforce column types & lengths.
+    '''
+    if connection.dialect.name == "sqlite":
+        return
+    column_ddl = CreateColumn(table.c[column_name]).compile(dialect=connection.dialect)
+    table_name = connection.dialect.identifier_preparer.format_table(table)
+    connection.exec_driver_sql(f"ALTER TABLE {table_name} MODIFY COLUMN {column_ddl}")
+    return
+
+
+def create_index(connection:Connection, index:Index) -> None:
+    '''Creates an index of the model definition on an existing table. Skipped
+       if an index with the same name exists already.
+    '''
+    inspector = inspect(connection)
+    if index.name in [idx["name"] for idx in inspector.get_indexes(index.table.name)]:
+        return
+    index.create(connection)
+    return
+
+
+def has_model_primary_key(connection:Connection, table:Table) -> bool:
+    '''Checks if the existing table has the primary key of the model
+       definition. Tables created by pandas to_sql have none.
+    '''
+    existing = inspect(connection).get_pk_constraint(table.name)["constrained_columns"]
+    return existing == [col.name for col in table.primary_key.columns]
+
+
+def recreate_table(connection:Connection, table:Table) -> None:
+    '''Drops an existing table and creates it from the model definition, all
+       rows are lost.
+    '''
+    table.drop(connection, checkfirst=True)
+    table.create(connection)
+    return
+
+
+def get_index(table:Table, *column_names:str) -> Index:
+    '''Index of the model definition of table on exactly these columns.
+    '''
+    for index in table.indexes:
+        if tuple(col.name for col in index.columns) == column_names:
+            return index
+    raise Exception(f"No Index on {table.name}{column_names} defined")
+
+# =============================================================================
+# Migrations
+# =============================================================================
+
+@define
+class Migration:
+    '''Versioned schema change applied once per database. upgrade must be
+       idempotent: databases created by create_all already contain the
+       changes of all migrations.
+    '''
+    version:int
+    name:str
+    upgrade:Callable[[Connection],None]
+
+
+def add_watermark_and_participant_key_columns(connection:Connection) -> None:
+    transactions = Transactions_Table.__table__
+    participants = Participants_Labeled_Table.__table__
+    add_column(connection=connection, table=transactions, column_name="ingested_at")
+    add_column(connection=connection, table=transactions, column_name="participant_key")
+    add_column(connection=connection, table=participants, column_name="labeled_at")
+    add_column(connection=connection, table=participants, column_name="participant_key")
+    return
+
+
+def add_query_indexes(connection:Connection) -> None:
+    transactions = Transactions_Table.__table__
+    transactions_labeled = Transactions_Labeled_Table.__table__
+    participants = Participants_Labeled_Table.__table__
+
+    # transactions_labeled of former versions was created by to_sql (TEXT
+    # columns, no primary key), MySQL can not index TEXT without a key
+    # length: rebuild it from the model, the reset watermark makes the next
+    # refresh a full materialization
+    if not has_model_primary_key(connection=connection, table=transactions_labeled):
+        recreate_table(connection=connection, table=transactions_labeled)
+        watermarks = Materialization_Watermarks_Table.__table__
+        connection.execute(delete(watermarks)
+                           .where(watermarks.c.target_table==transactions_labeled.name))
+    for index in [get_index(transactions, "sender_iban", "booking_date"),
+                  get_index(transactions, "participant_key"),
+                  get_index(transactions, "ingested_at"),
+                  get_index(transactions_labeled, "sender_iban", "booking_date"),
+                  get_index(transactions_labeled, "category_id"),
+                  get_index(participants, "participant_key"),
+                  get_index(participants, "labeled_at"),
+                  get_index(participants, "category_id")]:
+        create_index(connection=connection, index=index)
+    return
+
+
+def reset_materialization_watermarks(connection:Connection) -> None:
+    # next refresh is a full rebuild, populates newly added rollup tables
+    connection.execute(delete(Materialization_Watermarks_Table))
+    return
+
+
+def seed_data_versions(connection:Connection) -> None:
+    # one counter row per table, bumps are plain updates afterwards
+    data_versions = Data_Versions_Table.__table__
+    existing = connection.execute(select(data_versions.c.table_name)).scalars().all()
+    for table_name in DATA_VERSION_TABLES:
+        if table_name not in existing:
+            connection.execute(insert(data_versions).values(table_name=table_name, version=0))
+    return
+
+
+def widen_manifest_sender_ibans(connection:Connection) -> None:
+    # String(1000) overflowed for exports of many accounts
+    modify_column(connection=connection, table=Ingestion_Manifest_Table.__table__,
+                  column_name="sender_ibans")
+    return
+
+
+def add_watermark_label_columns(connection:Connection) -> None:
+    watermarks = Materialization_Watermarks_Table.__table__
+    add_column(connection=connection, table=watermarks, column_name="labels_count")
+    add_column(connection=connection, table=watermarks, column_name="labels_version")
+    return
+
+
+def add_daily_closing_balance(connection:Connection) -> None:
+    # filled days carried the previous min/mean/max: recompute all accounts
+    daily_balance = Daily_Balance_Table.__table__
+    add_column(connection=connection, table=daily_balance,
+               column_name="closing_balance_after_booking")
+    watermarks = Materialization_Watermarks_Table.__table__
+    connection.execute(delete(watermarks)
+                       .where(watermarks.c.target_table==daily_balance.name))
+    return
+
+
+# ordered by version, append new migrations at the end
+MIGRATIONS:List[Migration] = [
+    Migration(version=1,
+              name="add watermark and participant_key columns",
+              upgrade=add_watermark_and_participant_key_columns),
+    Migration(version=2,
+              name="add query indexes",
+              upgrade=add_query_indexes),
+    Migration(version=3,
+              name="populate monthly_category_totals",
+              upgrade=reset_materialization_watermarks),
+    Migration(version=4,
+              name="seed data_versions",
+              upgrade=seed_data_versions),
+    Migration(version=5,
+              name="populate unlabeled_participants",
+              upgrade=rebuild_queue),
+    Migration(version=6,
+              name="populate participant_clusters",
+              upgrade=rebuild_participant_clusters),
+    Migration(version=7,
+              name="widen ingestion_manifest.sender_ibans",
+              upgrade=widen_manifest_sender_ibans),
+    Migration(version=8,
+              name="add label count & version to materialization_watermarks",
+              upgrade=add_watermark_label_columns),
+    Migration(version=9,
+              name="add closing balance to daily_balance",
+              upgrade=add_daily_closing_balance),
+]
+
+# =============================================================================
+# Migration Runner
+# =============================================================================
+
+def get_applied_versions(engine:Engine) -> List[int]:
+    '''Versions recorded in Schema_Migrations_Table.
+    '''
+    Schema_Migrations_Table.__table__.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        versions = connection.execute(select(Schema_Migrations_Table.version)).scalars().all()
+    return list(versions)
+
+
+def run_migrations(engine:Engine,
+                   migrations:List[Migration]=MIGRATIONS,
+                   verbose:bool=True) -> List[int]:
+    '''Applies all pending migrations in order of their version, each one in
+       a transaction together with its version record. MySQL commits DDL
+       statements implicitly, so a failed migration can leave partial
+       changes without a version record. It is retried on the next start,
+       which is why upgrades have to be idempotent.
+
+    Parameters
+    ----------
+    engine : Engine
+        SQL Alchemy engine
+    migrations : List[Migration], optional
+        Known migrations, by default MIGRATIONS
+    verbose : bool, optional
+        Print applied migrations, by default True
+
+    Returns
+    -------
+    List[int]
+        Versions applied by this call.
+    '''
+    applied_versions = set(get_applied_versions(engine=engine))
+
+    applied = []
+    for migration in sorted(migrations, key=lambda migration: migration.version):
+        if migration.version in applied_versions:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(insert(Schema_Migrations_Table)
+                               .values(version=migration.version, name=migration.name))
+        applied.append(migration.version)
+        if verbose:
+            print(f"Applied Migration {migration.version}: {migration.name}")
+    return applied
+
+
+def find_missing_indexes(engine:Engine) -> List[str]:
+    '''Indexes defined in the models but missing in the database. An index
+       counts as present if an existing index (or the primary key) starts
+       with the same columns.
+
+    Parameters
+    ----------
+    engine : Engine
+        SQL Alchemy engine
+
+    Returns
+    -------
+    List[str]
+        Descriptions of missing indexes, e.g. "transactions(sender_iban, booking_date)".
+    '''
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = [tuple(idx["column_names"]) for idx in inspector.get_indexes(table.name)]
+        existing.append(tuple(inspector.get_pk_constraint(table.name)["constrained_columns"]))
+
+        for index in table.indexes:
+            columns = tuple(col.name for col in index.columns)
+            if not any(cols[:len(columns)] == columns for cols in existing):
+                missing.append(f"{table.name}({', '.join(columns)})")
+    return missing
@@ -1,7 +1,8 @@
 import datetime
 
 from sqlalchemy.orm import DeclarativeBase,Mapped,mapped_column
-from sqlalchemy.types import Date,String,Float,Integer
+from sqlalchemy import func, Index
+from sqlalchemy.types import Date,DateTime,String,Text,Float,Integer,BigInteger,Boolean
 
 
 class Base(DeclarativeBase):
@@ -48,10 +49,60 @@ class Participants_Labeled_Table(Base):
     receiver_iban: Mapped[str] = mapped_column(String(40),nullable=False)
     booking_text: Mapped[str] = mapped_column(String(40),nullable=False)
     purpose_char: Mapped[str] = mapped_column(String(140),nullable=False)
-    category_id: Mapped[int] = mapped_column(Integer(),nullable=False)
+    participant_key: Mapped[str] = mapped_column(String(32),nullable=True,index=True)
+    category_id: Mapped[int] = mapped_column(Integer(),nullable=False,index=True)
     category_1: Mapped[str] = mapped_column(String(100), nullable=False)
     category_2: Mapped[str] = mapped_column(String(100), nullable=False)
     category_3: Mapped[str] = mapped_column(String(100), nullable=False)
+    labeled_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=True,index=True,
+                                                          server_default=func.now(),
+                                                          onupdate=func.now())
+
+# =============================================================================
+# Unlabeled Participants
+# =============================================================================
+
+class Unlabeled_Participants_Table(Base):
+    '''Queue of unique participants (see Participants_Labeled_Table) of
+       Transactions_Table which are neither labeled nor categorized by a
+       rule. Filled by the ingestion, emptied by the labeling tab, rebuilt
+       by every full materialization of Transactions_Labeled_Table (labels
+       deleted or changed outside of the labeling tab, rules changed).
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "unlabeled_participants"
+    __table_args__ = (Index("ix_unlabeled_participants_receiver_name_purpose_char",
+                            "receiver_name", "purpose_char"),)
+
+    participant_key: Mapped[str] = mapped_column(String(32),nullable=False,primary_key=True)
+    sender_bank_name: Mapped[str] = mapped_column(String(80),nullable=False)
+    sender_iban: Mapped[str] = mapped_column(String(40),nullable=False)
+    receiver_name: Mapped[str] = mapped_column(String(80),nullable=False)
+    receiver_iban: Mapped[str] = mapped_column(String(40),nullable=False)
+    booking_text: Mapped[str] = mapped_column(String(40),nullable=False)
+    purpose_char: Mapped[str] = mapped_column(String(140),nullable=False)
+    queued_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                         server_default=func.now())
+
+class Participant_Clusters_Table(Base):
+    '''Groups of near-duplicate participants of Unlabeled_Participants_Table
+       (see money_map.pipelines.participant_clusters), labeled at once.
+       cluster_key is the participant_key of the first participant of the
+       group.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "participant_clusters"
+
+    participant_key: Mapped[str] = mapped_column(String(32),nullable=False,primary_key=True)
+    cluster_key: Mapped[str] = mapped_column(String(32),nullable=False,index=True)
 
 # =============================================================================
 # Transactions
@@ -66,6 +117,8 @@ class Transactions_Table(Base):
        sqlalchemy.orm.Base
     '''
     __tablename__ = "transactions"
+    __table_args__ = (Index("ix_transactions_sender_iban_booking_date",
+                            "sender_iban", "booking_date"),)
 
     transaction_id: Mapped[str] = mapped_column(String(40),nullable=False,primary_key=True)
     sender_account_type: Mapped[str] = mapped_column(String(40),nullable=False)
@@ -88,6 +141,9 @@ class Transactions_Table(Base):
     creditor_id: Mapped[str] = mapped_column(String(40),nullable=True)
     mandate_reference: Mapped[str] = mapped_column(String(40),nullable=True)
     purpose_char: Mapped[str] = mapped_column(String(140),nullable=False)
+    participant_key: Mapped[str] = mapped_column(String(32),nullable=True,index=True)
+    ingested_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=True,index=True,
+                                                           server_default=func.now())
 
 # =============================================================================
 # Transactions Labeled
@@ -103,6 +159,8 @@ class Transactions_Labeled_Table(Base):
         sqlalchemy.orm.Base
     '''
     __tablename__ = "transactions_labeled"
+    __table_args__ = (Index("ix_transactions_labeled_sender_iban_booking_date",
+                            "sender_iban", "booking_date"),)
 
     transaction_id: Mapped[str] = mapped_column(String(40),nullable=False,primary_key=True)
     sender_account_type: Mapped[str] = mapped_column(String(40),nullable=False)
@@ -125,6 +183,232 @@ class Transactions_Labeled_Table(Base):
     creditor_id: Mapped[str] = mapped_column(String(40),nullable=True)
     mandate_reference: Mapped[str] = mapped_column(String(40),nullable=True)
     purpose_char: Mapped[str] = mapped_column(String(140),nullable=False)
+    category_id: Mapped[int] = mapped_column(Integer(),nullable=False,index=True)
+    category_1: Mapped[str] = mapped_column(String(100), nullable=False)
+    category_2: Mapped[str] = mapped_column(String(100), nullable=False)
+    category_3: Mapped[str] = mapped_column(String(100), nullable=False)
+
+# =============================================================================
+# Ingestion Manifest
+# =============================================================================
+
+class Ingestion_Manifest_Table(Base):
+    '''Fingerprints of already ingested export files. Used for skipping
+       files which were already ingested and for ingesting only the new tail
+       of files which grew.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "ingestion_manifest"
+
+    file_hash: Mapped[str] = mapped_column(String(64),nullable=False,primary_key=True)
+    head_hash: Mapped[str] = mapped_column(String(64),nullable=False,index=True)
+    file_name: Mapped[str] = mapped_column(String(255),nullable=False)
+    file_size: Mapped[int] = mapped_column(BigInteger(),nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer(),nullable=False)
+    min_booking_date: Mapped[datetime.date] = mapped_column(Date(),nullable=True)
+    max_booking_date: Mapped[datetime.date] = mapped_column(Date(),nullable=True)
+    sender_ibans: Mapped[str] = mapped_column(Text(),nullable=True)
+    ingested_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                           server_default=func.now())
+
+# =============================================================================
+# Ingestion Jobs
+# =============================================================================
+
+class Ingestion_Jobs_Table(Base):
+    '''Uploaded files waiting for or processed by the background ingestion
+       worker.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "ingestion_jobs"
+
+    job_id: Mapped[int] = mapped_column(Integer(),nullable=False,primary_key=True,autoincrement=True)
+    channel: Mapped[str] = mapped_column(String(40),nullable=False)
+    file_name: Mapped[str] = mapped_column(String(255),nullable=False)
+    file_path: Mapped[str] = mapped_column(String(500),nullable=False)
+    status: Mapped[str] = mapped_column(String(20),nullable=False,index=True)
+    rows_processed: Mapped[int] = mapped_column(Integer(),nullable=False,default=0)
+    rows_stored: Mapped[int] = mapped_column(Integer(),nullable=False,default=0)
+    error: Mapped[str] = mapped_column(String(1000),nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                          server_default=func.now())
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                          server_default=func.now(),
+                                                          onupdate=func.now())
+
+# =============================================================================
+# Materialization Watermarks
+# =============================================================================
+
+class Materialization_Watermarks_Table(Base):
+    '''State of incrementally materialized tables: latest ingested_at of
+       Transactions_Table and latest labeled_at of Participants_Labeled_Table
+       already processed, plus the number of rows at those timestamps. The
+       total number of labels and their data version detect deleted labels
+       and labels changed within the watermark second.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "materialization_watermarks"
+
+    target_table: Mapped[str] = mapped_column(String(80),nullable=False,primary_key=True)
+    transactions_watermark: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=True)
+    transactions_watermark_count: Mapped[int] = mapped_column(Integer(),nullable=False,default=0)
+    labels_watermark: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=True)
+    labels_watermark_count: Mapped[int] = mapped_column(Integer(),nullable=False,default=0)
+    labels_count: Mapped[int] = mapped_column(Integer(),nullable=True)
+    labels_version: Mapped[int] = mapped_column(Integer(),nullable=True)
+    refreshed_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                            server_default=func.now(),
+                                                            onupdate=func.now())
+
+# =============================================================================
+# Schema Migrations
+# =============================================================================
+
+class Schema_Migrations_Table(Base):
+    '''Versions of applied schema migrations, see money_map.models.migrations.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "schema_migrations"
+
+    version: Mapped[int] = mapped_column(Integer(),nullable=False,primary_key=True,autoincrement=False)
+    name: Mapped[str] = mapped_column(String(120),nullable=False)
+    applied_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                          server_default=func.now())
+
+# =============================================================================
+# Monthly Category Totals
+# =============================================================================
+
+class Monthly_Category_Totals_Table(Base):
+    '''Monthly rollup of Transactions_Labeled_Table per account and category,
+       maintained together with Transactions_Labeled_Table.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "monthly_category_totals"
+
+    sender_iban: Mapped[str] = mapped_column(String(40),nullable=False,primary_key=True)
+    year: Mapped[int] = mapped_column(Integer(),nullable=False,primary_key=True,autoincrement=False)
+    month: Mapped[int] = mapped_column(Integer(),nullable=False,primary_key=True,autoincrement=False)
+    category_id: Mapped[int] = mapped_column(Integer(),nullable=False,primary_key=True,autoincrement=False)
+    category_1: Mapped[str] = mapped_column(String(100), nullable=False)
+    category_2: Mapped[str] = mapped_column(String(100), nullable=False)
+    category_3: Mapped[str] = mapped_column(String(100), nullable=False)
+    amount: Mapped[float] = mapped_column(Float(),nullable=False)
+    transaction_count: Mapped[int] = mapped_column(Integer(),nullable=False)
+    mean_balance_after_booking: Mapped[float] = mapped_column(Float(),nullable=False)
+
+# =============================================================================
+# Daily Balance
+# =============================================================================
+
+class Daily_Balance_Table(Base):
+    '''Daily balance per account based on all ingested transactions (labeled
+       or not). Days without bookings (is_filled) carry the closing balance
+       of the previous day as min, mean & max.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "daily_balance"
+
+    sender_iban: Mapped[str] = mapped_column(String(40),nullable=False,primary_key=True)
+    booking_date: Mapped[datetime.date] = mapped_column(Date(),nullable=False,primary_key=True)
+    min_balance_after_booking: Mapped[float] = mapped_column(Float(),nullable=False)
+    mean_balance_after_booking: Mapped[float] = mapped_column(Float(),nullable=False)
+    max_balance_after_booking: Mapped[float] = mapped_column(Float(),nullable=False)
+    closing_balance_after_booking: Mapped[float] = mapped_column(Float(),nullable=True)
+    transaction_count: Mapped[int] = mapped_column(Integer(),nullable=False)
+    is_filled: Mapped[bool] = mapped_column(Boolean(),nullable=False)
+
+# =============================================================================
+# Data Versions
+# =============================================================================
+
+class Data_Versions_Table(Base):
+    '''Change counter per table, incremented in the same transaction as every
+       write of the ingestors, the labeling tab & the materializations. Used
+       as cache key of reads.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "data_versions"
+
+    table_name: Mapped[str] = mapped_column(String(80),nullable=False,primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger(),nullable=False,default=0)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                          server_default=func.now(),
+                                                          onupdate=func.now())
+
+# =============================================================================
+# Categorization Rules
+# =============================================================================
+
+class Categorization_Rules_Table(Base):
+    '''Rules assigning a category to transactions whose participant is not
+       labeled, see money_map.pipelines.categorization_rules. The matching
+       rule with the lowest priority (then rule_id) wins.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "categorization_rules"
+
+    rule_id: Mapped[int] = mapped_column(Integer(),nullable=False,primary_key=True,autoincrement=True)
+    field: Mapped[str] = mapped_column(String(40),nullable=False)
+    match_type: Mapped[str] = mapped_column(String(20),nullable=False)
+    pattern: Mapped[str] = mapped_column(String(140),nullable=False)
+    priority: Mapped[int] = mapped_column(Integer(),nullable=False,default=100)
+    category_id: Mapped[int] = mapped_column(Integer(),nullable=False)
+    category_1: Mapped[str] = mapped_column(String(100), nullable=False)
+    category_2: Mapped[str] = mapped_column(String(100), nullable=False)
+    category_3: Mapped[str] = mapped_column(String(100), nullable=False)
+    is_active: Mapped[bool] = mapped_column(Boolean(),nullable=False,default=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(),nullable=False,
+                                                          server_default=func.now())
+
+
+class Rule_Matches_Table(Base):
+    '''Category of every participant (participant_key) of Transactions_Table
+       matched by Categorization_Rules_Table. Filled by the ingestion and
+       rebuilt by full materializations of Transactions_Labeled_Table.
+
+    Parameters
+    ----------
+    Base : sqlalchemy.orm.Base
+        sqlalchemy.orm.Base
+    '''
+    __tablename__ = "rule_matches"
+
+    participant_key: Mapped[str] = mapped_column(String(32),nullable=False,primary_key=True)
+    rule_id: Mapped[int] = mapped_column(Integer(),nullable=False)
     category_id: Mapped[int] = mapped_column(Integer(),nullable=False)
     category_1: Mapped[str] = mapped_column(String(100), nullable=False)
     category_2: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -0,0 +1,396 @@
+import re
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from attrs import define, field
+
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.engine import Connection
+
+from money_map.models.orm_models import (Transactions_Table,
+                                         Transactions_Labeled_Table,
+                                         Categorization_Rules_Table,
+                                         Rule_Matches_Table,
+                                         Materialization_Watermarks_Table)
+from money_map.ingestion.bulk_writer import Bulk_Writer
+from money_map.ingestion.staging import insert_missing_rows
+from money_map.ingestion.normalization import normalize_participant_value
+from money_map.pipelines.data_versions import bump_data_version
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# columns of Transactions_Table rules can match on
+RULE_FIELDS:List[str] = ["receiver_iban", "receiver_name", "booking_text", "purpose_char"]
+
+RULE_MATCH_TYPES:List[str] = ["exact", "prefix", "substring", "regex"]
+
+# columns of Rule_Matches_Table taken from Categorization_Rules_Table
+RULE_MATCH_COLUMNS:List[str] = ["rule_id", "category_id", "category_1",
+                                "category_2", "category_3"]
+
+# rank of values not matched by any rule
+NO_MATCH:int = np.iinfo(np.int64).max
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def is_blank_pattern(pattern:Any, match_type:str) -> bool:
+    '''Checks if a pattern is empty after normalization (regex: after
+       stripping blanks). Blank patterns would match every value.
+    '''
+    if match_type == "regex":
+        return str(pattern).strip() == ""
+    return normalize_participant_value(pattern).strip() == ""
+
+# =============================================================================
+# Aho-Corasick
+# =============================================================================
+
+@define
+class Aho_Corasick:
+    '''Aho-Corasick automaton: finds all occurrences of many patterns in a
+       text with a single scan of the text, independent of the number of
+       patterns.
+    '''
+
+    # region [init]
+    patterns:List[str]
+
+    # post init
+    goto:List[Dict[str,int]] = field(init=False)
+    fail:List[int] = field(init=False)
+    output:List[List[int]] = field(init=False)
+
+    def __attrs_post_init__(self) -> None:
+        # trie of all patterns
+        self.goto, self.output = [{}], [[]]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.output.append([])
+                node = child
+            self.output[node].append(index)
+
+        # failure links (longest proper suffix in the trie), breadth first
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state != 0 and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+    # endregion
+
+    # region [public]
+    def find(self, text:str) -> Iterator[Tuple[int,int]]:
+        '''Yields (start position, pattern index) of all occurrences.
+        '''
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        node = 0
+        for position, char in enumerate(text):
+            while node != 0 and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in output[node]:
+                yield position - len(patterns[index]) + 1, index
+    # endregion
+
+# =============================================================================
+# Rule Matcher
+# =============================================================================
+
+@define
+class Rule_Matcher:
+    '''Compiled Categorization_Rules_Table. Rules are ranked by priority and
+       rule_id, the lowest ranked matching rule wins. Per field:
+       - exact: dict lookup of the normalized value
+       - prefix & substring: one Aho-Corasick automaton for all patterns
+       - regex: re.search (case insensitive)
+       Values & patterns (except regex) are normalized like participant keys
+       (stripped, lowercased). Every distinct value is matched only once.
+       Blank patterns are ignored.
+    '''
+
+    # region [init]
+    rules:pd.DataFrame
+
+    # post init
+    ranked:pd.DataFrame = field(init=False)
+    exact:Dict[str,Dict[str,int]] = field(init=False)
+    automata:Dict[str,Tuple[Aho_Corasick,np.ndarray,np.ndarray]] = field(init=False)
+    regexes:Dict[str,List[Tuple[int,re.Pattern]]] = field(init=False)
+
+    def __attrs_post_init__(self) -> None:
+        blank = np.array([is_blank_pattern(pattern, match_type) for pattern, match_type
+                          in zip(self.rules["pattern"], self.rules["match_type"])], dtype=bool)
+        self.ranked = (self.rules.loc[~blank]
+                       .sort_values(["priority", "rule_id"], kind="stable")
+                       .reset_index(drop=True))
+        self.exact, self.automata, self.regexes = {}, {}, {}
+
+        for col in RULE_FIELDS:
+            rules = self.ranked.loc[self.ranked["field"]==col]
+
+            exact = {}
+            for rank, pattern in rules.loc[rules["match_type"]=="exact", "pattern"].items():
+                exact.setdefault(normalize_participant_value(pattern), rank)
+            if exact:
+                self.exact[col] = exact
+
+            multi = rules.loc[rules["match_type"].isin(["prefix", "substring"])]
+            if not multi.empty:
+                automaton = Aho_Corasick([normalize_participant_value(pattern)
+                                          for pattern in multi["pattern"]])
+                self.automata[col] = (automaton,
+                                      multi.index.to_numpy(),
+                                      (multi["match_type"]=="prefix").to_numpy())
+
+            regexes = [(rank, re.compile(pattern, re.IGNORECASE)) for rank, pattern
+                       in rules.loc[rules["match_type"]=="regex", "pattern"].items()]
+            if regexes:
+                self.regexes[col] = regexes
+    # endregion
+
+    # region [public]
+    def match(self, df:pd.DataFrame) -> np.ndarray:
+        '''Rank (row of ranked) of the winning rule per row of df, NO_MATCH
+           if no rule matches.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Transactions or participants containing the RULE_FIELDS with rules.
+
+        Returns
+        -------
+        np.ndarray
+            Ranks, same length as df.
+        '''
+        best = np.full(df.shape[0], NO_MATCH, dtype=np.int64)
+        for col in RULE_FIELDS:
+            if col not in self.exact and col not in self.automata and col not in self.regexes:
+                continue
+            codes, uniques = pd.factorize(df[col].astype(str))
+            ranks = self.match_values(col=col, values=np.asarray(uniques, dtype=object))
+            best = np.minimum(best, ranks[codes])
+        return best
+
+    def categorize(self, df:pd.DataFrame) -> pd.DataFrame:
+        '''RULE_MATCH_COLUMNS of the winning rule of all matched rows of df.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Transactions or participants containing RULE_FIELDS.
+
+        Returns
+        -------
+        pd.DataFrame
+            Matched rows only, index of df.
+        '''
+        best = self.match(df)
+        matched = best != NO_MATCH
+        result = self.ranked.iloc[best[matched]][RULE_MATCH_COLUMNS]
+        result.index = df.index[matched]
+        return result
+
+    def match_values(self, col:str, values:np.ndarray) -> np.ndarray:
+        '''Rank of the winning rule of col for distinct values.
+        '''
+        normalized = [normalize_participant_value(value) for value in values]
+        best = np.full(len(values), NO_MATCH, dtype=np.int64)
+
+        if col in self.exact:
+            exact = self.exact[col]
+            best = np.minimum(best, [exact.get(value, NO_MATCH) for value in normalized])
+
+        if col in self.automata:
+            automaton, ranks, is_prefix = self.automata[col]
+            for position, value in enumerate(normalized):
+                for start, index in automaton.find(value):
+                    if (start == 0 or not is_prefix[index]) and ranks[index] < best[position]:
+                        best[position] = ranks[index]
+
+        for rank, regex in self.regexes.get(col, []):
+            hits = np.fromiter((regex.search(value) is not None for value in values),
+                               dtype=bool, count=len(values))
+            best = np.where(hits & (rank < best), rank, best)
+        return best
+
+    def __len__(self) -> int:
+        return self.ranked.shape[0]
+    # endregion
+
+# =============================================================================
+# Rules
+# =============================================================================
+
+def load_rule_matcher(connection:Connection) -> Rule_Matcher:
+    '''Compiles all active rules of Categorization_Rules_Table.
+    '''
+    rules = Categorization_Rules_Table.__table__
+    df = pd.read_sql(select(rules).where(rules.c.is_active), connection)
+    return Rule_Matcher(rules=df)
+
+
+def add_categorization_rule(engine:Any,
+                            field:str,
+                            match_type:str,
+                            pattern:str,
+                            category_id:int,
+                            category_1:str,
+                            category_2:str,
+                            category_3:str,
+                            priority:int=100) -> int:
+    '''Adds a rule to Categorization_Rules_Table. The materialization
+       watermark of Transactions_Labeled_Table is reset, so the next refresh
+       re-matches all participants in a full rebuild. Entry point of the
+       rules form of the labeling tab.
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    field : str
+        One of RULE_FIELDS.
+    match_type : str
+        One of RULE_MATCH_TYPES.
+    pattern : str
+        Value, prefix, substring or regular expression.
+    category_id : int
+        Assigned category_id.
+    category_1 : str
+        Assigned category_1.
+    category_2 : str
+        Assigned category_2.
+    category_3 : str
+        Assigned category_3.
+    priority : int, optional
+        Lower values win, by default 100
+
+    Returns
+    -------
+    int
+        rule_id of the new rule.
+    '''
+    if field not in RULE_FIELDS:
+        raise Exception(f"Unknown Rule Field: {field}")
+    if match_type not in RULE_MATCH_TYPES:
+        raise Exception(f"Unknown Rule Match Type: {match_type}")
+    if is_blank_pattern(pattern, match_type):
+        raise Exception(f"Blank Rule Pattern: {pattern!r}")
+    if match_type == "regex":
+        re.compile(pattern)
+
+    watermarks = Materialization_Watermarks_Table.__table__
+    with engine.begin() as connection:
+        rule_id = connection.execute(
+            insert(Categorization_Rules_Table)
+            .values(field=field, match_type=match_type, pattern=pattern,
+                    priority=priority, category_id=category_id, category_1=category_1,
+                    category_2=category_2, category_3=category_3)).inserted_primary_key[0]
+        connection.execute(delete(watermarks)
+                           .where(watermarks.c.target_table==Transactions_Labeled_Table.__tablename__))
+        bump_data_version(connection, Categorization_Rules_Table.__tablename__)
+    return rule_id
+
+# =============================================================================
+# Rule Matches
+# =============================================================================
+
+def categorize_participants(connection:Connection,
+                            df:pd.DataFrame,
+                            bulk_writer:Union[Bulk_Writer,None]=None,
+                            rule_matcher:Union[Rule_Matcher,None]=None) -> int:
+    '''Matches the participants of newly ingested transactions against all
+       rules and stores the categories of participants not matched before in
+       Rule_Matches_Table.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside the transaction of the ingestion.
+    df : pd.DataFrame
+        Cleaned transactions containing RULE_FIELDS & participant_key.
+    bulk_writer : Union[Bulk_Writer,None], optional
+        Writer used for loading the staging table, by default None
+    rule_matcher : Union[Rule_Matcher,None], optional
+        Compiled rules, by default None (all active rules are loaded)
+
+    Returns
+    -------
+    int
+        Number of newly matched participants.
+    '''
+    if rule_matcher is None:
+        rule_matcher = load_rule_matcher(connection=connection)
+    if len(rule_matcher) == 0:
+        return 0
+
+    participants = df.drop_duplicates(subset="participant_key")
+    matches = rule_matcher.categorize(participants)
+    if matches.empty:
+        return 0
+
+    matches.insert(0, "participant_key", participants.loc[matches.index, "participant_key"])
+    return insert_missing_rows(connection=connection,
+                               df=matches,
+                               target_table=Rule_Matches_Table.__table__,
+                               bulk_writer=bulk_writer)
+
+
+def rebuild_rule_matches(connection:Connection,
+                         bulk_writer:Union[Bulk_Writer,None]=None) -> int:
+    '''Matches all distinct participants of Transactions_Table against all
+       rules and replaces Rule_Matches_Table. Executed by full
+       materializations of Transactions_Labeled_Table.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside a transaction.
+    bulk_writer : Union[Bulk_Writer,None], optional
+        Writer used for loading Rule_Matches_Table, by default None
+
+    Returns
+    -------
+    int
+        Number of matched participants.
+    '''
+    rule_matches = Rule_Matches_Table.__table__
+    connection.execute(delete(rule_matches))
+
+    matcher = load_rule_matcher(connection=connection)
+    if len(matcher) == 0:
+        return 0
+
+    # one row per participant_key, spellings differ in case & spaces only
+    transactions = Transactions_Table.__table__
+    query = (select(transactions.c.participant_key,
+                    *[func.min(transactions.c[col]).label(col) for col in RULE_FIELDS])
+             .where(transactions.c.participant_key.is_not(None))
+             .group_by(transactions.c.participant_key))
+    participants = pd.read_sql(query, connection)
+
+    matches = matcher.categorize(participants)
+    if matches.empty:
+        return 0
+
+    matches.insert(0, "participant_key", participants.loc[matches.index, "participant_key"])
+    bulk_writer = bulk_writer or Bulk_Writer()
+    bulk_writer.write(connection=connection, df=matches, table=rule_matches)
+    return matches.shape[0]
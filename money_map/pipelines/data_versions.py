@@ -0,0 +1,92 @@
+from typing import Any, Dict, List
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.engine import Connection
+
+from money_map.models.orm_models import (Transaction_Categories_Table,
+                                         Transactions_Table,
+                                         Participants_Labeled_Table,
+                                         Transactions_Labeled_Table,
+                                         Monthly_Category_Totals_Table,
+                                         Daily_Balance_Table,
+                                         Unlabeled_Participants_Table,
+                                         Categorization_Rules_Table,
+                                         Participant_Clusters_Table,
+                                         Data_Versions_Table)
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# tables whose writes are counted in Data_Versions_Table
+DATA_VERSION_TABLES:List[str] = [Transaction_Categories_Table.__tablename__,
+                                 Transactions_Table.__tablename__,
+                                 Participants_Labeled_Table.__tablename__,
+                                 Transactions_Labeled_Table.__tablename__,
+                                 Monthly_Category_Totals_Table.__tablename__,
+                                 Daily_Balance_Table.__tablename__,
+                                 Unlabeled_Participants_Table.__tablename__,
+                                 Categorization_Rules_Table.__tablename__,
+                                 Participant_Clusters_Table.__tablename__]
+
+# =============================================================================
+# Data Versions
+# =============================================================================
+
+def bump_data_version(connection:Connection, *table_names:str) -> None:
+    '''Increments the change counter of the given tables. Call within the
+       transaction of the write, so readers never see new data with an old
+       version.
+    '''
+    data_versions = Data_Versions_Table.__table__
+    for table_name in table_names:
+        rowcount = connection.execute(update(data_versions)
+                                      .where(data_versions.c.table_name==table_name)
+                                      .values(version=data_versions.c.version + 1)).rowcount
+        if rowcount == 0:
+            connection.execute(insert(data_versions)
+                               .values(table_name=table_name, version=1))
+    return
+
+
+def read_data_version(connection:Connection, table_name:str) -> int:
+    '''Current change counter of a single table within a transaction, 0 if
+       never written.
+    '''
+    data_versions = Data_Versions_Table.__table__
+    version = connection.execute(select(data_versions.c.version)
+                                 .where(data_versions.c.table_name==table_name)).scalar()
+    return version or 0
+
+
+def get_data_versions(engine:Any) -> Dict[str,int]:
+    '''Current change counter of all tables (one primary key scan of a tiny
+       table), tables never written have version 0.
+    '''
+    data_versions = Data_Versions_Table.__table__
+    with engine.connect() as connection:
+        rows = connection.execute(select(data_versions.c.table_name,
+                                         data_versions.c.version)).all()
+    versions = {table_name:0 for table_name in DATA_VERSION_TABLES}
+    versions.update({table_name:version for table_name, version in rows})
+    return versions
+
+
+def get_data_version(versions:Dict[str,int], *table_names:str) -> str:
+    '''Cache key of a read depending on the given tables, changes as soon
+       as one of them is written.
+
+    Parameters
+    ----------
+    versions : Dict[str,int]
+        Result of get_data_versions.
+    table_names : str
+        Tables read.
+
+    Returns
+    -------
+    str
+        e.g. "transactions:12;participants_labeled:40"
+    '''
+    return ";".join(f"{table_name}:{versions.get(table_name, 0)}"
+                    for table_name in table_names)
@@ -0,0 +1,161 @@
+import pandas as pd
+from typing import Any, List, Union
+
+from sqlalchemy import select, insert, delete, exists, func
+from sqlalchemy.engine import Connection
+
+from money_map.models.orm_models import (Transactions_Table,
+                                         Participants_Labeled_Table,
+                                         Rule_Matches_Table,
+                                         Unlabeled_Participants_Table)
+from money_map.ingestion.bulk_writer import Bulk_Writer
+from money_map.ingestion.staging import insert_missing_rows
+from money_map.ingestion.normalization import PARTICIPANT_KEY_COLUMNS
+from money_map.pipelines.data_versions import bump_data_version
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# columns of Unlabeled_Participants_Table taken from Transactions_Table
+QUEUE_COLUMNS:List[str] = PARTICIPANT_KEY_COLUMNS + ["participant_key"]
+
+# order in which participants are labeled (indexed)
+QUEUE_ORDER:List[str] = ["receiver_name", "purpose_char", "participant_key"]
+
+# =============================================================================
+# Maintenance
+# =============================================================================
+
+def enqueue_participants(connection:Connection,
+                         df:pd.DataFrame,
+                         bulk_writer:Union[Bulk_Writer,None]=None) -> int:
+    '''Adds the participants of newly ingested transactions to
+       Unlabeled_Participants_Table, unless they are queued, labeled or
+       categorized by a rule already (categorize_participants runs first).
+       Cost depends on the batch only.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside the transaction of the ingestion.
+    df : pd.DataFrame
+        Cleaned transactions containing QUEUE_COLUMNS.
+    bulk_writer : Union[Bulk_Writer,None], optional
+        Writer used for loading the staging table, by default None
+
+    Returns
+    -------
+    int
+        Number of queued participants.
+    '''
+    participants = df[QUEUE_COLUMNS].drop_duplicates(subset="participant_key")
+    rowcount = insert_missing_rows(connection=connection,
+                                   df=participants,
+                                   target_table=Unlabeled_Participants_Table.__table__,
+                                   bulk_writer=bulk_writer,
+                                   exclude_columns=[Participants_Labeled_Table.participant_key,
+                                                    Rule_Matches_Table.participant_key])
+    if rowcount != 0:
+        bump_data_version(connection, Unlabeled_Participants_Table.__tablename__)
+    return rowcount
+
+
+def dequeue_participants(connection:Connection, participant_keys:List[str]) -> int:
+    '''Removes labeled participants from Unlabeled_Participants_Table
+       (primary key delete).
+    '''
+    queue = Unlabeled_Participants_Table.__table__
+    rowcount = connection.execute(delete(queue)
+                                  .where(queue.c.participant_key.in_(participant_keys))).rowcount
+    bump_data_version(connection, Unlabeled_Participants_Table.__tablename__)
+    return rowcount
+
+
+def rebuild_labeling_queue(engine:Any) -> int:
+    '''Full rebuild of Unlabeled_Participants_Table by one anti-join of
+       Transactions_Table against Participants_Labeled_Table &
+       Rule_Matches_Table. Executed by every full materialization of
+       Transactions_Labeled_Table (deleted labels, changed rules) and after
+       participant keys were backfilled.
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+
+    Returns
+    -------
+    int
+        Number of queued participants.
+    '''
+    with engine.begin() as connection:
+        rowcount = rebuild_queue(connection=connection)
+    return rowcount
+
+
+def rebuild_queue(connection:Connection) -> int:
+    '''Rebuild of Unlabeled_Participants_Table within the transaction of
+       connection, see rebuild_labeling_queue.
+    '''
+    queue = Unlabeled_Participants_Table.__table__
+    transactions = Transactions_Table.__table__
+
+    # one row per participant_key, spellings differ in case & spaces only
+    query = (select(*[func.min(transactions.c[col]).label(col)
+                      for col in PARTICIPANT_KEY_COLUMNS],
+                    transactions.c.participant_key)
+             .where(transactions.c.participant_key.is_not(None))
+             .where(~exists().where(Participants_Labeled_Table.participant_key==
+                                    transactions.c.participant_key))
+             .where(~exists().where(Rule_Matches_Table.participant_key==
+                                    transactions.c.participant_key))
+             .group_by(transactions.c.participant_key))
+
+    connection.execute(delete(queue))
+    rowcount = connection.execute(insert(queue).from_select(QUEUE_COLUMNS, query)).rowcount
+    bump_data_version(connection, Unlabeled_Participants_Table.__tablename__)
+    return rowcount
+
+# =============================================================================
+# Queries
+# =============================================================================
+
+def query_next_participants(engine:Any, limit:int=10,
+                            receiver_name:Union[str,None]=None) -> pd.DataFrame:
+    '''Next participants to label in QUEUE_ORDER (index range scan, constant
+       cost independent of the number of transactions).
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    limit : int, optional
+        Number of participants, by default 10
+    receiver_name : Union[str,None], optional
+        Only participants whose receiver_name contains this text (case
+        insensitive, % and _ match literally), by default None
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns QUEUE_COLUMNS.
+    '''
+    queue = Unlabeled_Participants_Table.__table__
+    stmt = (select(*[queue.c[col] for col in QUEUE_COLUMNS])
+            .order_by(*[queue.c[col] for col in QUEUE_ORDER])
+            .limit(limit))
+    if receiver_name:
+        stmt = stmt.where(queue.c.receiver_name.icontains(receiver_name, autoescape=True))
+    with engine.connect() as connection:
+        df = pd.read_sql(stmt, connection)
+    return df
+
+
+def query_queue_length(engine:Any) -> int:
+    '''Number of participants waiting for a label.
+    '''
+    with engine.connect() as connection:
+        count = connection.execute(select(func.count())
+                                   .select_from(Unlabeled_Participants_Table)).scalar()
+    return int(count)
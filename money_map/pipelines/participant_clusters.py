@@ -0,0 +1,343 @@
+import time
+from typing import Any, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from attrs import define
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.engine import Connection
+
+from money_map.models.orm_models import (Unlabeled_Participants_Table,
+                                         Participant_Clusters_Table)
+from money_map.ingestion.bulk_writer import Bulk_Writer
+from money_map.pipelines.data_versions import bump_data_version
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# participants are only clustered within the same group
+CLUSTER_GROUP_COLUMNS:List[str] = ["receiver_iban", "booking_text"]
+
+# prime above 2**32 for universal hashing of 32 bit token hashes
+MINHASH_PRIME:int = 4294967311
+
+# =============================================================================
+# MinHash & LSH
+# =============================================================================
+
+def tokenize(purpose_char:pd.Series) -> Tuple[np.ndarray,np.ndarray]:
+    '''Distinct word tokens of every purpose_char as (position of the
+       participant, 32 bit token hash), ordered by position.
+    '''
+    tokens = purpose_char.fillna("").astype(str).str.split().reset_index(drop=True).explode()
+    tokens = tokens.loc[tokens.notna() & (tokens != "")]
+    pairs = pd.DataFrame({"position":tokens.index.to_numpy(dtype=np.int64),
+                          "token":tokens.to_numpy(dtype=object)}).drop_duplicates()
+    hashes = pd.util.hash_array(pairs["token"].to_numpy(dtype=object)) & np.uint64(0xFFFFFFFF)
+    return pairs["position"].to_numpy(), hashes
+
+
+def minhash_signatures(positions:np.ndarray, hashes:np.ndarray, n_participants:int,
+                       num_perm:int=64, seed:int=1234) -> np.ndarray:
+    '''MinHash signature (num_perm minimal permuted token hashes) of every
+       participant. The share of equal signature values of two participants
+       estimates the Jaccard similarity of their token sets. Participants
+       without tokens keep the maximal value everywhere.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        Position of the participant of each token, ascending (see tokenize).
+    hashes : np.ndarray
+        32 bit hash of each token.
+    n_participants : int
+        Number of participants.
+    num_perm : int, optional
+        Signature length, by default 64
+    seed : int, optional
+        Seed of the hash permutations, by default 1234
+
+    Returns
+    -------
+    np.ndarray
+        uint64 array of shape (n_participants, num_perm).
+    '''
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**31, num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**31, num_perm, dtype=np.uint64)
+
+    signatures = np.full((n_participants, num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    if len(positions) == 0:
+        return signatures
+
+    starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+    owners = positions[starts]
+    for perm in range(num_perm):
+        # a * hash + b stays below 2**64 for 32 bit hashes
+        values = (a[perm] * hashes + b[perm]) % np.uint64(MINHASH_PRIME)
+        signatures[owners, perm] = np.minimum.reduceat(values, starts)
+    return signatures
+
+
+def lsh_candidate_pairs(signatures:np.ndarray, groups:np.ndarray,
+                        bands:int=16) -> np.ndarray:
+    '''Candidate pairs of participants of the same group whose signatures
+       are equal in at least one band (locality sensitive hashing). Every
+       participant is paired with the first participant of its bucket, which
+       keeps the number of pairs linear.
+
+    Parameters
+    ----------
+    signatures : np.ndarray
+        MinHash signatures, number of columns divisible by bands.
+    groups : np.ndarray
+        Group code of each participant.
+    bands : int, optional
+        Number of bands, by default 16
+
+    Returns
+    -------
+    np.ndarray
+        Distinct pairs, shape (n_pairs, 2).
+    '''
+    n_participants, num_perm = signatures.shape
+    rows = num_perm // bands
+    positions = np.arange(n_participants)
+
+    pairs = []
+    for band in range(bands):
+        keys = pd.DataFrame(signatures[:, band*rows:(band+1)*rows])
+        keys["group"] = groups
+        codes = pd.factorize(pd.util.hash_pandas_object(keys, index=False))[0]
+        _, first = np.unique(codes, return_index=True)
+        first = first[codes]
+        collided = first != positions
+        pairs.append(np.column_stack([first[collided], positions[collided]]))
+
+    # distinct pairs, encoded as one int64 (much faster than unique rows)
+    pairs = np.concatenate(pairs).astype(np.int64) if pairs else np.empty((0, 2), dtype=np.int64)
+    codes = np.unique(pairs[:, 0] * n_participants + pairs[:, 1])
+    return np.column_stack([codes // n_participants, codes % n_participants])
+
+
+def connected_components(n_nodes:int, pairs:np.ndarray) -> np.ndarray:
+    '''Component of every node (smallest node of the component) given the
+       edges pairs, union-find with path halving.
+    '''
+    parent = list(range(n_nodes))
+
+    def find(node:int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for left, right in pairs.tolist():
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+
+    return np.array([find(node) for node in range(n_nodes)], dtype=np.int64)
+
+def split_by_representative(components:np.ndarray, signatures:np.ndarray,
+                            threshold:float) -> np.ndarray:
+    '''Splits connected components until every member is similar to its
+       representative (smallest position): the smallest dissimilar member of
+       a cluster becomes the representative of all dissimilar members,
+       repeated for them. Chains A~B~C never group dissimilar A & C.
+
+    Parameters
+    ----------
+    components : np.ndarray
+        Smallest position of the component of every participant.
+    signatures : np.ndarray
+        MinHash signatures.
+    threshold : float
+        Minimal estimated Jaccard similarity to the representative.
+
+    Returns
+    -------
+    np.ndarray
+        Position of the representative of every participant.
+    '''
+    representatives = components.copy()
+    members = np.flatnonzero(representatives != np.arange(len(representatives)))
+    while len(members) > 0:
+        similarity = (signatures[members] == signatures[representatives[members]]).mean(axis=1)
+        members = members[similarity < threshold]
+        if len(members) == 0:
+            break
+        leaders = (pd.Series(members).groupby(representatives[members])
+                   .transform("min").to_numpy())
+        representatives[members] = leaders
+        members = members[members != leaders]
+    return representatives
+
+# =============================================================================
+# Participant Clusters
+# =============================================================================
+
+@define
+class Cluster_Report:
+    '''Size of the labeling queue before and after grouping near-duplicates.
+    '''
+    participants:int
+    clusters:int
+    seconds:float = 0.0
+
+    @property
+    def shrink(self) -> float:
+        '''Share of labeling actions saved by labeling clusters at once.'''
+        if self.participants == 0:
+            return 0.0
+        return 1 - self.clusters / self.participants
+
+    def __str__(self) -> str:
+        return (f"{self.participants} participants -> {self.clusters} groups "
+                f"({self.shrink:.0%} less labeling actions, {self.seconds:.1f}s)")
+
+
+def cluster_participants(df:pd.DataFrame,
+                         threshold:float=0.6,
+                         num_perm:int=64,
+                         bands:int=16,
+                         seed:int=1234) -> np.ndarray:
+    '''Clusters near-duplicate participants: same CLUSTER_GROUP_COLUMNS and
+       similar purpose_char tokens (estimated Jaccard similarity of at least
+       threshold to the representative of the cluster). Runs in near-linear
+       time: MinHash, LSH buckets, union-find over verified candidate pairs
+       and a split of components whose members drift apart.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Participants containing CLUSTER_GROUP_COLUMNS & purpose_char.
+    threshold : float, optional
+        Minimal estimated Jaccard similarity to the representative, by default 0.6
+    num_perm : int, optional
+        MinHash signature length, by default 64
+    bands : int, optional
+        LSH bands, by default 16 (4 rows each, candidate threshold ~0.5)
+    seed : int, optional
+        Seed of the hash permutations, by default 1234
+
+    Returns
+    -------
+    np.ndarray
+        Position (in df) of the representative of every participant's cluster.
+    '''
+    n_participants = df.shape[0]
+    if n_participants == 0:
+        return np.empty(0, dtype=np.int64)
+
+    groups = pd.factorize(pd.util.hash_pandas_object(
+        df[CLUSTER_GROUP_COLUMNS].astype(str).apply(lambda col: col.str.strip(" ").str.lower()),
+        index=False))[0]
+    positions, hashes = tokenize(df["purpose_char"])
+    signatures = minhash_signatures(positions=positions, hashes=hashes,
+                                    n_participants=n_participants,
+                                    num_perm=num_perm, seed=seed)
+
+    # verify candidates by their estimated similarity
+    pairs = lsh_candidate_pairs(signatures=signatures, groups=groups, bands=bands)
+    similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+    pairs = pairs[similarity >= threshold]
+
+    components = connected_components(n_nodes=n_participants, pairs=pairs)
+    return split_by_representative(components=components, signatures=signatures,
+                                   threshold=threshold)
+
+
+def rebuild_participant_clusters(connection:Connection,
+                                 bulk_writer:Union[Bulk_Writer,None]=None,
+                                 **kwargs:Any) -> Cluster_Report:
+    '''Clusters all participants of Unlabeled_Participants_Table and
+       replaces Participant_Clusters_Table. A cluster is identified by the
+       participant_key of its first participant in queue order.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside a transaction.
+    bulk_writer : Union[Bulk_Writer,None], optional
+        Writer used for loading Participant_Clusters_Table, by default None
+    kwargs : Any
+        Passed to cluster_participants.
+
+    Returns
+    -------
+    Cluster_Report
+        Queue length before & after clustering.
+    '''
+    start = time.perf_counter()
+    queue = Unlabeled_Participants_Table.__table__
+    clusters = Participant_Clusters_Table.__table__
+
+    df = pd.read_sql(select(queue.c.participant_key, queue.c.purpose_char,
+                            *[queue.c[col] for col in CLUSTER_GROUP_COLUMNS])
+                     .order_by(queue.c.receiver_name, queue.c.purpose_char,
+                               queue.c.participant_key),
+                     connection)
+    representatives = cluster_participants(df=df, **kwargs)
+
+    connection.execute(delete(clusters))
+    result = pd.DataFrame({"participant_key":df["participant_key"].to_numpy(),
+                           "cluster_key":df["participant_key"].to_numpy()[representatives]})
+    if not result.empty:
+        bulk_writer = bulk_writer or Bulk_Writer()
+        bulk_writer.write(connection=connection, df=result, table=clusters)
+    bump_data_version(connection, Participant_Clusters_Table.__tablename__)
+
+    return Cluster_Report(participants=df.shape[0],
+                          clusters=len(np.unique(representatives)),
+                          seconds=time.perf_counter() - start)
+
+
+def update_participant_clusters(engine:Any, **kwargs:Any) -> Cluster_Report:
+    '''Reclusters the labeling queue, see rebuild_participant_clusters.
+    '''
+    with engine.begin() as connection:
+        report = rebuild_participant_clusters(connection=connection, **kwargs)
+    return report
+
+# =============================================================================
+# Queries
+# =============================================================================
+
+def query_cluster_members(engine:Any, participant_key:str) -> pd.DataFrame:
+    '''Queued participants in the cluster of participant_key (including
+       itself), in queue order. Only participant_key itself if not clustered.
+    '''
+    queue = Unlabeled_Participants_Table.__table__
+    clusters = Participant_Clusters_Table.__table__
+    cluster_key = (select(clusters.c.cluster_key)
+                   .where(clusters.c.participant_key==participant_key)
+                   .scalar_subquery())
+    stmt = (select(queue)
+            .join(clusters, clusters.c.participant_key==queue.c.participant_key)
+            .where(clusters.c.cluster_key==cluster_key)
+            .order_by(queue.c.receiver_name, queue.c.purpose_char, queue.c.participant_key))
+    with engine.connect() as connection:
+        df = pd.read_sql(stmt, connection)
+    if df.empty:
+        with engine.connect() as connection:
+            df = pd.read_sql(select(queue).where(queue.c.participant_key==participant_key),
+                             connection)
+    return df
+
+
+def query_queue_cluster_count(engine:Any) -> int:
+    '''Number of labeling actions left when labeling clusters at once:
+       distinct clusters of queued participants (unclustered count single).
+    '''
+    queue = Unlabeled_Participants_Table.__table__
+    clusters = Participant_Clusters_Table.__table__
+    cluster_key = func.coalesce(clusters.c.cluster_key, queue.c.participant_key)
+    stmt = (select(func.count(func.distinct(cluster_key)))
+            .select_from(queue.outerjoin(clusters,
+                                         clusters.c.participant_key==queue.c.participant_key)))
+    with engine.connect() as connection:
+        count = connection.execute(stmt).scalar()
+    return int(count)
@@ -0,0 +1,74 @@
+import pandas as pd
+from typing import Any
+
+from sqlalchemy import Table, select, update, delete, bindparam
+
+from money_map.models.orm_models import (Transactions_Table,
+                                         Participants_Labeled_Table,
+                                         Materialization_Watermarks_Table)
+from money_map.ingestion.normalization import (PARTICIPANT_KEY_COLUMNS,
+                                               compute_participant_keys)
+from money_map.pipelines.data_versions import bump_data_version
+from money_map.pipelines.labeling_queue import rebuild_queue
+from money_map.pipelines.participant_clusters import rebuild_participant_clusters
+
+# =============================================================================
+
+def backfill_participant_keys(engine:Any, chunksize:int=10000) -> int:
+    '''Computes participant_key for rows of Transactions_Table &
+       Participants_Labeled_Table stored without it (rows stored before the
+       column existed or loaded from outside the ingestors). Materialization
+       watermarks are reset afterwards, so the next refresh is a full rebuild,
+       and the labeling queue & its clusters are rebuilt.
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    chunksize : int, optional
+        Rows updated per transaction, by default 10000
+
+    Returns
+    -------
+    int
+        Number of updated rows.
+    '''
+    rowcount = 0
+    for table in [Transactions_Table.__table__, Participants_Labeled_Table.__table__]:
+        rowcount += backfill_table(engine=engine, table=table, chunksize=chunksize)
+
+    if rowcount != 0:
+        with engine.begin() as connection:
+            connection.execute(delete(Materialization_Watermarks_Table))
+            bump_data_version(connection, Transactions_Table.__tablename__,
+                              Participants_Labeled_Table.__tablename__)
+            rebuild_queue(connection=connection)
+            rebuild_participant_clusters(connection=connection)
+    return rowcount
+
+
+def backfill_table(engine:Any, table:Table, chunksize:int=10000) -> int:
+    '''Backfills participant_key of a single table in chunks.
+    '''
+    primary_key = list(table.primary_key.columns)[0]
+    query = (select(primary_key, *[table.c[col] for col in PARTICIPANT_KEY_COLUMNS])
+             .where(table.c.participant_key.is_(None))
+             .limit(chunksize))
+    stmt = (update(table)
+            .where(primary_key==bindparam("_primary_key"))
+            .values(participant_key=bindparam("_participant_key")))
+
+    rowcount = 0
+    while True:
+        with engine.begin() as connection:
+            df = pd.read_sql(query, connection)
+            if df.empty:
+                break
+            keys = compute_participant_keys(df)
+            connection.execute(stmt, [{"_primary_key":pk, "_participant_key":key}
+                                      for pk, key in zip(df[primary_key.name].tolist(),
+                                                         keys.tolist())])
+            rowcount += df.shape[0]
+    return rowcount
+
+# =============================================================================
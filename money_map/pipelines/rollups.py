@@ -0,0 +1,272 @@
+import datetime
+import pandas as pd
+from typing import Any, List, Union
+
+from sqlalchemy import select, delete, insert, extract, func, literal, tuple_, union_all
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from money_map.models.orm_models import (Transactions_Table,
+                                         Transactions_Labeled_Table,
+                                         Monthly_Category_Totals_Table,
+                                         Daily_Balance_Table)
+from money_map.ingestion.bulk_writer import dataframe_to_records
+from money_map.pipelines.watermarks import (get_watermark, get_watermark_markers,
+                                            set_watermark, has_changed, changed_since,
+                                            refresh_lock)
+from money_map.pipelines.data_versions import bump_data_version
+
+# =============================================================================
+# Monthly Category Totals
+# =============================================================================
+
+def select_monthly_category_totals() -> Select:
+    '''Aggregation of Transactions_Labeled_Table into the columns of
+       Monthly_Category_Totals_Table.
+    '''
+    labeled = Transactions_Labeled_Table.__table__
+    year = extract("year", labeled.c.booking_date)
+    month = extract("month", labeled.c.booking_date)
+
+    return (select(labeled.c.sender_iban,
+                   year.label("year"),
+                   month.label("month"),
+                   labeled.c.category_id,
+                   func.max(labeled.c.category_1).label("category_1"),
+                   func.max(labeled.c.category_2).label("category_2"),
+                   func.max(labeled.c.category_3).label("category_3"),
+                   func.sum(labeled.c.amount).label("amount"),
+                   func.count().label("transaction_count"),
+                   func.avg(labeled.c.balance_after_booking).label("mean_balance_after_booking"))
+            .group_by(labeled.c.sender_iban, year, month, labeled.c.category_id))
+
+
+def select_affected_months(transactions:Select) -> Select:
+    '''Distinct (sender_iban, year, month) of a select of transactions, which
+       must contain the columns sender_iban & booking_date.
+    '''
+    transactions = transactions.subquery()
+    return (select(transactions.c.sender_iban,
+                   extract("year", transactions.c.booking_date),
+                   extract("month", transactions.c.booking_date))
+            .distinct())
+
+
+def refresh_monthly_category_totals(connection:Connection,
+                                    affected_transactions:Union[Select,None]=None) -> int:
+    '''Recomputes Monthly_Category_Totals_Table from Transactions_Labeled_Table,
+       either completely or only the months (per account, all categories)
+       touched by affected_transactions. Executed inside the transaction
+       materializing Transactions_Labeled_Table.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside a transaction.
+    affected_transactions : Union[Select,None], optional
+        Transactions changed by an incremental refresh, by default None
+        (full rebuild)
+
+    Returns
+    -------
+    int
+        Number of written rollup rows.
+    '''
+    totals = Monthly_Category_Totals_Table.__table__
+    query = select_monthly_category_totals()
+    stmt = delete(totals)
+
+    if affected_transactions is not None:
+        labeled = Transactions_Labeled_Table.__table__
+        affected_months = select_affected_months(transactions=affected_transactions)
+        stmt = stmt.where(tuple_(totals.c.sender_iban, totals.c.year, totals.c.month)
+                          .in_(affected_months))
+        query = query.where(tuple_(labeled.c.sender_iban,
+                                   extract("year", labeled.c.booking_date),
+                                   extract("month", labeled.c.booking_date))
+                            .in_(affected_months))
+
+    connection.execute(stmt)
+    rowcount = connection.execute(
+        insert(totals).from_select([col.name for col in totals.columns], query)).rowcount
+    return rowcount
+
+
+# =============================================================================
+# Daily Balance
+# =============================================================================
+
+DAILY_BALANCE_COLUMNS:List[str] = ["min_balance_after_booking",
+                                   "mean_balance_after_booking",
+                                   "max_balance_after_booking"]
+
+
+def select_daily_closing_balance(sender_iban:str, start_date:datetime.date) -> Select:
+    '''Balance after the last booking of each booking day of an account from
+       start_date on. Bookings have no time of day: the last one is the
+       booking whose balance after booking is no other same day booking's
+       balance before booking (balance_after_booking - amount, in cents).
+       Days whose bookings end at their opening balance have no such booking
+       and are missing.
+    '''
+    transactions = Transactions_Table.__table__
+    account_days = (transactions.c.sender_iban==sender_iban,
+                    transactions.c.booking_date>=start_date)
+
+    # balances after booking count +1, balances before booking -1
+    balances = union_all(
+        select(transactions.c.booking_date,
+               func.round(transactions.c.balance_after_booking, 2).label("balance"),
+               literal(1).label("weight"))
+        .where(*account_days),
+        select(transactions.c.booking_date,
+               func.round(transactions.c.balance_after_booking - transactions.c.amount, 2
+                          ).label("balance"),
+               literal(-1).label("weight"))
+        .where(*account_days)).subquery()
+    closing = (select(balances.c.booking_date, balances.c.balance)
+               .group_by(balances.c.booking_date, balances.c.balance)
+               .having(func.sum(balances.c.weight) > 0)).subquery()
+
+    return (select(closing.c.booking_date,
+                   func.max(closing.c.balance).label("closing_balance_after_booking"))
+            .group_by(closing.c.booking_date))
+
+
+def refresh_daily_balance(engine:Any,
+                          target_table_name:str=Daily_Balance_Table.__tablename__) -> int:
+    '''Extends Daily_Balance_Table by transactions ingested since the last
+       refresh (watermark on Transactions_Table.ingested_at). Per account only
+       the days from the earliest new booking date onwards are recomputed.
+       Executed after every ingestion, without watermark all accounts are
+       computed completely. Concurrent refreshes are serialized (see
+       refresh_lock).
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    target_table_name : str, optional
+        Name used for the watermark, by default Daily_Balance_Table.__tablename__
+
+    Returns
+    -------
+    int
+        Number of written rows.
+    '''
+    transactions = Transactions_Table.__table__
+
+    rowcount = 0
+    with refresh_lock(engine=engine, target_table_name=target_table_name), \
+         engine.begin() as connection:
+        watermark = get_watermark(engine=engine, target_table_name=target_table_name)
+        markers = get_watermark_markers(connection=connection)
+
+        stmt = (select(transactions.c.sender_iban,
+                       func.min(transactions.c.booking_date).label("start_date"))
+                .group_by(transactions.c.sender_iban))
+        if watermark is not None:
+            if not has_changed(connection=connection,
+                               column=transactions.c.ingested_at,
+                               watermark=watermark.transactions_watermark,
+                               watermark_count=watermark.transactions_watermark_count):
+                return 0
+            stmt = stmt.where(changed_since(column=transactions.c.ingested_at,
+                                            watermark=watermark.transactions_watermark))
+
+        for sender_iban, start_date in connection.execute(stmt).all():
+            rowcount += refresh_account_daily_balance(connection=connection,
+                                                      sender_iban=sender_iban,
+                                                      start_date=start_date)
+
+        set_watermark(connection=connection, target_table_name=target_table_name,
+                      markers=markers)
+        if rowcount != 0:
+            bump_data_version(connection, Daily_Balance_Table.__tablename__)
+    return rowcount
+
+
+def refresh_account_daily_balance(connection:Connection,
+                                  sender_iban:str,
+                                  start_date:datetime.date) -> int:
+    '''Recomputes Daily_Balance_Table of one account from start_date until
+       its latest booking date. Days without bookings are filled with the
+       closing balance of the previous day, seeded by the last day before
+       start_date.
+
+    Parameters
+    ----------
+    connection : Connection
+        SQLAlchemy connection, should be inside a transaction.
+    sender_iban : str
+        Account.
+    start_date : datetime.date
+        Earliest booking date to recompute.
+
+    Returns
+    -------
+    int
+        Number of written rows.
+    '''
+    transactions = Transactions_Table.__table__
+    daily_balance = Daily_Balance_Table.__table__
+
+    # daily aggregates from start_date on
+    stmt = (select(transactions.c.booking_date,
+                   func.min(transactions.c.balance_after_booking).label("min_balance_after_booking"),
+                   func.avg(transactions.c.balance_after_booking).label("mean_balance_after_booking"),
+                   func.max(transactions.c.balance_after_booking).label("max_balance_after_booking"),
+                   func.count().label("transaction_count"))
+            .where(transactions.c.sender_iban==sender_iban,
+                   transactions.c.booking_date>=start_date)
+            .group_by(transactions.c.booking_date))
+    daily_df = pd.read_sql(stmt, connection)
+    if daily_df.empty:
+        return 0
+    closing_df = pd.read_sql(select_daily_closing_balance(sender_iban=sender_iban,
+                                                          start_date=start_date), connection)
+    for df in [daily_df, closing_df]:
+        df["booking_date"] = pd.to_datetime(df["booking_date"])
+    daily_df = daily_df.merge(closing_df, on="booking_date", how="left")
+    daily_df = daily_df.set_index("booking_date").sort_index()
+
+    # last known day before start_date
+    previous = connection.execute(
+        select(daily_balance)
+        .where(daily_balance.c.sender_iban==sender_iban,
+               daily_balance.c.booking_date<start_date)
+        .order_by(daily_balance.c.booking_date.desc())
+        .limit(1)).mappings().first()
+
+    first_date = daily_df.index.min()
+    if previous is not None:
+        first_date = pd.Timestamp(previous["booking_date"]) + pd.Timedelta(days=1)
+        seed = pd.DataFrame({col:[previous[col]] for col
+                             in DAILY_BALANCE_COLUMNS + ["closing_balance_after_booking"]},
+                            index=[pd.Timestamp(previous["booking_date"])])
+        daily_df = pd.concat([seed, daily_df])
+
+    # days without bookings & days without unique closing booking (balance
+    # back at its opening) close at the previous closing balance, the mean
+    # stands in if there is none
+    daily_df = daily_df.reindex(pd.date_range(daily_df.index.min(), daily_df.index.max(), freq="D"))
+    daily_df["is_filled"] = daily_df["transaction_count"].isna()
+    closing = (daily_df["closing_balance_after_booking"].ffill()
+               .fillna(daily_df["mean_balance_after_booking"]).ffill())
+    daily_df["closing_balance_after_booking"] = closing
+    for col in DAILY_BALANCE_COLUMNS:
+        daily_df[col] = daily_df[col].fillna(closing)
+    daily_df["transaction_count"] = daily_df["transaction_count"].fillna(0).astype(int)
+    daily_df = daily_df.loc[daily_df.index >= first_date]
+
+    daily_df = daily_df.rename_axis("booking_date").reset_index()
+    daily_df.insert(0, "sender_iban", sender_iban)
+
+    connection.execute(delete(daily_balance)
+                       .where(daily_balance.c.sender_iban==sender_iban,
+                              daily_balance.c.booking_date>=first_date.date()))
+    connection.execute(insert(daily_balance), dataframe_to_records(daily_df))
+    return daily_df.shape[0]
+
+
+# =============================================================================
@@ -0,0 +1,164 @@
+import datetime
+import pandas as pd
+from typing import Any, List, Tuple, Union
+
+from sqlalchemy import select, func, distinct
+
+from money_map.models.orm_models import (Monthly_Category_Totals_Table,
+                                         Daily_Balance_Table)
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+CATEGORY_LEVELS:List[str] = ["category_1", "category_2", "category_3"]
+
+# =============================================================================
+# Statistics Queries
+# =============================================================================
+
+def query_accounts(engine:Any) -> List[str]:
+    '''Accounts contained in Daily_Balance_Table.
+    '''
+    daily_balance = Daily_Balance_Table.__table__
+    stmt = (select(distinct(daily_balance.c.sender_iban))
+            .order_by(daily_balance.c.sender_iban))
+    with engine.connect() as connection:
+        sender_ibans = connection.execute(stmt).scalars().all()
+    return list(sender_ibans)
+
+
+def query_date_bounds(engine:Any, sender_ibans:List[str]
+                      ) -> Tuple[Union[datetime.date,None],Union[datetime.date,None]]:
+    '''First & last booking date of Daily_Balance_Table of the given accounts.
+    '''
+    daily_balance = Daily_Balance_Table.__table__
+    stmt = (select(func.min(daily_balance.c.booking_date),
+                   func.max(daily_balance.c.booking_date))
+            .where(daily_balance.c.sender_iban.in_(sender_ibans)))
+    with engine.connect() as connection:
+        start_date, end_date = connection.execute(stmt).one()
+    return start_date, end_date
+
+
+def query_categories(engine:Any, sender_ibans:List[str],
+                     category_level:str="category_3") -> List[str]:
+    '''Categories of the given level booked on the given accounts.
+    '''
+    totals = Monthly_Category_Totals_Table.__table__
+    category = totals.c[check_category_level(category_level)]
+    stmt = (select(distinct(category))
+            .where(totals.c.sender_iban.in_(sender_ibans))
+            .order_by(category))
+    with engine.connect() as connection:
+        categories = connection.execute(stmt).scalars().all()
+    return list(categories)
+
+
+def query_monthly_totals(engine:Any,
+                         sender_ibans:List[str],
+                         start_date:Union[datetime.date,None]=None,
+                         end_date:Union[datetime.date,None]=None,
+                         category_level:str="category_3",
+                         categories:Union[List[str],None]=None,
+                         ignore_categories_3:List[str]=["Transfer"]) -> pd.DataFrame:
+    '''Monthly totals per account and category of the given level, aggregated
+       by the database (GROUP BY on Monthly_Category_Totals_Table). Only the
+       aggregated rows are transferred.
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    sender_ibans : List[str]
+        Accounts.
+    start_date : Union[datetime.date,None], optional
+        Months before the month of start_date are excluded, by default None
+    end_date : Union[datetime.date,None], optional
+        Months after the month of end_date are excluded, by default None
+    category_level : str, optional
+        One of CATEGORY_LEVELS, by default "category_3"
+    categories : Union[List[str],None], optional
+        Categories of category_level to include, by default None (all)
+    ignore_categories_3 : List[str], optional
+        Categories 3rd level to exclude, by default ["Transfer"]
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns sender_iban, year, month, <category_level>, amount,
+        transaction_count, mean_balance_after_booking.
+    '''
+    totals = Monthly_Category_Totals_Table.__table__
+    category = totals.c[check_category_level(category_level)]
+    year_month = totals.c.year * 100 + totals.c.month
+    transaction_count = func.sum(totals.c.transaction_count)
+
+    stmt = (select(totals.c.sender_iban,
+                   totals.c.year,
+                   totals.c.month,
+                   category,
+                   func.sum(totals.c.amount).label("amount"),
+                   transaction_count.label("transaction_count"),
+                   (func.sum(totals.c.mean_balance_after_booking * totals.c.transaction_count)
+                    / transaction_count).label("mean_balance_after_booking"))
+            .where(totals.c.sender_iban.in_(sender_ibans))
+            .group_by(totals.c.sender_iban, totals.c.year, totals.c.month, category)
+            .order_by(totals.c.sender_iban, totals.c.year, totals.c.month, category))
+
+    if start_date is not None:
+        stmt = stmt.where(year_month >= start_date.year * 100 + start_date.month)
+    if end_date is not None:
+        stmt = stmt.where(year_month <= end_date.year * 100 + end_date.month)
+    if categories:
+        stmt = stmt.where(category.in_(categories))
+    if ignore_categories_3:
+        stmt = stmt.where(totals.c.category_3.not_in(ignore_categories_3))
+
+    with engine.connect() as connection:
+        df = pd.read_sql(stmt, connection)
+    return df
+
+
+def query_daily_balance(engine:Any,
+                        sender_ibans:List[str],
+                        start_date:Union[datetime.date,None]=None,
+                        end_date:Union[datetime.date,None]=None) -> pd.DataFrame:
+    '''Daily balance of the given accounts within a date range (index range
+       scan on the primary key of Daily_Balance_Table).
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    sender_ibans : List[str]
+        Accounts.
+    start_date : Union[datetime.date,None], optional
+        First booking date, by default None
+    end_date : Union[datetime.date,None], optional
+        Last booking date, by default None
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of Daily_Balance_Table ordered by account & booking_date.
+    '''
+    daily_balance = Daily_Balance_Table.__table__
+    stmt = (select(daily_balance)
+            .where(daily_balance.c.sender_iban.in_(sender_ibans))
+            .order_by(daily_balance.c.sender_iban, daily_balance.c.booking_date))
+
+    if start_date is not None:
+        stmt = stmt.where(daily_balance.c.booking_date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(daily_balance.c.booking_date <= end_date)
+
+    with engine.connect() as connection:
+        df = pd.read_sql(stmt, connection)
+    return df
+
+
+def check_category_level(category_level:str) -> str:
+    if category_level not in CATEGORY_LEVELS:
+        raise Exception(f"Unknown Category Level: {category_level}")
+    return category_level
@@ -0,0 +1,218 @@
+import threading
+from array import array
+from typing import Any, Dict, List, Mapping, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from attrs import define, field
+
+from sqlalchemy import select
+
+from money_map.models.orm_models import Participants_Labeled_Table
+from money_map.ingestion.normalization import normalize_participant_value
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# compared columns and their share of the similarity score
+SUGGESTION_FIELD_WEIGHTS:Dict[str,float] = {"receiver_name":0.5,
+                                            "purpose_char":0.5}
+
+# =============================================================================
+# Character N-Grams
+# =============================================================================
+
+def char_ngrams(value:Any, n:int=3) -> Set[str]:
+    '''Distinct character n-grams of a normalized value, padded with one
+       blank on both sides so short words & word boundaries produce n-grams.
+    '''
+    text = f" {normalize_participant_value(value)} "
+    return {text[i:i+n] for i in range(len(text)-n+1)}
+
+# =============================================================================
+# Suggestion Index
+# =============================================================================
+
+@define
+class Suggestion_Index:
+    '''In-process similarity index over Participants_Labeled_Table for
+       suggesting categories of unlabeled participants.
+
+       Every labeled participant is a binary vector of character n-grams per
+       field (SUGGESTION_FIELD_WEIGHTS). An inverted index maps each n-gram
+       to the ids of the participants containing it (int32 arrays, appended
+       in place). A query counts shared n-grams of all candidates at once
+       (np.bincount over the posting lists of its n-grams), the score is the
+       weighted cosine similarity per field. Only participants sharing at
+       least one n-gram are touched.
+
+       Labels are added incrementally by add / refresh, existing entries are
+       never changed (relabeled participants keep their first label until
+       the index is rebuilt).
+    '''
+
+    # region [init]
+    n:int = 3
+    field_weights:Dict[str,float] = field(factory=lambda: dict(SUGGESTION_FIELD_WEIGHTS))
+
+    # post init
+    postings:Dict[str,Dict[str,array]] = field(init=False)
+    ngram_counts:Dict[str,array] = field(init=False)
+    category_ids:array = field(init=False)
+    last_row_number:int = field(init=False, default=0)
+    data_version:Union[str,None] = field(init=False, default=None)
+    lock:threading.Lock = field(init=False, factory=threading.Lock)
+
+    def __attrs_post_init__(self) -> None:
+        self.postings = {col:{} for col in self.field_weights}
+        self.ngram_counts = {col:array("i") for col in self.field_weights}
+        self.category_ids = array("i")
+    # endregion
+
+    # region [public]
+    def add(self, participant:Mapping[str,Any], category_id:int) -> int:
+        '''Adds a labeled participant to the index.
+
+        Parameters
+        ----------
+        participant : Mapping[str,Any]
+            Participant containing the columns of field_weights.
+        category_id : int
+            Assigned category_id.
+
+        Returns
+        -------
+        int
+            Id of the participant within the index.
+        '''
+        with self.lock:
+            return self.add_unlocked(participant=participant, category_id=category_id)
+
+    def add_many(self, df:pd.DataFrame) -> int:
+        '''Adds labeled participants (columns of field_weights & category_id).
+        '''
+        with self.lock:
+            return self.add_many_unlocked(df=df)
+
+    def refresh(self, engine:Any, data_version:Union[str,None]=None) -> int:
+        '''Adds participants labeled since the last refresh (row_number above
+           the latest loaded one). Skipped without a query if data_version
+           (of Participants_Labeled_Table) did not change.
+
+        Parameters
+        ----------
+        engine : Any
+            SQL Alchemy engine
+        data_version : Union[str,None], optional
+            Data version of Participants_Labeled_Table, by default None
+            (always query)
+
+        Returns
+        -------
+        int
+            Number of added participants.
+        '''
+        # whole refresh locked, parallel sessions must not add rows twice
+        with self.lock:
+            if data_version is not None and data_version == self.data_version:
+                return 0
+
+            participants = Participants_Labeled_Table.__table__
+            stmt = (select(participants.c.row_number,
+                           participants.c.category_id,
+                           *[participants.c[col] for col in self.field_weights])
+                    .where(participants.c.row_number > self.last_row_number)
+                    .order_by(participants.c.row_number))
+            with engine.connect() as connection:
+                df = pd.read_sql(stmt, connection)
+
+            added = self.add_many_unlocked(df=df)
+            if not df.empty:
+                self.last_row_number = int(df["row_number"].max())
+            self.data_version = data_version
+        return added
+
+    def suggest(self, participant:Mapping[str,Any], k:int=3) -> List[Tuple[int,float]]:
+        '''Top k categories of the most similar labeled participants.
+
+        Parameters
+        ----------
+        participant : Mapping[str,Any]
+            Unlabeled participant containing the columns of field_weights.
+        k : int, optional
+            Number of suggested categories, by default 3
+
+        Returns
+        -------
+        List[Tuple[int,float]]
+            (category_id, similarity between 0 and 1) ordered by similarity.
+        '''
+        scores = self.score(participant=participant)
+        if scores is None:
+            return []
+
+        # best participants first, one suggestion per category
+        candidates = min(len(scores), k * 20)
+        top = np.argpartition(-scores, candidates-1)[:candidates]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        suggestions = {}
+        for doc in top:
+            if scores[doc] <= 0 or len(suggestions) == k:
+                break
+            suggestions.setdefault(self.category_ids[doc], float(scores[doc]))
+        return list(suggestions.items())
+
+    def __len__(self) -> int:
+        return len(self.category_ids)
+    # endregion
+
+    # region [protected]
+    def add_many_unlocked(self, df:pd.DataFrame) -> int:
+        records = df[list(self.field_weights) + ["category_id"]].to_dict(orient="records")
+        for record in records:
+            self.add_unlocked(participant=record, category_id=record["category_id"])
+        return len(records)
+
+    def add_unlocked(self, participant:Mapping[str,Any], category_id:int) -> int:
+        doc = len(self.category_ids)
+        for col in self.field_weights:
+            ngrams = char_ngrams(participant[col], n=self.n)
+            postings = self.postings[col]
+            for ngram in ngrams:
+                posting = postings.get(ngram)
+                if posting is None:
+                    posting = postings[ngram] = array("i")
+                posting.append(doc)
+            self.ngram_counts[col].append(len(ngrams))
+        self.category_ids.append(int(category_id))
+        return doc
+
+    def score(self, participant:Mapping[str,Any]) -> Union[np.ndarray,None]:
+        '''Weighted cosine similarity of participant to all indexed
+           participants, None if the index is empty.
+        '''
+        with self.lock:
+            n_docs = len(self.category_ids)
+            if n_docs == 0:
+                return None
+
+            scores = np.zeros(n_docs)
+            for col, weight in self.field_weights.items():
+                ngrams = char_ngrams(participant[col], n=self.n)
+                # zero copy views, postings only grow at the end
+                hits = [np.frombuffer(self.postings[col][ngram], dtype=np.int32)
+                        for ngram in ngrams if ngram in self.postings[col]]
+                if len(hits) == 0:
+                    continue
+                shared = np.bincount(np.concatenate(hits), minlength=n_docs)[:n_docs]
+                counts = np.frombuffer(self.ngram_counts[col], dtype=np.int32)[:n_docs]
+                norm = np.sqrt(counts * len(ngrams))
+                # views must not outlive the lock: appending to an array with
+                # exported buffers raises BufferError
+                del hits, counts
+                scores += weight * np.divide(shared, norm, out=np.zeros(n_docs),
+                                             where=norm > 0)
+        return scores
+    # endregion
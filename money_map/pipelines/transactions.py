@@ -1,20 +1,108 @@
 import pandas as pd
-from typing import Any
+from typing import Any, Union
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import MetaData, Table, or_, select, delete, insert, inspect, exists, union_all
+from sqlalchemy.sql import ColumnElement, CompoundSelect, Select
 
-from money_map.models.orm_models import (Transactions_Table,
+from money_map.models.orm_models import (Base,
+                                         Transactions_Table,
                                          Transactions_Labeled_Table,
-                                         Participants_Labeled_Table)
+                                         Participants_Labeled_Table,
+                                         Rule_Matches_Table,
+                                         Monthly_Category_Totals_Table)
+from money_map.pipelines.watermarks import (get_watermark, get_watermark_markers,
+                                            set_watermark, has_changed, has_removed_rows,
+                                            changed_since, refresh_lock)
+from money_map.pipelines.rollups import refresh_monthly_category_totals
+from money_map.pipelines.data_versions import bump_data_version
+from money_map.pipelines.categorization_rules import rebuild_rule_matches
+from money_map.pipelines.labeling_queue import rebuild_queue
+from money_map.pipelines.participant_clusters import rebuild_participant_clusters
 
+# =============================================================================
+# Constants
+# =============================================================================
+
+# columns of Transactions_Labeled_Table taken from Participants_Labeled_Table
+LABEL_COLUMNS = ["category_id", "category_1", "category_2", "category_3"]
+
+# full rebuild modes, see recreate_transactions_labeled
+MATERIALIZATION_MODES = ["insert_select", "swap", "chunks"]
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def participants_join_condition() -> ColumnElement:
+    '''Join condition between Transactions_Table & Participants_Labeled_Table
+       (indexed equality on participant_key).
+    '''
+    return Transactions_Table.participant_key==Participants_Labeled_Table.participant_key
+
+
+def select_labeled_transactions(target_table:Table=Transactions_Labeled_Table.__table__) -> Select:
+    '''Select of labeled transactions with exactly the columns of target_table
+       (in the same order).
+    '''
+    columns = []
+    for col in target_table.columns:
+        source = Participants_Labeled_Table if col.name in LABEL_COLUMNS else Transactions_Table
+        columns.append(getattr(source, col.name))
+
+    return (select(*columns)
+            .join_from(Transactions_Table, Participants_Labeled_Table,
+                       participants_join_condition()))
+
+
+def select_rule_categorized_transactions(target_table:Table=Transactions_Labeled_Table.__table__
+                                         ) -> Select:
+    '''Select of transactions categorized by Rule_Matches_Table, only if
+       their participant is not labeled (labels win over rules). Same columns
+       as select_labeled_transactions.
+    '''
+    columns = []
+    for col in target_table.columns:
+        source = Rule_Matches_Table if col.name in LABEL_COLUMNS else Transactions_Table
+        columns.append(getattr(source, col.name))
+
+    return (select(*columns)
+            .join_from(Transactions_Table, Rule_Matches_Table,
+                       Transactions_Table.participant_key==Rule_Matches_Table.participant_key)
+            .where(~exists().where(participants_join_condition())))
+
+
+def select_categorized_transactions(target_table:Table=Transactions_Labeled_Table.__table__
+                                    ) -> CompoundSelect:
+    '''All transactions with a category: labeled ones and the ones
+       categorized by rules.
+    '''
+    return union_all(select_labeled_transactions(target_table=target_table),
+                     select_rule_categorized_transactions(target_table=target_table))
+
+# =============================================================================
+# Materialization
 # =============================================================================
 
 def recreate_transactions_labeled(engine:Any,
                    target_table_name:str=Transactions_Labeled_Table.__tablename__,
-                   chunksize:int=10000)->None:
-    '''Recreateing Transactions_Labeled_Table based on Transactions_Table &
-       Participants_Labeled_Table.
+                   chunksize:int=10000,
+                   mode:str="insert_select")->int:
+    '''Full rebuild of Transactions_Labeled_Table based on Transactions_Table &
+       Participants_Labeled_Table. Readers never see a partial table.
+       Participants without label are categorized by the rules
+       (Rule_Matches_Table is rebuilt beforehand, the labeling queue & its
+       clusters as well).
+       Monthly_Category_Totals_Table is rebuilt in the same transaction and
+       the watermark is reset.
+
+       Modes:
+       - "insert_select": emptied and refilled by one INSERT ... SELECT within
+         one transaction, rows never leave the database.
+       - "swap": INSERT ... SELECT into a shadow table, which atomically
+         replaces the table by RENAME TABLE (MySQL only, otherwise
+         "insert_select"). No large delete, readers are never blocked.
+       - "chunks": the join result is streamed through pandas in chunks and
+         appended within one transaction.
 
     Parameters
     ----------
@@ -23,32 +111,210 @@ def recreate_transactions_labeled(engine:Any,
     target_table_name : str, optional
        Result table name, by default Transactions_Labeled_Table.__tablename__
     chunksize : int, optional
-        chunksize, by default 10000
+        chunksize of mode "chunks", by default 10000
+    mode : str, optional
+        One of MATERIALIZATION_MODES, by default "insert_select"
+
+    Returns
+    -------
+    int
+        Number of rows in the rebuilt table.
     '''
+    if mode not in MATERIALIZATION_MODES:
+        raise Exception(f"Unknown Materialization Mode: {mode}")
+    if mode == "swap" and engine.dialect.name != "mysql":
+        mode = "insert_select"
+
+    target_table = Base.metadata.tables[target_table_name]
+
+    # tables created by former versions (to_sql replace) lack the primary key
+    if not inspect(engine).get_pk_constraint(target_table_name)["constrained_columns"]:
+        target_table.drop(engine, checkfirst=True)
+        target_table.create(engine)
+
+    # labels & rules may have changed outside of the labeling tab
+    with engine.begin() as connection:
+        rebuild_rule_matches(connection=connection)
+        rebuild_queue(connection=connection)
+        rebuild_participant_clusters(connection=connection)
+
+    query = select_categorized_transactions(target_table=target_table)
+    if mode == "swap":
+        rowcount = swap_materialize(engine=engine, target_table=target_table, query=query)
+    else:
+        with engine.begin() as connection:
+            markers = get_watermark_markers(connection=connection)
+            connection.execute(delete(target_table))
+            if mode == "insert_select":
+                rowcount = connection.execute(
+                    insert(target_table).from_select([col.name for col in target_table.columns],
+                                                     query)).rowcount
+            else:
+                rowcount = 0
+                for chunk in pd.read_sql(query, connection, chunksize=chunksize):
+                    chunk.to_sql(con=connection,
+                                 name=target_table_name,
+                                 if_exists="append",
+                                 chunksize=chunksize,
+                                 index=False)
+                    rowcount += chunk.shape[0]
+            refresh_monthly_category_totals(connection=connection)
+            set_watermark(connection=connection, target_table_name=target_table_name,
+                          markers=markers)
+            bump_data_version(connection, target_table_name,
+                              Monthly_Category_Totals_Table.__tablename__)
+
+    return rowcount
+
+
+def swap_materialize(engine:Any, target_table:Table,
+                     query:Union[Select,CompoundSelect]) -> int:
+    '''Fills a shadow copy of target_table by INSERT ... SELECT and swaps it
+       in with one atomic RENAME TABLE, the old table is dropped afterwards.
+       MySQL only.
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    target_table : Table
+        Table to rebuild.
+    query : Union[Select,CompoundSelect]
+        Select returning the columns of target_table.
+
+    Returns
+    -------
+    int
+        Number of rows in the rebuilt table.
+    '''
+    shadow_table = target_table.to_metadata(MetaData(), name=target_table.name + "_shadow")
+    old_table = target_table.to_metadata(MetaData(), name=target_table.name + "_old")
+    preparer = engine.dialect.identifier_preparer
+    target_name, shadow_name, old_name = [preparer.format_table(table) for table
+                                          in [target_table, shadow_table, old_table]]
+
+    # leftovers of an interrupted swap
+    shadow_table.drop(engine, checkfirst=True)
+    old_table.drop(engine, checkfirst=True)
+    shadow_table.create(engine)
+
+    try:
+        with engine.begin() as connection:
+            markers = get_watermark_markers(connection=connection)
+            rowcount = connection.execute(
+                insert(shadow_table).from_select([col.name for col in shadow_table.columns],
+                                                 query)).rowcount
+
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"RENAME TABLE {target_name} TO {old_name}, "
+                                       f"{shadow_name} TO {target_name}")
+            refresh_monthly_category_totals(connection=connection)
+            set_watermark(connection=connection, target_table_name=target_table.name,
+                          markers=markers)
+            bump_data_version(connection, target_table.name,
+                              Monthly_Category_Totals_Table.__tablename__)
+    finally:
+        shadow_table.drop(engine, checkfirst=True)
+
+    old_table.drop(engine, checkfirst=True)
+    return rowcount
+
+
+def refresh_transactions_labeled(engine:Any,
+                   target_table_name:str=Transactions_Labeled_Table.__tablename__,
+                   chunksize:int=10000)->int:
+    '''Incremental refresh of Transactions_Labeled_Table. Only transactions
+       ingested and labels added/changed since the last refresh (watermarks)
+       are re-materialized, existing rows of these transactions are replaced.
+       New transactions of participants without label are categorized by
+       the rules, changed rules require a full rebuild.
+       Monthly_Category_Totals_Table is updated for the affected months.
+       Labels written within the second of the watermark are found by the
+       data version of Participants_Labeled_Table. Deleted labels can not be
+       propagated incrementally: if labels were deleted (or the watermark is
+       missing) a full rebuild is executed. Executed after every ingestion &
+       label write, concurrent refreshes are serialized (see refresh_lock).
+
+    Parameters
+    ----------
+    engine : Any
+        SQL Alchemy engine
+    target_table_name : str, optional
+       Result table name, by default Transactions_Labeled_Table.__tablename__
+    chunksize : int, optional
+        chunksize of a full rebuild, by default 10000
+
+    Returns
+    -------
+    int
+        Number of upserted rows.
+    '''
+    with refresh_lock(engine=engine, target_table_name=target_table_name):
+        target_table = Base.metadata.tables[target_table_name]
+
+        watermark = get_watermark(engine=engine, target_table_name=target_table_name)
+
+        labels_removed = True
+        if watermark is not None:
+            with engine.connect() as connection:
+                labels_removed = has_removed_rows(connection=connection,
+                                                  column=Participants_Labeled_Table.labeled_at,
+                                                  watermark=watermark.labels_watermark,
+                                                  watermark_count=watermark.labels_watermark_count,
+                                                  row_count=watermark.labels_count)
+
+        if watermark is None or labels_removed:
+            return recreate_transactions_labeled(engine=engine,
+                                                 target_table_name=target_table_name,
+                                                 chunksize=chunksize)
+
+        with engine.begin() as connection:
+            markers = get_watermark_markers(connection=connection)
+
+            # nothing ingested or labeled since the last refresh
+            transactions_changed = has_changed(connection=connection,
+                                               column=Transactions_Table.ingested_at,
+                                               watermark=watermark.transactions_watermark,
+                                               watermark_count=watermark.transactions_watermark_count)
+            # the version also catches labels changed within the watermark second
+            labels_changed = (has_changed(connection=connection,
+                                          column=Participants_Labeled_Table.labeled_at,
+                                          watermark=watermark.labels_watermark,
+                                          watermark_count=watermark.labels_watermark_count)
+                              or watermark.labels_version != markers["labels_version"])
+            if not (transactions_changed or labels_changed):
+                return 0
+
+            conditions = []
+            if transactions_changed:
+                conditions.append(changed_since(column=Transactions_Table.ingested_at,
+                                                watermark=watermark.transactions_watermark))
+            if labels_changed:
+                conditions.append(changed_since(column=Participants_Labeled_Table.labeled_at,
+                                                watermark=watermark.labels_watermark))
+            affected = select_labeled_transactions(target_table=target_table).where(or_(*conditions))
+            if transactions_changed:
+                affected = union_all(affected,
+                                     select_rule_categorized_transactions(target_table=target_table)
+                                     .where(changed_since(column=Transactions_Table.ingested_at,
+                                                          watermark=watermark.transactions_watermark)))
+
+            # upsert: replace existing rows of affected transactions
+            affected_ids = select(affected.subquery().c.transaction_id)
+            connection.execute(delete(target_table)
+                               .where(target_table.c.transaction_id.in_(affected_ids)))
+            rowcount = connection.execute(
+                insert(target_table).from_select([col.name for col in target_table.columns],
+                                                 affected)).rowcount
+            refresh_monthly_category_totals(connection=connection,
+                                            affected_transactions=affected)
+
+            set_watermark(connection=connection, target_table_name=target_table_name,
+                          markers=markers)
+            if rowcount != 0:
+                bump_data_version(connection, target_table_name,
+                                  Monthly_Category_Totals_Table.__tablename__)
 
-    with Session(engine) as session:
-
-        query = session.query(Transactions_Table,
-                            Participants_Labeled_Table.category_id,
-                            Participants_Labeled_Table.category_1,
-                            Participants_Labeled_Table.category_2,
-                            Participants_Labeled_Table.category_3
-                            ).join(Participants_Labeled_Table,
-                                   and_(
-                        Transactions_Table.sender_bank_name==Participants_Labeled_Table.sender_bank_name,
-                        Transactions_Table.sender_iban==Participants_Labeled_Table.sender_iban,
-                        Transactions_Table.receiver_name==Participants_Labeled_Table.receiver_name,
-                        Transactions_Table.receiver_iban==Participants_Labeled_Table.receiver_iban,
-                        Transactions_Table.booking_text==Participants_Labeled_Table.booking_text,
-                        Transactions_Table.purpose_char==Participants_Labeled_Table.purpose_char))
-
-        for chunk in pd.read_sql(query.statement,session.bind,chunksize=chunksize):
-            chunk.to_sql(con=session.bind,
-                        name=target_table_name,
-                        if_exists="replace",
-                        chunksize=chunksize,
-                        index=False)
-
-    return
+    return rowcount
 
 # =============================================================================
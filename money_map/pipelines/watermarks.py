@@ -0,0 +1,161 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple, Union
+
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from money_map.models.orm_models import (Transactions_Table,
+                                         Participants_Labeled_Table,
+                                         Materialization_Watermarks_Table)
+from money_map.pipelines.data_versions import read_data_version
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# seconds a refresh waits for a concurrent refresh of the same table
+REFRESH_LOCK_TIMEOUT = 600
+
+# per table locks of databases without named locks (one process only)
+_LOCAL_LOCKS:Dict[str,threading.Lock] = {}
+_LOCAL_LOCKS_GUARD = threading.Lock()
+
+# =============================================================================
+# Locks
+# =============================================================================
+
+@contextmanager
+def refresh_lock(engine:Any, target_table_name:str,
+                 timeout:int=REFRESH_LOCK_TIMEOUT) -> Iterator[None]:
+    '''Serializes the refreshes of a materialized table: watermark, deletes
+       & inserts of two refreshes never interleave. MySQL: named lock
+       (GET_LOCK) held by a dedicated connection until all transactions of
+       the refresh are committed, also across processes. Other databases: a
+       lock of this process.
+    '''
+    if engine.dialect.name != "mysql":
+        with _LOCAL_LOCKS_GUARD:
+            lock = _LOCAL_LOCKS.setdefault(target_table_name, threading.Lock())
+        if not lock.acquire(timeout=timeout):
+            raise Exception(f"Refresh of {target_table_name} locked for more than {timeout}s")
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    lock_name = f"money_map.refresh.{target_table_name}"
+    with engine.connect() as connection:
+        acquired = connection.execute(select(func.get_lock(lock_name, timeout))).scalar()
+        if acquired != 1:
+            raise Exception(f"Refresh of {target_table_name} locked for more than {timeout}s")
+        try:
+            yield
+        finally:
+            connection.execute(select(func.release_lock(lock_name)))
+
+# =============================================================================
+# Watermarks
+# =============================================================================
+
+def get_watermark(engine:Any, target_table_name:str
+                  ) -> Union[Materialization_Watermarks_Table,None]:
+    '''Stored watermark of a materialized table, None if never materialized.
+    '''
+    with Session(engine) as session:
+        watermark = session.get(Materialization_Watermarks_Table, target_table_name)
+        if watermark is not None:
+            session.expunge(watermark)
+    return watermark
+
+
+def get_change_marker(connection:Connection, column:Any,
+                      since:Any=None) -> Tuple[Any,int]:
+    '''Latest value of a timestamp column and the number of rows at or after
+       since (default: at the latest value). Uses the index of column only.
+    '''
+    latest = connection.execute(select(func.max(column))).scalar()
+    since = latest if since is None else since
+    if since is None:
+        return latest, 0
+    count = connection.execute(select(func.count()).where(column >= since)).scalar()
+    return latest, count
+
+
+def has_changed(connection:Connection, column:Any,
+                watermark:Any, watermark_count:int) -> bool:
+    '''Checks if rows were added/changed after a watermark was set. Rows
+       sharing the timestamp of the watermark are detected by their count.
+    '''
+    latest, count = get_change_marker(connection=connection, column=column,
+                                      since=watermark)
+    if latest is None:
+        return False
+    if watermark is None:
+        return True
+    return latest != watermark or count != watermark_count
+
+
+def has_removed_rows(connection:Connection, column:Any,
+                     watermark:Any, watermark_count:int,
+                     row_count:Union[int,None]) -> bool:
+    '''Checks if rows were deleted (or moved to a newer timestamp) after a
+       watermark was set: the table grew by another number of rows than
+       there are at or after the watermark. Always True without a stored
+       row_count.
+    '''
+    if row_count is None:
+        return True
+    total = connection.execute(select(func.count()).select_from(column.table)).scalar()
+    added = connection.execute(select(func.count())
+                               .where(changed_since(column=column, watermark=watermark))).scalar()
+    if watermark is not None:
+        added -= watermark_count
+    return total != row_count + added
+
+
+def changed_since(column:Any, watermark:Any) -> ColumnElement:
+    '''Filter on rows at or after watermark, rows without timestamp (added
+       before the column existed) are covered by a NULL watermark only.
+    '''
+    if watermark is None:
+        return column.is_not(None)
+    return column >= watermark
+
+
+def get_watermark_markers(connection:Connection) -> Dict[str,Any]:
+    '''Current change markers of Transactions_Table &
+       Participants_Labeled_Table (see get_change_marker), the number of
+       labels and their data version.
+    '''
+    transactions_wm, transactions_count = get_change_marker(
+        connection=connection, column=Transactions_Table.ingested_at)
+    labels_wm, labels_count = get_change_marker(
+        connection=connection, column=Participants_Labeled_Table.labeled_at)
+    labels_total = connection.execute(select(func.count())
+                                      .select_from(Participants_Labeled_Table)).scalar()
+    return {"transactions_watermark":transactions_wm,
+            "transactions_watermark_count":transactions_count,
+            "labels_watermark":labels_wm,
+            "labels_watermark_count":labels_count,
+            "labels_count":labels_total,
+            "labels_version":read_data_version(connection,
+                                               Participants_Labeled_Table.__tablename__)}
+
+
+def set_watermark(connection:Connection, target_table_name:str,
+                  markers:Dict[str,Any]) -> None:
+    '''Stores change markers (taken before materializing) as processed for
+       target_table_name. Rows changed meanwhile are at or after the markers
+       and are picked up by the next refresh.
+    '''
+    watermarks = Materialization_Watermarks_Table.__table__
+    connection.execute(delete(watermarks)
+                       .where(watermarks.c.target_table==target_table_name))
+    connection.execute(insert(watermarks)
+                       .values(target_table=target_table_name, **markers))
+    return
+
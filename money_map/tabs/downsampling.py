@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# series with more points are downsampled before plotting
+DEFAULT_MAX_POINTS:int = 1500
+
+# =============================================================================
+# Largest Triangle Three Buckets (LTTB)
+# =============================================================================
+
+def get_bucket_edges(n_points:int, n_out:int) -> np.ndarray:
+    '''Edges of the n_out-2 LTTB buckets between the first and the last point.
+    '''
+    return np.linspace(1, n_points-1, n_out-1).astype(int)
+
+
+def lttb_indices(x:np.ndarray, y:np.ndarray, n_out:int) -> np.ndarray:
+    '''Indices of the points selected by Largest Triangle Three Buckets: the
+       first & last point and per bucket the point forming the largest
+       triangle with the previously selected point and the mean of the next
+       bucket, which preserves the visual shape of the series.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Ascending x values (numeric).
+    y : np.ndarray
+        y values.
+    n_out : int
+        Number of points to select.
+
+    Returns
+    -------
+    np.ndarray
+        Ascending indices of selected points.
+    '''
+    n_points = len(x)
+    if n_out >= n_points or n_out < 3:
+        return np.arange(n_points)
+
+    edges = get_bucket_edges(n_points=n_points, n_out=n_out)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n_points-1
+
+    selected = 0
+    for bucket in range(n_out-2):
+        start, end = edges[bucket], edges[bucket+1]
+        next_start = edges[bucket+1]
+        next_end = edges[bucket+2] if bucket+2 < len(edges) else n_points
+        mean_x = x[next_start:next_end].mean()
+        mean_y = y[next_start:next_end].mean()
+
+        # (doubled) triangle areas of all candidates of the bucket
+        areas = np.abs((x[selected]-mean_x) * (y[start:end]-y[selected])
+                       - (x[selected]-x[start:end]) * (mean_y-y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket+1] = selected
+    return indices
+
+
+def bucket_extreme_indices(values:np.ndarray, n_out:int, func:str="min") -> np.ndarray:
+    '''Index of the minimum (func="min") or maximum (func="max") of every LTTB
+       bucket, so extremes are never dropped by downsampling.
+    '''
+    edges = np.concatenate([[0], get_bucket_edges(n_points=len(values), n_out=n_out),
+                            [len(values)]])
+    arg_func = np.argmin if func == "min" else np.argmax
+    return np.array([start + arg_func(values[start:end])
+                     for start, end in zip(edges[:-1], edges[1:]) if end > start],
+                    dtype=np.int64)
+
+# =============================================================================
+# Daily Balance
+# =============================================================================
+
+def downsample_daily_balance(daily_df:pd.DataFrame,
+                             max_points:int=DEFAULT_MAX_POINTS) -> pd.DataFrame:
+    '''Reduces a daily balance series to about max_points rows: LTTB points
+       of the mean balance plus the minimum of min_balance_after_booking and
+       the maximum of max_balance_after_booking of every bucket. Series with
+       up to max_points rows are returned unchanged (full resolution).
+
+    Parameters
+    ----------
+    daily_df : pd.DataFrame
+        Daily balance of one account ordered by booking_date, see
+        define_daily_balance.
+    max_points : int, optional
+        Maximal number of rows, by default DEFAULT_MAX_POINTS
+
+    Returns
+    -------
+    pd.DataFrame
+        Downsampled daily balance ordered by booking_date.
+    '''
+    if daily_df.shape[0] <= max_points:
+        return daily_df
+
+    # every bucket contributes up to three points
+    n_out = max(max_points // 3, 3)
+    x = pd.to_datetime(daily_df["booking_date"]).to_numpy().astype(np.int64).astype(float)
+    indices = np.concatenate([
+        lttb_indices(x=x, y=daily_df["mean_balance_after_booking"].to_numpy(), n_out=n_out),
+        bucket_extreme_indices(values=daily_df["min_balance_after_booking"].to_numpy(),
+                               n_out=n_out, func="min"),
+        bucket_extreme_indices(values=daily_df["max_balance_after_booking"].to_numpy(),
+                               n_out=n_out, func="max")])
+
+    return daily_df.iloc[np.unique(indices)].reset_index(drop=True)
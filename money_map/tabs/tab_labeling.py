@@ -1,10 +1,31 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Union
 
 import streamlit as st
 import pandas as pd
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from money_map.models.orm_models import Participants_Labeled_Table
+from money_map.ingestion.normalization import participant_key, PARTICIPANT_KEY_COLUMNS
+from money_map.pipelines.data_versions import bump_data_version
+from money_map.pipelines.labeling_queue import (QUEUE_COLUMNS, dequeue_participants,
+                                                query_next_participants)
+from money_map.pipelines.transactions import refresh_transactions_labeled
+from money_map.pipelines.suggestion_index import Suggestion_Index
+from money_map.pipelines.categorization_rules import (RULE_FIELDS, RULE_MATCH_TYPES,
+                                                      add_categorization_rule)
+from money_map.pipelines.participant_clusters import (query_cluster_members,
+                                                      query_queue_cluster_count)
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# separates the category levels in the labels of the bulk labeling grid
+CATEGORY_LABEL_SEPARATOR:str = " / "
+
+# suggestions below this similarity are not preselected
+MIN_SUGGESTION_SCORE:float = 0.5
 
 # ==============================================================================
 # Labeling Tab: Add Data
@@ -17,7 +38,8 @@ def add_labeled_transactions(_engine: Any,
                             category_2:str,
                             category_3:str
                             ) -> None:
-    '''Adding labeled transactions to Participants_Labeled_Table
+    '''Adding labeled transactions to Participants_Labeled_Table, afterwards
+       Transactions_Labeled_Table & the monthly totals are refreshed.
 
     Parameters
     ----------
@@ -34,7 +56,7 @@ def add_labeled_transactions(_engine: Any,
     category_3 : str
         Selected category_3 by user.
     '''
-    # add new entry
+    # add new entry & remove it from the labeling queue
     with Session(_engine) as session:
         new_entry = Participants_Labeled_Table(
                     sender_bank_name=current_unlabeled_transactions["sender_bank_name"],
@@ -43,23 +65,264 @@ def add_labeled_transactions(_engine: Any,
                     receiver_iban=current_unlabeled_transactions["receiver_iban"],
                     booking_text=current_unlabeled_transactions["booking_text"],
                     purpose_char=current_unlabeled_transactions["purpose_char"],
+                    participant_key=participant_key(current_unlabeled_transactions),
                     category_id=category_id,
                     category_1=category_1,
                     category_2=category_2,
                     category_3=category_3)
         session.add(new_entry)
+        bump_data_version(session.connection(), Participants_Labeled_Table.__tablename__)
+        dequeue_participants(connection=session.connection(),
+                             participant_keys=[new_entry.participant_key])
         session.commit()
+    refresh_transactions_labeled(engine=_engine)
     return
 
 
+def add_labeled_transactions_bulk(_engine:Any, labeled_df:pd.DataFrame) -> int:
+    '''Adding many labeled transactions to Participants_Labeled_Table with one
+       multi-row insert and removing them from the labeling queue, all within
+       a single transaction. Afterwards Transactions_Labeled_Table & the
+       monthly totals are refreshed.
+
+    Parameters
+    ----------
+    _engine : Any
+        SQLAlchemy Engine.
+    labeled_df : pd.DataFrame
+        Participants (PARTICIPANT_KEY_COLUMNS & participant_key) with assigned
+        category_id, category_1, category_2 & category_3.
+
+    Returns
+    -------
+    int
+        Number of labeled transactions added.
+    '''
+    if labeled_df.empty:
+        return 0
+
+    columns = PARTICIPANT_KEY_COLUMNS + ["participant_key", "category_id",
+                                         "category_1", "category_2", "category_3"]
+    records = labeled_df[columns].to_dict(orient="records")
+    for record in records:
+        record["category_id"] = int(record["category_id"])
+
+    with _engine.begin() as connection:
+        connection.execute(insert(Participants_Labeled_Table), records)
+        bump_data_version(connection, Participants_Labeled_Table.__tablename__)
+        dequeue_participants(connection=connection,
+                             participant_keys=labeled_df["participant_key"].tolist())
+    refresh_transactions_labeled(engine=_engine)
+    return len(records)
+
+# =============================================================================
+# Labeling Tab: Groups
+# =============================================================================
+
+@st.cache_data
+def get_cluster_members(_engine:Any, data_version:str, participant_key:str) -> pd.DataFrame:
+    return query_cluster_members(engine=_engine, participant_key=participant_key)
+
+
+@st.cache_data
+def get_number_unlabeled_groups(_engine:Any, data_version:str) -> int:
+    return query_queue_cluster_count(engine=_engine)
+
+# =============================================================================
+# Labeling Tab: Suggestions
+# =============================================================================
+
+def get_suggestions(suggestion_index:Union[Suggestion_Index,None],
+                    participant:Dict[str,str],
+                    k:int=3) -> List[Tuple[int,float]]:
+    '''Suggested (category_id, similarity) of participant, empty without index.
+    '''
+    if suggestion_index is None:
+        return []
+    return suggestion_index.suggest(participant=participant, k=k)
+
+
+@st.cache_data
+def get_page_suggestions(_suggestion_index:Union[Suggestion_Index,None],
+                         index_version:Union[str,None],
+                         page:pd.DataFrame,
+                         min_score:float=MIN_SUGGESTION_SCORE) -> List[Union[int,None]]:
+    '''Best suggested category_id per row of page, None below min_score.
+       Cached per page & data version of the index.
+    '''
+    category_ids = []
+    for participant in page.to_dict(orient="records"):
+        suggestions = get_suggestions(_suggestion_index, participant, k=1)
+        confident = len(suggestions) > 0 and suggestions[0][1] >= min_score
+        category_ids.append(suggestions[0][0] if confident else None)
+    return category_ids
+
+
+def get_option_index(options:List[Any], value:Any) -> int:
+    '''Position of value within the options of a selectbox, 0 if missing.
+    '''
+    return options.index(value) if value in options else 0
+
+# =============================================================================
+# Labeling Tab: Bulk Labeling
+# =============================================================================
+
+def define_category_labels(categories_df:pd.DataFrame) -> pd.DataFrame:
+    '''Adds column category_label ("category_1 / category_2 / category_3")
+       used as options of the bulk labeling grid. Labels shared by several
+       categories get their category_id appended, so every label maps back
+       to exactly one category_id.
+    '''
+    categories_df = categories_df.copy()
+    categories_df["category_label"] = (categories_df["category_1"] + CATEGORY_LABEL_SEPARATOR +
+                                       categories_df["category_2"] + CATEGORY_LABEL_SEPARATOR +
+                                       categories_df["category_3"])
+    collisions = categories_df["category_label"].duplicated(keep=False)
+    categories_df.loc[collisions, "category_label"] += (
+        " (#" + categories_df.loc[collisions, "category_id"].astype(str) + ")")
+    return categories_df
+
+
+@st.cache_data
+def get_unlabeled_page(_engine:Any, data_version:str,
+                       receiver_name:Union[str,None], page_size:int) -> pd.DataFrame:
+    return query_next_participants(engine=_engine, limit=page_size,
+                                   receiver_name=receiver_name)
+
+
+def compute_bulk_labeling(engine:Any,
+                          categories_df:pd.DataFrame,
+                          data_version:str,
+                          suggestion_index:Union[Suggestion_Index,None]=None,
+                          page_size:int=100) -> None:
+    '''Editable grid of the next page_size unlabeled transactions, optionally
+       filtered by receiver. Categories are assigned per row (or to all rows
+       at once) and saved together in one transaction. Rows are prefilled
+       with confident suggestions of suggestion_index.
+
+    Parameters
+    ----------
+    engine : Any
+        SQLAlchemy Engine.
+    categories_df : pd.DataFrame
+        Possible categories for labeling the data.
+    data_version : str
+        Data version of the labeling queue (cache key).
+    suggestion_index : Union[Suggestion_Index,None], optional
+        Index of labeled participants, by default None (no suggestions)
+    page_size : int, optional
+        Number of transactions per page, by default 100
+    '''
+    categories_df = define_category_labels(categories_df=categories_df)
+    category_labels = categories_df["category_label"].tolist()
+
+    col1, col2 = st.columns(2)
+    receiver_name = col1.text_input("Filter Receiver", placeholder="e.g. supermarket")
+    default_label = col2.selectbox("Assign to all rows", [None] + category_labels,
+                                   format_func=lambda label: "-" if label is None else label)
+
+    page = get_unlabeled_page(_engine=engine, data_version=data_version,
+                              receiver_name=receiver_name or None, page_size=page_size)
+    if page.empty:
+        st.info("No unlabeled transactions found.")
+        return
+
+    page = page.copy()
+    page.insert(0, "category_label", default_label)
+    if default_label is None:
+        labels = categories_df.set_index("category_id")["category_label"]
+        index_version = None if suggestion_index is None else suggestion_index.data_version
+        suggested = get_page_suggestions(_suggestion_index=suggestion_index,
+                                         index_version=index_version,
+                                         page=page[QUEUE_COLUMNS])
+        page["category_label"] = [labels.get(category_id) for category_id in suggested]
+
+    # editor state is bound to the shown page
+    edited = st.data_editor(
+        page,
+        key=f"bulk_labeling_{data_version}_{receiver_name}_{default_label}",
+        column_config={"category_label":st.column_config.SelectboxColumn(
+                           "Category", options=category_labels, width="large"),
+                       "participant_key":None},
+        disabled=PARTICIPANT_KEY_COLUMNS,
+        hide_index=True,
+        use_container_width=True)
+
+    # map back by category_id, one row per participant
+    category_ids = dict(zip(categories_df["category_label"], categories_df["category_id"]))
+    labeled_df = edited.dropna(subset=["category_label"])
+    labeled_df = labeled_df.assign(category_id=labeled_df["category_label"].map(category_ids))
+    labeled_df = labeled_df.merge(
+        categories_df[["category_id", "category_1", "category_2", "category_3"]],
+        on="category_id", how="inner")
+
+    if st.button(f"Save {labeled_df.shape[0]} Labels", disabled=labeled_df.empty):
+        add_labeled_transactions_bulk(_engine=engine, labeled_df=labeled_df)
+        st.rerun()
+    return
+
+
+# =============================================================================
+# Labeling Tab: Rules
+# =============================================================================
+
+def compute_rule_form(engine:Any, categories_df:pd.DataFrame) -> None:
+    '''Form adding a categorization rule. Participants matched by the rule
+       are categorized & leave the labeling queue by the full rebuild of
+       Transactions_Labeled_Table executed right after.
+
+    Parameters
+    ----------
+    engine : Any
+        SQLAlchemy Engine.
+    categories_df : pd.DataFrame
+        Possible categories of the rule.
+    '''
+    categories_df = define_category_labels(categories_df=categories_df)
+    category_labels = categories_df["category_label"].tolist()
+
+    with st.form("categorization_rule", clear_on_submit=True):
+        col1, col2, col3 = st.columns(3)
+        rule_field = col1.selectbox("Field", RULE_FIELDS,
+                                    index=RULE_FIELDS.index("receiver_name"))
+        match_type = col2.selectbox("Match Type", RULE_MATCH_TYPES, index=2)
+        priority = col3.number_input("Priority", min_value=0, value=100, step=1,
+                                     help="Lower values win if several rules match.")
+        pattern = st.text_input("Pattern", placeholder="e.g. rewe")
+        category_label = st.selectbox("Category", category_labels)
+        submitted = st.form_submit_button("Add Rule")
+
+    if not submitted or category_label is None:
+        return
+
+    category = categories_df.loc[categories_df["category_label"]==category_label].iloc[0]
+    try:
+        add_categorization_rule(engine=engine,
+                                field=rule_field,
+                                match_type=match_type,
+                                pattern=pattern,
+                                category_id=int(category["category_id"]),
+                                category_1=category["category_1"],
+                                category_2=category["category_2"],
+                                category_3=category["category_3"],
+                                priority=int(priority))
+    except Exception as exception:
+        st.error(f"Rule not added: {exception}")
+        return
+    refresh_transactions_labeled(engine=engine)
+    st.rerun()
+
 # =============================================================================
 # Labeling Tab: Main
 # =============================================================================
 
 def compute_tab_labeling(unlabeled_transactions:pd.DataFrame,
+                         number_unlabeled_transactions:int,
                          categories_df:pd.DataFrame,
                          number_labeled_transactions:int,
                          engine:Any,
+                         data_version:str = "",
+                         suggestion_index:Union[Suggestion_Index,None] = None,
                          tab_title:str = "Assign Categories to Unique Transactions: "
                          ) -> None:
     '''Executing Tab Labeling
@@ -67,13 +330,19 @@ def compute_tab_labeling(unlabeled_transactions:pd.DataFrame,
     Parameters
     ----------
     unlabeled_transactions : pd.DataFrame
-        Currently unlabeled transactions requested from given database.
+        Next unlabeled transactions (head of the labeling queue).
+    number_unlabeled_transactions : int
+        Number of unlabeled transactions (length of the labeling queue).
     categories_df : pd.DataFrame
         Possible categories for labeling the data.
     number_labeled_transactions : int
         Number of already labeled transactions.
     engine : Any
         SQLAlchemy Engine.
+    data_version : str, optional
+        Data version of the labeling queue & clusters (cache key of bulk & group labeling), by default ""
+    suggestion_index : Union[Suggestion_Index,None], optional
+        Index of labeled participants preselecting categories, by default None
     tab_title : _type_, optional
         Title of tab, by default "Assign Categories to Unique Transactions: "
     '''
@@ -81,9 +350,27 @@ def compute_tab_labeling(unlabeled_transactions:pd.DataFrame,
     st.header(tab_title)
 
     # add metrics
-    col1, col2 = st.columns(2)
-    col1.metric("Remaining Transactions", unlabeled_transactions.shape[0])
-    col2.metric("Labeled Transactions", number_labeled_transactions)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Remaining Transactions", number_unlabeled_transactions)
+    col2.metric("Remaining Groups", get_number_unlabeled_groups(_engine=engine,
+                                                                data_version=data_version),
+                help="Near-duplicate transactions (same receiver IBAN & booking text, "
+                     "similar purpose) form a group which is labeled at once.")
+    col3.metric("Labeled Transactions", number_labeled_transactions)
+
+    # bulk labeling: many transactions per save
+    mode = st.radio("Mode", ["Single", "Bulk", "Rules"], horizontal=True)
+    if mode == "Rules":
+        st.write("------")
+        compute_rule_form(engine=engine, categories_df=categories_df)
+        return
+    if mode == "Bulk":
+        st.write("------")
+        compute_bulk_labeling(engine=engine,
+                              categories_df=categories_df,
+                              data_version=data_version,
+                              suggestion_index=suggestion_index)
+        return
 
     # case we have unlabeled data
     if unlabeled_transactions.shape[0] > 0:
@@ -91,20 +378,49 @@ def compute_tab_labeling(unlabeled_transactions:pd.DataFrame,
         st.write("------")
         st.subheader("Please assign Categories to: ")
         current_unlabeled_transactions = unlabeled_transactions.iloc[0,:].to_dict()
-        st.dataframe(unlabeled_transactions.iloc[0,:],use_container_width=True)
+        st.dataframe(unlabeled_transactions.drop(columns=["participant_key"]).iloc[0,:],
+                     use_container_width=True)
+
+        # near-duplicates of the current transaction
+        group_df = get_cluster_members(_engine=engine, data_version=data_version,
+                                       participant_key=current_unlabeled_transactions["participant_key"])
+        label_group = False
+        if group_df.shape[0] > 1:
+            label_group = st.checkbox(f"Label all {group_df.shape[0]} similar transactions",
+                                      value=False)
+            with st.expander("Similar transactions"):
+                st.dataframe(group_df.drop(columns=["participant_key", "queued_at"]),
+                             hide_index=True, use_container_width=True)
 
+        # preselect the best suggestion of similar labeled transactions
+        suggestions = get_suggestions(suggestion_index, current_unlabeled_transactions)
+        suggested = {"category_1":None, "category_2":None, "category_3":None}
+        if len(suggestions) > 0 and suggestions[0][1] >= MIN_SUGGESTION_SCORE:
+            suggested_df = categories_df.loc[categories_df["category_id"]==suggestions[0][0]]
+            if suggested_df.shape[0] == 1:
+                suggested = suggested_df.iloc[0].to_dict()
+        if len(suggestions) > 0:
+            labels = define_category_labels(categories_df).set_index("category_id")["category_label"]
+            st.caption("Suggestions: " + ", ".join(f"{labels.get(category_id)} ({score:.0%})"
+                                                    for category_id, score in suggestions))
 
         # select category 1
-        selected_category_1 = st.selectbox("Category 1", categories_df["category_1"].unique().tolist()
+        options_1 = categories_df["category_1"].unique().tolist()
+        selected_category_1 = st.selectbox("Category 1", options_1
+                                           ,index=get_option_index(options_1, suggested["category_1"])
                                            ,placeholder="Choose an option")
         # select category 2
         temp_cat2_df = categories_df.loc[categories_df["category_1"]==selected_category_1]
-        selected_category_2= st.selectbox("Category 2", temp_cat2_df["category_2"].unique().tolist()
+        options_2 = temp_cat2_df["category_2"].unique().tolist()
+        selected_category_2= st.selectbox("Category 2", options_2
+                                          ,index=get_option_index(options_2, suggested["category_2"])
                                           ,placeholder="Choose an option")
 
         # select category 3
         temp_cat3_df = temp_cat2_df.loc[temp_cat2_df["category_2"]==selected_category_2]
-        selected_category_3 = st.selectbox("Category 3", temp_cat3_df["category_3"].unique().tolist()
+        options_3 = temp_cat3_df["category_3"].unique().tolist()
+        selected_category_3 = st.selectbox("Category 3", options_3
+                                           ,index=get_option_index(options_3, suggested["category_3"])
                                            ,placeholder="Choose an option")
 
         # get selected category id
@@ -116,10 +432,18 @@ def compute_tab_labeling(unlabeled_transactions:pd.DataFrame,
 
 
             if st.button("Submit"):
-                add_labeled_transactions(_engine=engine,
-                                        current_unlabeled_transactions=current_unlabeled_transactions,
-                                        category_id=selected_category_id,
-                                        category_1=selected_category_1,
-                                        category_2=selected_category_2,
-                                        category_3=selected_category_3)
+                if label_group:
+                    add_labeled_transactions_bulk(_engine=engine,
+                                                  labeled_df=group_df.assign(
+                                                      category_id=selected_category_id,
+                                                      category_1=selected_category_1,
+                                                      category_2=selected_category_2,
+                                                      category_3=selected_category_3))
+                else:
+                    add_labeled_transactions(_engine=engine,
+                                            current_unlabeled_transactions=current_unlabeled_transactions,
+                                            category_id=selected_category_id,
+                                            category_1=selected_category_1,
+                                            category_2=selected_category_2,
+                                            category_3=selected_category_3)
                 st.rerun()
@@ -1,50 +1,44 @@
-from typing import Tuple,List
+import datetime
+from typing import Any,Dict,Tuple,List,Union
 
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import streamlit as st
 
+from money_map.pipelines.statistics_queries import (CATEGORY_LEVELS,
+                                                    query_accounts,
+                                                    query_date_bounds,
+                                                    query_categories,
+                                                    query_monthly_totals,
+                                                    query_daily_balance)
+from money_map.tabs.downsampling import DEFAULT_MAX_POINTS, downsample_daily_balance
 
 # =============================================================================
 # Tattistic Tab: Process Transactions Labeled DataFrame
 # =============================================================================
 
-def define_daily_balance(labeled_transactions:pd.DataFrame
+def define_daily_balance(daily_balance:pd.DataFrame
                         ) -> pd.DataFrame:
 
-    daily_balance_df = (labeled_transactions.groupby(["booking_date"])
-                    .agg(min_balance_after_booking=("balance_after_booking","min"),
-                        mean_balance_after_booking=("balance_after_booking","mean"),
-                        max_balance_after_booking=("balance_after_booking","max"))
-                    .reset_index())
+    # rollup rows are already aggregated per day and gap-filled
+    daily_balance_df = (daily_balance.sort_values("booking_date")
+                    [["booking_date","min_balance_after_booking",
+                      "mean_balance_after_booking","max_balance_after_booking"]]
+                    .reset_index(drop=True))
 
     return daily_balance_df
 
 
-def define_monthly_transactions(labeled_transactions:pd.DataFrame,
-                                ignore_categories_3:List[str] = ["Transfer"]
+def define_monthly_transactions(monthly_totals:pd.DataFrame,
+                                category_level:str = "category_3"
                                  ) -> Tuple[pd.DataFrame, pd.DataFrame]:
 
-    # filter out certain categories 3rd level
-    monthly_df = labeled_transactions.loc[~labeled_transactions["category_3"].isin(ignore_categories_3)]
-
-    # define day, month, year based on booking_date
-    monthly_df = monthly_df.sort_values(by="booking_date")
-    monthly_df["booking_date"] = pd.to_datetime(monthly_df["booking_date"],format="%Y-%m-%d")
-    monthly_df["value_date"] = pd.to_datetime(monthly_df["value_date"],format="%Y-%m-%d")
-    monthly_df["day"] = monthly_df["booking_date"].dt.day
-    monthly_df["month"] = monthly_df["booking_date"].dt.month
-    monthly_df["year"] = monthly_df["booking_date"].dt.year
-
-    # group by month and category id
-    monthly_df = (monthly_df.groupby(["year","month","category_id"])
-                            .agg({"amount":"sum",
-                                  "balance_after_booking":"mean",
-                                  "category_1":"first",
-                                  "category_2":"first",
-                                  "category_3":"first"})
-                            .reset_index())
+    # rows are already grouped by month and category (see query_monthly_totals)
+    monthly_df = (monthly_totals.sort_values(["year","month",category_level])
+                            .rename(columns={"mean_balance_after_booking":"balance_after_booking"})
+                            [["year","month",category_level,"amount","balance_after_booking"]]
+                            .reset_index(drop=True))
 
     # define year-month column for plots
     monthly_df["year-month"] = monthly_df["year"].astype(str) + "-" + monthly_df["month"].astype(str)
@@ -53,6 +47,85 @@ def define_monthly_transactions(labeled_transactions:pd.DataFrame,
 
     return monthly_df, monthly_df_total
 
+
+def define_daily_balance_by_account(daily_balance:pd.DataFrame,
+                                    sender_ibans:List[str]
+                                    ) -> Dict[str,pd.DataFrame]:
+    '''define_daily_balance for several accounts in one pass: one filter and
+       sort over all rows, split into accounts by a single groupby.
+    '''
+    daily_balance_df = (daily_balance.loc[daily_balance["sender_iban"].isin(sender_ibans)]
+                        .sort_values(["sender_iban","booking_date"]))
+    columns = ["booking_date","min_balance_after_booking",
+               "mean_balance_after_booking","max_balance_after_booking"]
+
+    results = {sender_iban:daily_balance_df.iloc[0:0][columns].reset_index(drop=True)
+               for sender_iban in sender_ibans}
+    for sender_iban, group in daily_balance_df.groupby("sender_iban", sort=False):
+        results[sender_iban] = group[columns].reset_index(drop=True)
+    return results
+
+
+def define_monthly_transactions_by_account(monthly_totals:pd.DataFrame,
+                                           sender_ibans:List[str],
+                                           category_level:str = "category_3"
+                                           ) -> Dict[str,Tuple[pd.DataFrame,pd.DataFrame]]:
+    '''define_monthly_transactions for several accounts in one pass: filter,
+       sort, year-month labels and monthly totals are computed once over all
+       accounts, then split into accounts by a single groupby.
+    '''
+    monthly_df = monthly_totals.loc[monthly_totals["sender_iban"].isin(sender_ibans)]
+    monthly_df = (monthly_df.sort_values(["sender_iban","year","month",category_level])
+                            .rename(columns={"mean_balance_after_booking":"balance_after_booking"}))
+    monthly_df["year-month"] = monthly_df["year"].astype(str) + "-" + monthly_df["month"].astype(str)
+
+    columns = ["year","month",category_level,"amount","balance_after_booking","year-month"]
+    monthly_df_totals = (monthly_df.groupby(["sender_iban","year-month"])[["amount"]].sum()
+                                   .astype({"amount":int}))
+
+    results = {}
+    for sender_iban in sender_ibans:
+        results[sender_iban] = (monthly_df.iloc[0:0][columns].reset_index(drop=True),
+                                monthly_df_totals.iloc[0:0].droplevel("sender_iban"))
+    for sender_iban, group in monthly_df.groupby("sender_iban", sort=False):
+        results[sender_iban] = (group[columns].reset_index(drop=True),
+                                monthly_df_totals.xs(sender_iban, level="sender_iban"))
+    return results
+
+# =============================================================================
+# Statistic Tab: Cached Queries
+# =============================================================================
+
+@st.cache_data
+def get_accounts(_engine:Any, data_version:str) -> List[str]:
+    return query_accounts(engine=_engine)
+
+@st.cache_data
+def get_date_bounds(_engine:Any, data_version:str, sender_ibans:Tuple[str,...]
+                    ) -> Tuple[Any,Any]:
+    return query_date_bounds(engine=_engine, sender_ibans=list(sender_ibans))
+
+@st.cache_data
+def get_categories(_engine:Any, data_version:str, sender_ibans:Tuple[str,...],
+                   category_level:str) -> List[str]:
+    return query_categories(engine=_engine, sender_ibans=list(sender_ibans),
+                            category_level=category_level)
+
+@st.cache_data
+def get_monthly_totals(_engine:Any, data_version:str, sender_ibans:Tuple[str,...],
+                       start_date:datetime.date, end_date:datetime.date,
+                       category_level:str, categories:Tuple[str,...]) -> pd.DataFrame:
+    return query_monthly_totals(engine=_engine, sender_ibans=list(sender_ibans),
+                                start_date=start_date, end_date=end_date,
+                                category_level=category_level,
+                                categories=list(categories))
+
+@st.cache_data
+def get_daily_balance(_engine:Any, data_version:str, sender_ibans:Tuple[str,...],
+                      start_date:datetime.date, end_date:datetime.date) -> pd.DataFrame:
+    return query_daily_balance(engine=_engine, sender_ibans=list(sender_ibans),
+                               start_date=start_date, end_date=end_date)
+
 # =============================================================================
 # Statistic Tab: Plots
 # =============================================================================
@@ -82,18 +155,31 @@ def plot_monthly_transactions(monthly_df:pd.DataFrame,
     return fig
 
 def plot_daily_balance(daily_df:pd.DataFrame,
-                       title:str="Balance"
+                       title:str="Balance",
+                       webgl:bool=False,
+                       max_points:Union[int,None]=None
                       ) ->go.Figure:
+    '''Daily min & max balance. With webgl the traces are rendered by WebGL
+       (Scattergl) and series longer than max_points are downsampled (LTTB,
+       bucket extremes kept).
+    '''
+    trace = go.Scatter
+    mode = 'lines+markers'
+    if webgl:
+        trace = go.Scattergl
+        daily_df = downsample_daily_balance(daily_df=daily_df,
+                                            max_points=max_points or DEFAULT_MAX_POINTS)
+        mode = 'lines' if daily_df.shape[0] > 200 else 'lines+markers'
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=daily_df["booking_date"],
-                             y=daily_df["min_balance_after_booking"],
-                             mode='lines+markers',
-                             name="min_balance_after_booking"))
-    fig.add_trace(go.Scatter(x=daily_df["booking_date"],
-                             y=daily_df["max_balance_after_booking"],
-                             mode='lines+markers',
-                             name="max_balance_after_booking"))
+    fig.add_trace(trace(x=daily_df["booking_date"],
+                        y=daily_df["min_balance_after_booking"],
+                        mode=mode,
+                        name="min_balance_after_booking"))
+    fig.add_trace(trace(x=daily_df["booking_date"],
+                        y=daily_df["max_balance_after_booking"],
+                        mode=mode,
+                        name="max_balance_after_booking"))
     fig.update_layout(title=title,
                     xaxis_title='Booking Date',
                     yaxis_title='Balance [€]',
@@ -104,32 +190,80 @@ def plot_daily_balance(daily_df:pd.DataFrame,
 # Statistics Tab Main
 # =============================================================================
 
-def compute_tab_statistics(labeled_transactions: pd.DataFrame,
+def compute_tab_statistics(engine:Any,
+                           data_version:str,
                            tab_title:str = "Overview") -> None:
+    '''Executing Tab Statistics. Aggregations and filters are executed by the
+       database, only aggregated rows are loaded (cached per data_version).
+
+    Parameters
+    ----------
+    engine : Any
+        SQLAlchemy Engine.
+    data_version : str
+        Version stamp of the rollup tables, invalidates cached queries.
+    tab_title : str, optional
+        Title of tab, by default "Overview"
+    '''
 
     #define title
     st.header(tab_title)
 
     # define multiselect (target account)
-    unique_iban_sender = labeled_transactions["sender_iban"].unique().tolist()
+    unique_iban_sender = get_accounts(_engine=engine, data_version=data_version)
     target_accounts = None
     target_accounts = st.multiselect("Select Target Accounts",unique_iban_sender)
 
     # define select category level
     category_level = None
-    category_level = st.selectbox("Select Category Level",["category_1","category_2","category_3"])
+    category_level = st.selectbox("Select Category Level",CATEGORY_LEVELS)
 
     # loop over selection
     if target_accounts and category_level:
+        target_accounts = tuple(target_accounts)
+
+        # define filters (date range & categories)
+        min_date, max_date = get_date_bounds(_engine=engine, data_version=data_version,
+                                             sender_ibans=target_accounts)
+        date_range = st.date_input("Select Date Range", value=(min_date, max_date),
+                                   min_value=min_date, max_value=max_date)
+        selected_categories = st.multiselect("Filter Categories (all if empty)",
+                                             get_categories(_engine=engine,
+                                                            data_version=data_version,
+                                                            sender_ibans=target_accounts,
+                                                            category_level=category_level))
+        # zooming = narrowing the date range, windows with up to
+        # DEFAULT_MAX_POINTS days are plotted at full resolution
+        webgl = st.toggle("Fast Rendering (WebGL, downsampled)", value=True,
+                          help=f"Balance series longer than {DEFAULT_MAX_POINTS} days are "
+                               "downsampled, narrow the date range for full resolution.")
+
+        # range selection is incomplete until the end date is picked
+        if len(date_range) != 2:
+            return
+        start_date, end_date = date_range
+
+        # aggregate all selected accounts at once
+        monthly_totals = get_monthly_totals(_engine=engine, data_version=data_version,
+                                            sender_ibans=target_accounts,
+                                            start_date=start_date, end_date=end_date,
+                                            category_level=category_level,
+                                            categories=tuple(selected_categories))
+        daily_balance = get_daily_balance(_engine=engine, data_version=data_version,
+                                          sender_ibans=target_accounts,
+                                          start_date=start_date, end_date=end_date)
+        monthly_by_account = define_monthly_transactions_by_account(monthly_totals=monthly_totals,
+                                                                    sender_ibans=target_accounts,
+                                                                    category_level=category_level)
+        daily_by_account = define_daily_balance_by_account(daily_balance=daily_balance,
+                                                           sender_ibans=target_accounts)
+
         for target_account in target_accounts:
             st.write("------")
             st.subheader((f":orange[Account: {target_account}]" ))
-            current_labeled_transactions = (labeled_transactions.loc[
-                                                labeled_transactions["sender_iban"]==target_account])
 
             # create monthly transactions chart
-            monthly_df, monthly_df_total = define_monthly_transactions(
-                                                labeled_transactions=current_labeled_transactions)
+            monthly_df, monthly_df_total = monthly_by_account[target_account]
             fig_monthly = plot_monthly_transactions(monthly_df=monthly_df,
                                                     monthly_df_total=monthly_df_total,
                                                     title=f"Monthly Transactions: {target_account}",
@@ -137,8 +271,9 @@ def compute_tab_statistics(labeled_transactions: pd.DataFrame,
             st.plotly_chart(fig_monthly, use_container_width=True)
 
             # create daily balance chart
-            daily_balance = define_daily_balance(labeled_transactions=current_labeled_transactions)
-            fig_daily_balance = plot_daily_balance(daily_df=daily_balance,title=f"Daily Balance: {target_account}")
+            fig_daily_balance = plot_daily_balance(daily_df=daily_by_account[target_account],
+                                                   title=f"Daily Balance: {target_account}",
+                                                   webgl=webgl)
             st.plotly_chart(fig_daily_balance, use_container_width=True)
             st.write("------")
 
@@ -0,0 +1,55 @@
+from typing import List
+
+import streamlit as st
+
+from money_map.ingestion.job_queue import (Ingestion_Job_Queue, INGESTORS,
+                                           JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+
+# =============================================================================
+# Upload Tab: Main
+# =============================================================================
+
+def compute_tab_upload(job_queue:Ingestion_Job_Queue,
+                       tab_title:str = "Upload Bank Exports",
+                       file_types:List[str] = ["csv"]
+                       ) -> None:
+    '''Executing Tab Upload. Uploaded files are ingested by a background
+       worker, the tab only shows the status of the jobs.
+
+    Parameters
+    ----------
+    job_queue : Ingestion_Job_Queue
+        Queue processing the ingestion jobs.
+    tab_title : str, optional
+        Title of tab, by default "Upload Bank Exports"
+    file_types : List[str], optional
+        Allowed file extensions, by default ["csv"]
+    '''
+
+    st.header(tab_title)
+
+    # select ingestion channel & upload file
+    channel = st.selectbox("Ingestion Channel", list(INGESTORS.keys()))
+    uploaded_file = st.file_uploader("Export File", type=file_types)
+
+    if uploaded_file is not None and st.button("Start Ingestion"):
+        job_id = job_queue.enqueue(file_name=uploaded_file.name,
+                                   data=uploaded_file.getvalue(),
+                                   channel=channel)
+        st.success(f"Ingestion job {job_id} queued, labeling can continue meanwhile.")
+
+    # job status
+    st.write("------")
+    st.subheader("Ingestion Jobs")
+    st.button("Refresh Status")
+
+    jobs = job_queue.get_jobs()
+    active_jobs = jobs.loc[jobs["status"].isin([JOB_STATUS_QUEUED,JOB_STATUS_RUNNING])]
+
+    col1, col2 = st.columns(2)
+    col1.metric("Active Jobs", active_jobs.shape[0])
+    col2.metric("Rows Processed (active)", int(active_jobs["rows_processed"].sum()))
+
+    st.dataframe(jobs, use_container_width=True, hide_index=True)
+
+    return
@@ -0,0 +1,119 @@
+import random
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from money_map.ingestion.normalization import normalize_participant_value
+from money_map.pipelines.categorization_rules import (NO_MATCH, RULE_FIELDS,
+                                                      Aho_Corasick, Rule_Matcher,
+                                                      is_blank_pattern)
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def random_words(rng:random.Random, n:int, alphabet:str="abc", max_length:int=4) -> list:
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, max_length)))
+            for _ in range(n)]
+
+
+def naive_find(patterns, text) -> set:
+    '''All (start, pattern index) occurrences by str.startswith.'''
+    return {(start, index) for index, pattern in enumerate(patterns)
+            for start in range(len(text)) if text.startswith(pattern, start)}
+
+
+def naive_match(rules:pd.DataFrame, df:pd.DataFrame) -> np.ndarray:
+    '''rule_id of the winning rule per row (0 if none), rules checked one
+       by one.
+    '''
+    ranked = rules.sort_values(["priority", "rule_id"], kind="stable").reset_index(drop=True)
+    best = np.zeros(df.shape[0], dtype=np.int64)
+    for row, record in enumerate(df.to_dict(orient="records")):
+        for _, rule in ranked.iterrows():
+            if is_blank_pattern(rule["pattern"], rule["match_type"]):
+                continue
+            raw = str(record[rule["field"]])
+            value = normalize_participant_value(raw)
+            pattern = normalize_participant_value(rule["pattern"])
+            if rule["match_type"] == "exact":
+                hit = value == pattern
+            elif rule["match_type"] == "prefix":
+                hit = value.startswith(pattern)
+            elif rule["match_type"] == "substring":
+                hit = pattern in value
+            else:
+                hit = re.search(rule["pattern"], raw, re.IGNORECASE) is not None
+            if hit:
+                best[row] = rule["rule_id"]
+                break
+    return best
+
+
+def create_rules(rng:random.Random, n_rules:int) -> pd.DataFrame:
+    rules = pd.DataFrame({"rule_id":range(1, n_rules+1),
+                          "field":[rng.choice(RULE_FIELDS) for _ in range(n_rules)],
+                          "match_type":[rng.choice(["exact", "prefix", "substring"])
+                                        for _ in range(n_rules)],
+                          "pattern":random_words(rng, n_rules),
+                          "priority":[rng.randint(1, 5) for _ in range(n_rules)],
+                          "category_id":range(101, n_rules+101)})
+    for col in ["category_1", "category_2", "category_3"]:
+        rules[col] = col
+    return rules
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_aho_corasick_equals_naive_find():
+    rng = random.Random(7)
+    patterns = random_words(rng, 30)
+    automaton = Aho_Corasick(patterns)
+    for text in random_words(rng, 200, max_length=20):
+        assert set(automaton.find(text)) == naive_find(patterns, text)
+
+
+def test_rule_matcher_equals_naive_matcher():
+    rng = random.Random(11)
+    rules = create_rules(rng, 40)
+    rules.loc[0, ["match_type", "pattern"]] = ["regex", "^b.c"]
+    rules.loc[1, ["match_type", "pattern"]] = ["substring", "  "]
+    df = pd.DataFrame({col:[value.upper() if rng.random() < 0.2 else f" {value}"
+                            for value in random_words(rng, 300, max_length=8)]
+                       for col in RULE_FIELDS})
+
+    matcher = Rule_Matcher(rules=rules)
+    ranks = matcher.match(df)
+    rule_ids = np.where(ranks == NO_MATCH, 0,
+                        matcher.ranked["rule_id"].to_numpy()[np.minimum(ranks, len(matcher)-1)])
+    assert np.array_equal(rule_ids, naive_match(rules, df))
+    assert (rule_ids != 0).any() and (rule_ids == 0).any()
+
+
+def test_rule_matcher_categorize_returns_winning_rule():
+    rules = pd.DataFrame([[1, "receiver_name", "substring", "rewe", 5, 11],
+                          [2, "receiver_name", "prefix", "rewe markt", 1, 12],
+                          [3, "purpose_char", "exact", "miete", 1, 13]],
+                         columns=["rule_id", "field", "match_type", "pattern",
+                                  "priority", "category_id"])
+    for col in ["category_1", "category_2", "category_3"]:
+        rules[col] = col
+    df = pd.DataFrame({"receiver_iban":["", "", "", ""],
+                       "receiver_name":["REWE Markt", "Mein Rewe", "Vermieter", "Aldi"],
+                       "booking_text":["", "", "", ""],
+                       "purpose_char":["einkauf", "einkauf", " Miete ", "einkauf"]},
+                      index=[10, 11, 12, 13])
+
+    matches = Rule_Matcher(rules=rules).categorize(df)
+    assert matches["category_id"].to_dict() == {10:12, 11:11, 12:13}
+
+
+@pytest.mark.parametrize("pattern, match_type, expected",
+                         [("", "substring", True), ("   ", "prefix", True),
+                          (" ", "regex", True), ("rewe", "exact", False),
+                          (".", "regex", False)])
+def test_is_blank_pattern(pattern, match_type, expected):
+    assert is_blank_pattern(pattern, match_type) == expected
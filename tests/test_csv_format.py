@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from money_map.ingestion.csv_format import DEFAULT_SAMPLE_SIZE, detect_csv_format
+from money_map.ingestion.rbpn_ingestion import RBPN_COLUMN_MAPPING, RBPN_Ingestor
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def write_export(file_path:Path, n_rows:int, last_purpose:bytes) -> Path:
+    '''Write an ascii RBPN export whose last row has purpose last_purpose.'''
+    header = ";".join(RBPN_COLUMN_MAPPING.keys())
+    row = ";".join(["Girokonto", "DE00123", "BIC", "RBPN", "2024-01-01", "2024-01-01",
+                    "Rewe", "DE00456", "BIC", "Lastschrift", "Einkauf {}", "-1,5",
+                    "EUR", "{}", "", "", "", "", ""])
+    rows = [row.format(number, 1000 + number) for number in range(n_rows)]
+    content = "\n".join([header] + rows).encode("ascii")
+    content += b"\n" + row.format(0, 999).encode("ascii").replace(b"Einkauf 0", last_purpose)
+    file_path.write_bytes(content + b"\n")
+    return file_path
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_detect_encoding_latin1_within_sample(tmp_path):
+    file_path = write_export(tmp_path / "export.csv", n_rows=10, last_purpose=b"M\xfcnchen")
+    csv_format = detect_csv_format(file_path=file_path)
+    assert csv_format.encoding == "latin1"
+    assert csv_format.sep == ";"
+
+
+def test_detect_encoding_utf8(tmp_path):
+    file_path = write_export(tmp_path / "export.csv", n_rows=10,
+                             last_purpose="München".encode("utf-8"))
+    assert detect_csv_format(file_path=file_path).encoding == "utf-8"
+
+
+def test_invalid_utf8_after_sample_falls_back_to_latin1(tmp_path):
+    file_path = write_export(tmp_path / "export.csv", n_rows=2000, last_purpose=b"M\xfcnchen")
+    assert file_path.read_bytes().index(b"\xfc") > DEFAULT_SAMPLE_SIZE
+
+    # only the sample is inspected
+    csv_format = detect_csv_format(file_path=file_path)
+    assert csv_format.encoding == "utf-8"
+
+    df = RBPN_Ingestor(use_manifest=False).read_data(file_path=file_path,
+                                                     csv_format=csv_format)
+    assert csv_format.encoding == "latin1"
+    assert df.shape[0] == 2001
+    assert df["Verwendungszweck"].iloc[-1] == "Muenchen"
+
+
+def test_invalid_utf8_after_sample_falls_back_to_latin1_chunked(tmp_path):
+    # large enough that the error is raised after the first chunks were yielded
+    file_path = write_export(tmp_path / "export.csv", n_rows=6000, last_purpose=b"M\xfcnchen")
+    chunks = list(RBPN_Ingestor(use_manifest=False).read_data_chunks(file_path=file_path,
+                                                                     chunksize=500))
+    purposes = [purpose for chunk in chunks for purpose in chunk["Verwendungszweck"]]
+    assert purposes == [f"Einkauf {number}" for number in range(6000)] + ["Muenchen"]
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from money_map.tabs.downsampling import downsample_daily_balance, lttb_indices
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def create_daily_balance(n_days:int, seed:int=5) -> pd.DataFrame:
+    '''Random walk of a daily balance with one spike & one dip.'''
+    rng = np.random.default_rng(seed)
+    mean = 1000 + rng.normal(0, 10, n_days).cumsum()
+    df = pd.DataFrame({"booking_date":pd.date_range("2020-01-01", periods=n_days, freq="D"),
+                       "min_balance_after_booking":mean - rng.uniform(0, 50, n_days),
+                       "mean_balance_after_booking":mean,
+                       "max_balance_after_booking":mean + rng.uniform(0, 50, n_days)})
+    df.loc[1234, "max_balance_after_booking"] = 10**6
+    df.loc[2345, "min_balance_after_booking"] = -10**6
+    return df
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_lttb_indices_keeps_ends_and_peak():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    y[500] = 100
+    indices = lttb_indices(x=x, y=y, n_out=50)
+
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert 500 in indices
+
+
+def test_lttb_indices_short_series_unchanged():
+    x = np.arange(10, dtype=float)
+    assert lttb_indices(x=x, y=x, n_out=20).tolist() == list(range(10))
+    assert lttb_indices(x=x, y=x, n_out=2).tolist() == list(range(10))
+
+
+def test_downsample_daily_balance_keeps_extremes():
+    df = create_daily_balance(n_days=5000)
+    downsampled = downsample_daily_balance(daily_df=df, max_points=600)
+
+    assert downsampled.shape[0] <= 600
+    assert downsampled["booking_date"].is_monotonic_increasing
+    assert downsampled["booking_date"].iloc[0] == df["booking_date"].iloc[0]
+    assert downsampled["booking_date"].iloc[-1] == df["booking_date"].iloc[-1]
+    assert downsampled["max_balance_after_booking"].max() == df["max_balance_after_booking"].max()
+    assert downsampled["min_balance_after_booking"].min() == df["min_balance_after_booking"].min()
+
+
+def test_downsample_daily_balance_small_series_unchanged():
+    df = create_daily_balance(n_days=3000)
+    assert downsample_daily_balance(daily_df=df, max_points=3000) is df
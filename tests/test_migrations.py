@@ -0,0 +1,65 @@
+import pandas as pd
+from sqlalchemy import create_engine, inspect, insert, select
+
+from money_map.models.orm_models import (Base,
+                                         Transactions_Labeled_Table,
+                                         Materialization_Watermarks_Table)
+from money_map.models.migrations import MIGRATIONS, get_applied_versions, run_migrations
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def create_legacy_database(db_path):
+    '''Database of a former version: transactions_labeled created by pandas
+       to_sql (TEXT columns, no primary key), all other tables by create_all.
+    '''
+    engine = create_engine(f"sqlite:///{db_path}")
+    legacy = pd.DataFrame({"transaction_id":["t1"], "sender_iban":["DE001"],
+                           "booking_date":[pd.Timestamp("2024-01-01")],
+                           "amount":[1.5], "category_id":[1]})
+    legacy.to_sql(Transactions_Labeled_Table.__tablename__, engine, index=False)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(Materialization_Watermarks_Table)
+                           .values(target_table=Transactions_Labeled_Table.__tablename__))
+    return engine
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_migrations_are_ordered_and_unique():
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == sorted(versions)
+    assert len(set(versions)) == len(versions)
+
+
+def test_migrations_rebuild_legacy_transactions_labeled(tmp_path):
+    engine = create_legacy_database(tmp_path / "legacy.db")
+    table_name = Transactions_Labeled_Table.__tablename__
+    assert inspect(engine).get_pk_constraint(table_name)["constrained_columns"] == []
+
+    applied = run_migrations(engine=engine, verbose=False)
+    assert applied == [migration.version for migration in MIGRATIONS]
+
+    inspector = inspect(engine)
+    assert inspector.get_pk_constraint(table_name)["constrained_columns"] == ["transaction_id"]
+    index_names = [index["name"] for index in inspector.get_indexes(table_name)]
+    assert all(index.name in index_names for index in Transactions_Labeled_Table.__table__.indexes)
+
+    # next refresh is a full materialization
+    with engine.connect() as connection:
+        watermarks = connection.execute(select(Materialization_Watermarks_Table.target_table)
+                                        ).scalars().all()
+    assert table_name not in watermarks
+
+
+def test_migrations_are_applied_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    Base.metadata.create_all(bind=engine)
+
+    assert run_migrations(engine=engine, verbose=False) == [m.version for m in MIGRATIONS]
+    assert run_migrations(engine=engine, verbose=False) == []
+    assert get_applied_versions(engine=engine) == [m.version for m in MIGRATIONS]
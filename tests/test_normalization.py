@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from money_map.ingestion.normalization import (PARTICIPANT_KEY_COLUMNS,
+                                               compute_participant_keys,
+                                               normalize_purpose_char,
+                                               participant_key)
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def create_participants() -> pd.DataFrame:
+    '''Participants with repeated rows, blank, case & accent variants.'''
+    rows = [["RBPN", "DE001", "Rewe Markt", "DE100", "Lastschrift", "einkauf filiale"],
+            ["RBPN", "DE001", "Rewe Markt", "DE100", "Lastschrift", "einkauf filiale"],
+            ["RBPN", "DE001", "  REWE markt ", "DE100", "LASTSCHRIFT", "Einkauf Filiale"],
+            ["RBPN", "DE001", "Café Müller", "DE200", "Kartenzahlung", "kaffee"],
+            ["RBPN", "DE001", "Cafe Muller", "DE200", "Kartenzahlung", "kaffee"],
+            ["RBPN", "DE002", "", "", "Gutschrift", ""]]
+    return pd.DataFrame(rows, columns=PARTICIPANT_KEY_COLUMNS, index=np.arange(10, 16))
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_compute_participant_keys_equals_participant_key():
+    df = create_participants()
+    keys = compute_participant_keys(df)
+
+    expected = [participant_key(row) for row in df.to_dict(orient="records")]
+    assert keys.tolist() == expected
+    assert keys.index.equals(df.index)
+    assert keys.str.len().eq(32).all()
+
+
+def test_participant_key_ignores_blanks_and_case_only():
+    keys = compute_participant_keys(create_participants())
+    assert keys.iloc[0] == keys.iloc[1] == keys.iloc[2]
+    # accents are not normalized
+    assert keys.iloc[3] != keys.iloc[4]
+    assert keys.nunique() == 4
+
+
+def test_normalize_purpose_char_equals_pattern():
+    purpose = pd.Series(["Miete 03/2024 Wohnung", "Gehalt Ü-12", None, "ABC def"])
+    expected = ["miete  wohnung", "gehalt ", None, "abc def"]
+    assert normalize_purpose_char(purpose).tolist() == expected
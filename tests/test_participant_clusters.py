@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from money_map.pipelines.participant_clusters import (cluster_participants,
+                                                      connected_components,
+                                                      minhash_signatures,
+                                                      tokenize)
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def create_chain(n_participants:int=6, n_tokens:int=30, shift:int=5) -> pd.DataFrame:
+    '''Participants of one group whose purposes shift by shift tokens: each
+       one is similar to its neighbours, the ends share no token at all.
+    '''
+    purposes = [" ".join(f"w{token}" for token in range(start, start + n_tokens))
+                for start in range(0, n_participants * shift, shift)]
+    return pd.DataFrame({"receiver_iban":"DE100", "booking_text":"Lastschrift",
+                         "purpose_char":purposes})
+
+
+def estimated_similarity(df:pd.DataFrame, left:int, right:int, num_perm:int) -> float:
+    positions, hashes = tokenize(df["purpose_char"])
+    signatures = minhash_signatures(positions=positions, hashes=hashes,
+                                    n_participants=df.shape[0], num_perm=num_perm)
+    return float((signatures[left] == signatures[right]).mean())
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_connected_components():
+    components = connected_components(n_nodes=5, pairs=np.array([[3, 1], [4, 3]]))
+    assert components.tolist() == [0, 1, 2, 1, 1]
+
+
+def test_cluster_participants_groups_near_duplicates_only():
+    df = pd.DataFrame({"receiver_iban":["DE100", "de100 ", "DE100", "DE200", "DE100"],
+                       "booking_text":["Lastschrift"] * 5,
+                       "purpose_char":["miete wohnung januar", "miete wohnung januar",
+                                       "strom abschlag", "miete wohnung januar",
+                                       "miete wohnung februar januar"]})
+    representatives = cluster_participants(df=df, threshold=0.5, num_perm=128, bands=64)
+    # case & blanks of the group columns are ignored, other groups stay apart
+    assert representatives.tolist()[:4] == [0, 0, 2, 3]
+
+
+def test_cluster_members_are_similar_to_their_representative():
+    df = create_chain()
+    num_perm, threshold = 256, 0.6
+    representatives = cluster_participants(df=df, threshold=threshold,
+                                           num_perm=num_perm, bands=64)
+
+    # neighbours are linked, but the chain must not form one cluster
+    assert estimated_similarity(df, 0, 1, num_perm) >= threshold
+    assert len(np.unique(representatives)) > 1
+    for position, representative in enumerate(representatives):
+        assert representative <= position
+        assert estimated_similarity(df, position, representative, num_perm) >= threshold
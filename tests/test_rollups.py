@@ -0,0 +1,66 @@
+import pandas as pd
+from sqlalchemy import create_engine, insert
+
+from money_map.models.orm_models import Base, Transactions_Table
+from money_map.pipelines.rollups import refresh_daily_balance
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def create_database(db_path, bookings):
+    '''Database with transactions of one account, bookings as
+       (booking_date, amount, balance_after_booking), listed out of order.
+    '''
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    rows = [{"transaction_id":f"t{number}", "sender_account_type":"Giro",
+             "sender_iban":"DE001", "sender_bank_name":"RBPN",
+             "booking_date":pd.Timestamp(booking_date).date(),
+             "value_date":pd.Timestamp(booking_date).date(),
+             "receiver_name":"Rewe", "receiver_iban":"DE100",
+             "booking_text":"Lastschrift", "purpose":"einkauf", "purpose_char":"einkauf",
+             "amount":amount, "currency":"EUR", "balance_after_booking":balance}
+            for number, (booking_date, amount, balance) in enumerate(bookings)]
+    with engine.begin() as connection:
+        connection.execute(insert(Transactions_Table), rows)
+    return engine
+
+
+def read_daily_balance(engine) -> pd.DataFrame:
+    df = pd.read_sql("SELECT * FROM daily_balance ORDER BY booking_date", engine)
+    return df.set_index(pd.to_datetime(df["booking_date"]).dt.strftime("%Y-%m-%d"))
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_gap_days_carry_the_closing_balance(tmp_path):
+    # 100 -> 50 -> 80 -> 20 on the first day, listed out of order
+    engine = create_database(tmp_path / "daily.db",
+                             [("2024-01-01", 30.0, 80.0),
+                              ("2024-01-01", -60.0, 20.0),
+                              ("2024-01-01", -50.0, 50.0),
+                              ("2024-01-04", 5.0, 25.0)])
+    assert refresh_daily_balance(engine=engine) == 4
+
+    df = read_daily_balance(engine)
+    assert df.loc["2024-01-01", "closing_balance_after_booking"] == 20.0
+    assert df.loc["2024-01-01", "max_balance_after_booking"] == 80.0
+    for day in ["2024-01-02", "2024-01-03"]:
+        assert df.loc[day, "is_filled"]
+        assert (df.loc[day, ["min_balance_after_booking", "mean_balance_after_booking",
+                             "max_balance_after_booking"]] == 20.0).all()
+    assert df.loc["2024-01-04", "closing_balance_after_booking"] == 25.0
+
+
+def test_day_back_at_its_opening_balance(tmp_path):
+    # 20 -> 30 -> 20 on the second day: no unique last booking
+    engine = create_database(tmp_path / "daily.db",
+                             [("2024-01-01", -80.0, 20.0),
+                              ("2024-01-02", 10.0, 30.0),
+                              ("2024-01-02", -10.0, 20.0)])
+    refresh_daily_balance(engine=engine)
+
+    df = read_daily_balance(engine)
+    assert df.loc["2024-01-02", "closing_balance_after_booking"] == 20.0
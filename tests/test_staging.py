@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+from attrs import define
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.dialects import mysql
+
+import money_map.ingestion.rbpn_ingestion as rbpn_ingestion
+from money_map.models.orm_models import (Base, Transactions_Table, Rule_Matches_Table,
+                                         Unlabeled_Participants_Table)
+from money_map.ingestion.rbpn_ingestion import RBPN_Ingestor
+from money_map.ingestion.staging import create_staging_table, drop_staging_table
+from money_map.pipelines.categorization_rules import add_categorization_rule
+
+from tests.test_csv_format import write_export
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+@define
+class SQLite_Connector:
+    '''Connector of a SQLite file, stands in for MySQLConnector.'''
+    url:str
+
+    def create_sql_engine(self):
+        return create_engine(self.url)
+
+
+@define
+class Recording_Connection:
+    '''Records the SQL executed on a MySQL connection.'''
+    dialect:object
+    statements:list
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+def count_rows(engine, table) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_drop_staging_table_keeps_mysql_transaction():
+    staging_table = create_staging_table(target_table=Transactions_Table.__table__,
+                                         columns=["transaction_id"])
+    connection = Recording_Connection(dialect=mysql.dialect(), statements=[])
+    drop_staging_table(connection=connection, staging_table=staging_table)
+    # a plain DROP TABLE commits the open transaction implicitly
+    assert connection.statements == ["DROP TEMPORARY TABLE IF EXISTS transactions_staging"]
+
+
+def test_store_data_rolls_back_on_failure(tmp_path, monkeypatch):
+    connector = SQLite_Connector(url=f"sqlite:///{tmp_path / 'money_map.db'}")
+    engine = connector.create_sql_engine()
+    Base.metadata.create_all(bind=engine)
+    add_categorization_rule(engine=engine, field="purpose_char", match_type="exact",
+                            pattern="einkauf", category_id=1, category_1="Food",
+                            category_2="Groceries", category_3="Supermarket")
+
+    ingestor = RBPN_Ingestor(connector=connector, use_manifest=False)
+    file_path = write_export(tmp_path / "export.csv", n_rows=10, last_purpose=b"Miete")
+    df = ingestor.clean_data(df=ingestor.read_data(file_path=file_path))
+
+    # fails after all writes of the batch were executed
+    enqueue_participants = rbpn_ingestion.enqueue_participants
+    def fail_enqueue(**kwargs):
+        assert enqueue_participants(**kwargs) > 0
+        raise RuntimeError("enqueue failed")
+    monkeypatch.setattr(rbpn_ingestion, "enqueue_participants", fail_enqueue)
+
+    with pytest.raises(RuntimeError):
+        ingestor.store_data(df=df)
+
+    # the staging drops must not have committed transactions, rule matches
+    # or the labeling queue
+    assert count_rows(engine, Transactions_Table) == 0
+    assert count_rows(engine, Rule_Matches_Table) == 0
+    assert count_rows(engine, Unlabeled_Participants_Table) == 0
+
+    monkeypatch.undo()
+    assert ingestor.store_data(df=df) == df.shape[0]
+    assert count_rows(engine, Rule_Matches_Table) == 1
+    assert count_rows(engine, Unlabeled_Participants_Table) == 1
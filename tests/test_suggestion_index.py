@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from money_map.pipelines.suggestion_index import (SUGGESTION_FIELD_WEIGHTS,
+                                                  Suggestion_Index,
+                                                  char_ngrams)
+
+# =============================================================================
+# Helper
+# =============================================================================
+
+def create_labeled() -> pd.DataFrame:
+    '''Labeled participants of three categories.'''
+    rows = [["Rewe Markt", "einkauf filiale", 1],
+            ["Rewe City", "einkauf", 1],
+            ["Stadtwerke", "abschlag strom", 2],
+            ["Stadtwerke Nord", "abschlag gas", 2],
+            ["Arbeitgeber GmbH", "gehalt", 3]]
+    return pd.DataFrame(rows, columns=["receiver_name", "purpose_char", "category_id"])
+
+
+def naive_score(participant, labeled) -> float:
+    '''Weighted cosine similarity of binary n-gram vectors.'''
+    score = 0.0
+    for col, weight in SUGGESTION_FIELD_WEIGHTS.items():
+        query, document = char_ngrams(participant[col]), char_ngrams(labeled[col])
+        score += weight * len(query & document) / math.sqrt(len(query) * len(document))
+    return score
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+def test_score_equals_naive_cosine():
+    labeled = create_labeled()
+    index = Suggestion_Index()
+    assert index.add_many(labeled) == labeled.shape[0]
+
+    participant = {"receiver_name":"REWE markt", "purpose_char":"einkauf"}
+    expected = [naive_score(participant, row) for row in labeled.to_dict(orient="records")]
+    assert np.allclose(index.score(participant), expected)
+
+
+def test_suggest_orders_categories_by_similarity():
+    index = Suggestion_Index()
+    index.add_many(create_labeled())
+
+    suggestions = index.suggest({"receiver_name":"Stadtwerke", "purpose_char":"abschlag"}, k=2)
+    category_ids = [category_id for category_id, _ in suggestions]
+    scores = [score for _, score in suggestions]
+    assert category_ids[0] == 2
+    assert len(set(category_ids)) == len(category_ids) <= 2
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] > 0.5 and all(0 < score <= 1 for score in scores)
+
+
+def test_suggest_without_labels_or_overlap():
+    index = Suggestion_Index()
+    assert index.suggest({"receiver_name":"Rewe", "purpose_char":"einkauf"}) == []
+
+    index.add({"receiver_name":"Rewe", "purpose_char":"einkauf"}, category_id=1)
+    assert index.suggest({"receiver_name":"xyz", "purpose_char":"qqq"}) == []
+
+
+def test_add_after_score():
+    # scoring must not leave buffer views behind, appending would fail
+    index = Suggestion_Index()
+    index.add_many(create_labeled())
+    index.score({"receiver_name":"Rewe", "purpose_char":"einkauf"})
+    assert index.add({"receiver_name":"Rewe", "purpose_char":"einkauf"}, category_id=1) == 5
+    assert len(index) == 6